@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+進聽數算法效能比較
+隨機產生16張手牌，比較 table / search / greedy 三種算法的速度與結果；
+加上 --discard 時改為比較 suggest_discard 與逐張重算的打牌評估
+
+用法: python benchmark_shanten.py [--hands 2000] [--seed 0] [--discard]
+"""
+
+import argparse
+import random
+import time
+
+from calculate_shanten import ShantenCalculator, TILE_LABELS
+
+def random_hands(count: int, seed: int, size: int = 16) -> list:
+    """從完整的牌牆（每種4張）中隨機抽出 count 手牌"""
+    rng = random.Random(seed)
+    wall = [tile for tile in TILE_LABELS for _ in range(4)]
+    return [rng.sample(wall, size) for _ in range(count)]
+
+def time_algorithm(calculator: ShantenCalculator, hands: list) -> tuple:
+    """計算所有手牌的進聽數，返回 (結果列表, 總秒數)"""
+    start = time.perf_counter()
+    results = [calculator.calculate_shanten(hand) for hand in hands]
+    return results, time.perf_counter() - start
+
+def random_clustered_hands(count: int, seed: int, size: int = 17) -> list:
+    """產生較接近實戰的手牌：從少數幾種牌中抽牌，因此常有對子、刻子等重複牌"""
+    rng = random.Random(seed)
+    hands = []
+    for _ in range(count):
+        kinds = rng.sample(TILE_LABELS, rng.randint(8, 12))
+        wall = [tile for tile in kinds for _ in range(4)]
+        hands.append(rng.sample(wall, size))
+    return hands
+
+def per_position_discards(calculator: ShantenCalculator, hand_17: list) -> list:
+    """逐張評估（對照用）：每個位置都重算進聽數，每個最佳選項都重算等待牌或進牌
+
+    Returns:
+        list: 每個位置的 (進聽數, 等待張數, 進牌張數)；非最佳選項的後兩項為 None
+    """
+    shantens = [calculator.calculate_shanten(hand_17[:i] + hand_17[i + 1:]) for i in range(len(hand_17))]
+    best = min(shantens)
+    results = []
+    for i, shanten in enumerate(shantens):
+        wait_count = improving_count = None
+        if shanten == best:
+            hand_16 = hand_17[:i] + hand_17[i + 1:]
+            if best == 0:
+                wait_count = calculator._count_waiting_tiles(hand_16)[0]
+            else:
+                # 打掉的牌也算已看到，和 suggest_discard 一致
+                visible = [0] * len(TILE_LABELS)
+                visible[TILE_LABELS.index(hand_17[i])] = 1
+                improving_count = calculator._count_improving_tiles(hand_16, best, visible)[0]
+        results.append((shanten, wait_count, improving_count))
+    return results
+
+def benchmark_discards(hands: list) -> None:
+    """比較 suggest_discard 的共享計算與逐張評估的速度，並檢查結果一致"""
+    calculator = ShantenCalculator()
+    # 先建好查表，避免冷啟動影響比較
+    calculator.suggest_discard(hands[0])
+
+    start = time.perf_counter()
+    reference = [per_position_discards(calculator, hand) for hand in hands]
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    suggestions = [calculator.suggest_discard(hand) for hand in hands]
+    shared = time.perf_counter() - start
+
+    mismatch = 0
+    for expected, result in zip(reference, suggestions):
+        if [shanten for shanten, _, _ in expected] != [opt['shanten'] for opt in result['all_options']]:
+            mismatch += 1
+            continue
+        best = result['best_options'][0]
+        wait_count, improving_count = expected[best['index']][1:]
+        if (wait_count or 0, improving_count or 0) != (best['wait_count'], best['improving_count']):
+            mismatch += 1
+    duplicates = sum(len(hand) - len(set(hand)) for hand in hands) / len(hands)
+    print(f"每手平均重複牌: {duplicates:.1f} 張")
+    print("\n方法              總時間(秒)   每手(毫秒)")
+    print(f"{'逐張評估':12s} {naive:10.3f} {naive / len(hands) * 1e3:12.2f}")
+    print(f"{'suggest_discard':16s} {shared:10.3f} {shared / len(hands) * 1e3:12.2f}")
+    print(f"加速倍數: {naive / shared:.1f}x")
+    print(f"\n結果不一致: {mismatch} 手")
+
+def main():
+    parser = argparse.ArgumentParser(description="比較進聽數算法的速度與結果")
+    parser.add_argument("--hands", type=int, default=2000, help="隨機手牌數量")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--discard", action="store_true", help="改為比較17張牌的打牌評估")
+    args = parser.parse_args()
+
+    if args.discard:
+        hands = random_clustered_hands(args.hands, args.seed)
+        print(f"隨機17張手牌: {len(hands)} 手 (seed={args.seed})")
+        benchmark_discards(hands)
+        return
+
+    hands = random_hands(args.hands, args.seed)
+    print(f"隨機手牌: {len(hands)} 手 (seed={args.seed})")
+
+    results = {}
+    print("\n算法       總時間(秒)   每手(微秒)")
+    for algorithm in ShantenCalculator.ALGORITHMS:
+        calculator = ShantenCalculator(algorithm)
+        # 第一次執行包含建表時間，另外計時
+        if algorithm == "table":
+            _, cold = time_algorithm(calculator, hands)
+            print(f"{'table(冷)':10s} {cold:10.3f} {cold / len(hands) * 1e6:12.1f}")
+        values, elapsed = time_algorithm(calculator, hands)
+        results[algorithm] = values
+        print(f"{algorithm:10s} {elapsed:10.3f} {elapsed / len(hands) * 1e6:12.1f}")
+
+    exact = results["table"]
+    mismatch = sum(1 for a, b in zip(exact, results["search"]) if a != b)
+    print(f"\ntable 與 search 不一致: {mismatch} 手")
+
+    greedy = results["greedy"]
+    higher = sum(1 for e, g in zip(exact, greedy) if g > e)
+    lower = sum(1 for e, g in zip(exact, greedy) if g < e)
+    print(f"greedy 高估進聽數: {higher} 手，低估進聽數: {lower} 手，"
+          f"一致率: {(len(hands) - higher - lower) / len(hands):.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+進聽數引擎的微基準測試
+以固定種子產生依進聽數分層的手牌語料（聽牌、一向聽、二向聽、三向聽以上、字牌多、重複牌多），
+對各個入口函式暖身後重複計時，輸出平均、p50、p99 延遲與每秒呼叫數（JSON）；
+指定基準檔時與其比較，超過門檻的退步會以結束代碼 1 回報
+
+用法: python benchmark_suite.py [--per-stratum 200] [--seed 0] [--output result.json]
+                                [--baseline baseline.json] [--threshold 0.25] [--save-baseline baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import zlib
+
+import numpy as np
+
+import calculate_shanten
+from benchmark_shanten import random_clustered_hands
+from calculate_shanten import ShantenCalculator, TILE_LABELS
+
+# 語料的分層，順序即輸出順序
+STRATA = ("tenpai", "shanten_1", "shanten_2", "shanten_3plus", "honor_heavy", "duplicate_heavy")
+
+# 各入口函式：名稱 -> 以計算器處理一筆語料的函式
+# suggest_discard 的結果會延後計算，這裡以 to_dict() 讀取所有欄位，量的是完整的建議
+ENTRY_POINTS = {
+    "calculate_shanten": lambda calc, item: calc.calculate_shanten(item['hand_16']),
+    "suggest_discard": lambda calc, item: calc.suggest_discard(item['hand_17']).to_dict(),
+    "count_improving_tiles": lambda calc, item: calc._count_improving_tiles(item['hand_16'], item['shanten']),
+    "count_waiting_tiles": lambda calc, item: calc._count_waiting_tiles(item['hand_16']),
+    "find_max_tatsu": lambda calc, item: calc.find_max_tatsu(item['hand_16']),
+}
+
+SUITS = ("m", "p", "s")
+HONORS = TILE_LABELS[27:]
+
+def random_complete_hand(rng: random.Random) -> list:
+    """隨機產生一手17張的和牌（5個面子 + 1對將，每種牌不超過4張）"""
+    counts = {tile: 0 for tile in TILE_LABELS}
+    hand = []
+    while len(hand) < 15:
+        if rng.random() < 0.6:
+            suit = rng.choice(SUITS)
+            start = rng.randint(1, 7)
+            meld = [f"{start + i}{suit}" for i in range(3)]
+        else:
+            meld = [rng.choice(TILE_LABELS)] * 3
+        if all(counts[tile] + meld.count(tile) <= 4 for tile in meld):
+            for tile in meld:
+                counts[tile] += 1
+            hand.extend(meld)
+    pair = rng.choice([tile for tile in TILE_LABELS if counts[tile] <= 2])
+    hand.extend([pair, pair])
+    rng.shuffle(hand)
+    return hand
+
+def perturb(rng: random.Random, hand: list, replace: int) -> list:
+    """把手牌中隨機 replace 張換成牌牆中剩下的牌（保持每種牌不超過4張）"""
+    wall = [tile for tile in TILE_LABELS for _ in range(4)]
+    for tile in hand:
+        wall.remove(tile)
+    hand = list(hand)
+    for position in rng.sample(range(len(hand)), replace):
+        new = wall.pop(rng.randrange(len(wall)))
+        wall.append(hand[position])
+        hand[position] = new
+    return hand
+
+def honor_heavy_hand(rng: random.Random) -> list:
+    """字牌多的手牌：先抽6~10張字牌，其餘從整副牌中抽"""
+    honors = rng.sample([tile for tile in HONORS for _ in range(4)], rng.randint(6, 10))
+    wall = [tile for tile in TILE_LABELS for _ in range(4)]
+    for tile in honors:
+        wall.remove(tile)
+    hand = honors + rng.sample(wall, 17 - len(honors))
+    rng.shuffle(hand)
+    return hand
+
+def build_corpus(seed: int = 0, per_stratum: int = 200) -> dict:
+    """產生依進聽數分層的手牌語料
+
+    進聽數分層由和牌隨機換掉幾張牌產生（三向聽以上另外混入完全隨機的手牌），
+    再以前16張的實際進聽數分到對應的層；同一個種子一定得到相同的語料。
+
+    Returns:
+        dict: 分層名稱 -> 語料列表，每筆包含 'hand_17'、'hand_16'（前16張）與 'shanten'（16張的進聽數）
+    """
+    rng = random.Random(seed)
+    calculator = ShantenCalculator()
+
+    def item(hand_17: list) -> dict:
+        return {'hand_17': hand_17, 'hand_16': hand_17[:16], 'shanten': calculator.calculate_shanten(hand_17[:16])}
+
+    corpus = {name: [] for name in STRATA}
+    by_shanten = ("tenpai", "shanten_1", "shanten_2", "shanten_3plus")
+    attempts = 0
+    while any(len(corpus[name]) < per_stratum for name in by_shanten):
+        attempts += 1
+        if attempts > per_stratum * 1000:
+            raise RuntimeError("無法產生足夠的分層手牌")
+        if rng.random() < 0.2:
+            hand = rng.sample([tile for tile in TILE_LABELS for _ in range(4)], 17)
+        else:
+            hand = perturb(rng, random_complete_hand(rng), rng.randint(1, 8))
+        entry = item(hand)
+        name = by_shanten[min(entry['shanten'], 3)]
+        if len(corpus[name]) < per_stratum:
+            corpus[name].append(entry)
+
+    corpus["honor_heavy"] = [item(honor_heavy_hand(rng)) for _ in range(per_stratum)]
+    corpus["duplicate_heavy"] = [item(hand) for hand in random_clustered_hands(per_stratum, rng.randrange(2 ** 32))]
+    return corpus
+
+def corpus_digest(corpus: dict) -> str:
+    """語料的 CRC32，用來確認兩次結果量的是同一份語料"""
+    hands = [[entry['hand_17'] for entry in corpus[name]] for name in STRATA]
+    return f"{zlib.crc32(json.dumps(hands).encode()):08x}"
+
+def time_entry(function, items: list, warmup: int, repeats: int) -> dict:
+    """暖身 warmup 輪後重複 repeats 輪，逐次量測每一次呼叫的延遲"""
+    for _ in range(warmup):
+        for item in items:
+            function(item)
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in items:
+            begin = time.perf_counter_ns()
+            function(item)
+            samples.append(time.perf_counter_ns() - begin)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    count = len(samples)
+    return {
+        'calls': count,
+        'mean_us': round(sum(samples) / count / 1e3, 3),
+        'p50_us': round(samples[count // 2] / 1e3, 3),
+        'p99_us': round(samples[min(count - 1, int(count * 0.99))] / 1e3, 3),
+        'throughput': round(count / elapsed, 1) if elapsed > 0 else None,
+    }
+
+def run_suite(corpus: dict, entries: list, warmup: int, repeats: int) -> dict:
+    """對每個入口函式與每一層語料計時，返回 {入口函式: {分層: 統計}}"""
+    calculator = ShantenCalculator()
+    results = {}
+    for entry in entries:
+        results[entry] = {}
+        call = ENTRY_POINTS[entry]
+        for name in STRATA:
+            stats = time_entry(lambda item: call(calculator, item), corpus[name], warmup, repeats)
+            results[entry][name] = stats
+            print(f"{entry:22s} {name:16s} p50 {stats['p50_us']:9.1f}us  p99 {stats['p99_us']:9.1f}us",
+                  file=sys.stderr)
+    return results
+
+def compare(report: dict, baseline: dict, metric: str, threshold: float) -> list:
+    """找出比基準慢超過 threshold（比例）的項目，返回說明文字列表"""
+    if baseline['meta']['corpus_digest'] != report['meta']['corpus_digest']:
+        raise ValueError("基準檔的語料與這次不同（種子或每層數量不一致），無法比較")
+    regressions = []
+    for entry, strata in report['results'].items():
+        for name, stats in strata.items():
+            expected = baseline['results'].get(entry, {}).get(name)
+            if expected is None:
+                continue
+            ratio = stats[metric] / expected[metric] if expected[metric] else 1.0
+            if ratio > 1 + threshold:
+                regressions.append(f"{entry} / {name}: {metric} {expected[metric]} -> {stats[metric]} "
+                                   f"（慢了 {ratio - 1:.0%}）")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="進聽數引擎的微基準測試")
+    parser.add_argument("--seed", type=int, default=0, help="語料的隨機種子")
+    parser.add_argument("--per-stratum", type=int, default=200, help="每一層的手牌數")
+    parser.add_argument("--warmup", type=int, default=1, help="暖身輪數")
+    parser.add_argument("--repeats", type=int, default=3, help="計時輪數")
+    parser.add_argument("--entries", nargs="+", choices=list(ENTRY_POINTS), default=list(ENTRY_POINTS),
+                        help="要計時的入口函式")
+    parser.add_argument("--output", "-o", default="-", help="JSON 結果輸出檔，省略或 - 表示標準輸出")
+    parser.add_argument("--baseline", help="與這個基準檔比較，退步超過門檻時結束代碼為 1")
+    parser.add_argument("--save-baseline", help="把這次結果另存為基準檔")
+    parser.add_argument("--metric", choices=("mean_us", "p50_us", "p99_us"), default="p50_us", help="比較用的指標")
+    parser.add_argument("--threshold", type=float, default=0.25, help="容許的退步比例（0.25 = 慢25%%）")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = build_corpus(args.seed, args.per_stratum)
+    print(f"語料: {len(STRATA)} 層 x {args.per_stratum} 手，建立耗時 {time.perf_counter() - start:.1f} 秒",
+          file=sys.stderr)
+
+    report = {
+        'meta': {
+            'seed': args.seed,
+            'per_stratum': args.per_stratum,
+            'warmup': args.warmup,
+            'repeats': args.repeats,
+            'corpus_digest': corpus_digest(corpus),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'disk_tables': calculate_shanten._DISK_TABLES is not None,
+        },
+        'results': run_suite(corpus, args.entries, args.warmup, args.repeats),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(report, baseline, args.metric, args.threshold)
+        except ValueError as e:
+            print(f"無法比較: {e}", file=sys.stderr)
+            sys.exit(2)
+        if regressions:
+            print(f"\n效能退步（{args.metric} 超過 {args.threshold:.0%}）:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\n與基準比較: 沒有超過 {args.threshold:.0%} 的退步", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
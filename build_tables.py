@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+建立進聽數磁碟查表
+預先計算所有花色圖形的拆解表、等待表與和牌表，寫入帶有版本與 CRC32 檢查碼的二進位檔。
+calculate_shanten.py 匯入時會以 memmap 載入此檔案，不需要在每個行程重新建表。
+
+用法: python build_tables.py [--output shanten_tables.bin] [--check]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from calculate_shanten import DEFAULT_TABLE_PATH, build_tables, verify_tables
+
+def main():
+    parser = argparse.ArgumentParser(description="建立進聽數磁碟查表")
+    parser.add_argument("--output", "-o", default=DEFAULT_TABLE_PATH, help="輸出檔案路徑")
+    parser.add_argument("--check", action="store_true", help="只檢查現有檔案是否正確，不重新建立")
+    args = parser.parse_args()
+
+    if args.check:
+        problem = verify_tables(args.output)
+        if problem:
+            print(f"查表檔案 {args.output} 無法使用: {problem}")
+            sys.exit(1)
+        print(f"查表檔案 {args.output} 正確")
+        return
+
+    start = time.perf_counter()
+    path = build_tables(args.output)
+    elapsed = time.perf_counter() - start
+    problem = verify_tables(path)
+    if problem:
+        print(f"建立後檢查失敗: {problem}")
+        sys.exit(1)
+    print(f"已建立 {path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB），耗時 {elapsed:.2f} 秒")
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,1063 @@
-from typing import List, Dict, Tuple, Set, Any
-from collections import defaultdict
+import operator
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import List, Dict, Tuple, Set, Any, Optional, Iterable, Iterator, Callable
+from collections import defaultdict, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+import numpy as np
+
+# 34 種牌的索引：0-8 萬、9-17 筒、18-26 條、27-33 東南西北中發白
+TILE_LABELS = ([f"{i}m" for i in range(1, 10)] +
+               [f"{i}p" for i in range(1, 10)] +
+               [f"{i}s" for i in range(1, 10)] +
+               ['east', 'south', 'west', 'north', 'middle', 'fa', 'white'])
+_TILE_INDEX = {label: i for i, label in enumerate(TILE_LABELS)}
+
+# 數字牌三種花色在計數陣列中的起始索引
+_SUIT_BASES = (0, 9, 18)
+_HONOR_BASE = 27
+
+# _all_tile_labels 的順序（1m, 1p, 1s, 2m, ...）對應的索引，維持等待牌/進牌列表的輸出順序
+_LABEL_ORDER = [i + base for i in range(9) for base in _SUIT_BASES] + list(range(_HONOR_BASE, 34))
+_ALL_TILE_LABELS = tuple(TILE_LABELS[index] for index in _LABEL_ORDER)
+
+# 手牌鍵：每種牌的張數以3個位元記錄，34種牌依索引打包成一個整數（第 i 種牌在第 3i 位）。
+# 摸牌、打牌只要加減 _TILE_BITS[i]；萬、筒、條各佔27位、字牌佔21位，
+# 右移 _GROUP_SHIFTS[g] 再以 _GROUP_MASKS[g] 遮罩就是該組的鍵，拆解表、等待表、和牌表都以組鍵查詢。
+# 3個位元最多只能表示7張，因此手牌中每種牌不能超過4張（見 _hand_to_counts）
+_KEY_BITS = 3
+_KEY_FIELD = (1 << _KEY_BITS) - 1
+_TILE_BITS = tuple(1 << (_KEY_BITS * i) for i in range(34))
+_GROUP_SHIFTS = (0, 9 * _KEY_BITS, 18 * _KEY_BITS, 27 * _KEY_BITS)
+_GROUP_MASKS = ((1 << 9 * _KEY_BITS) - 1,) * 3 + ((1 << 7 * _KEY_BITS) - 1,)
+# 每格最低位為1的遮罩，用來以 bit_count 算出鍵中的總張數
+_LOW_BITS = sum(_TILE_BITS)
+# 進聽數快取的鍵再把組數放在34種牌的位元之上
+_BLOCKS_SHIFT = 34 * _KEY_BITS
+
+
+# 牌字符串 -> 該種牌一張的位元
+_TILE_KEYS = {label: _TILE_BITS[i] for i, label in enumerate(TILE_LABELS)}
+
+
+def _counts_key(counts: Iterable[int]) -> int:
+    """計數陣列（34格，或一組的9/7格）打包成鍵"""
+    return sum(map(operator.mul, counts, _TILE_BITS))
+
+
+def _hand_key(hand: List[str]) -> int:
+    """牌字符串列表直接打包成手牌鍵，不經過計數陣列
+
+    每種牌超過4張時拋出 ValueError：5~7張可由該格的位元看出，
+    8張以上會進位到下一格，鍵中的總張數就會比手牌少。
+    """
+    try:
+        key = sum(map(_TILE_KEYS.__getitem__, hand))
+    except KeyError as e:
+        raise ValueError(f"無法解析牌: {e.args[0]}") from None
+    if (key >> 2) & (key | key >> 1) & _LOW_BITS or _key_tiles(key) != len(hand):
+        tile = next(tile for tile in hand if hand.count(tile) > 4)
+        raise ValueError(f"每種牌最多4張，{tile} 超過4張")
+    return key
+
+
+def _key_to_counts(key: int) -> List[int]:
+    """手牌鍵還原成34格計數陣列"""
+    return [(key >> (_KEY_BITS * i)) & _KEY_FIELD for i in range(34)]
+
+
+def _group_keys(key: int) -> Tuple[int, int, int, int]:
+    """手牌鍵拆成萬、筒、條、字牌四組的組鍵"""
+    return (key & _GROUP_MASKS[0], (key >> _GROUP_SHIFTS[1]) & _GROUP_MASKS[1],
+            (key >> _GROUP_SHIFTS[2]) & _GROUP_MASKS[2], key >> _GROUP_SHIFTS[3])
+
+
+def _key_count(key: int, index: int) -> int:
+    """鍵中第 index 格的張數"""
+    return (key >> (_KEY_BITS * index)) & _KEY_FIELD
+
+
+def _key_tiles(key: int) -> int:
+    """鍵中的總張數（每格的三個位元分別以 bit_count 計數，不需要逐格拆開）"""
+    return ((key & _LOW_BITS).bit_count() + 2 * (key & _LOW_BITS << 1).bit_count()
+            + 4 * (key & _LOW_BITS << 2).bit_count())
+
+# 牌字符串與 (類型, 數字) 的對照，匯入時建立一次
+_WORD_TILES = {
+    'east': ('feng', 1),
+    'south': ('feng', 2),
+    'west': ('feng', 3),
+    'north': ('feng', 4),
+    'middle': ('sanyuan', 1),
+    'fa': ('sanyuan', 2),
+    'white': ('sanyuan', 3)
+}
+_WORD_TILE_STRINGS = {value: tile for tile, value in _WORD_TILES.items()}
+_SUIT_TYPES = {'m': 'wan', 'p': 'tong', 's': 'suo'}
+_SUIT_LETTERS = {tile_type: suit for suit, tile_type in _SUIT_TYPES.items()}
+
+# 中文顯示用的對照
+_WORD_TILES_CHINESE = {
+    'east': '東',
+    'south': '南',
+    'west': '西',
+    'north': '北',
+    'middle': '中',
+    'fa': '發',
+    'white': '白'
+}
+_NUMBER_CHINESE = {
+    1: '一', 2: '二', 3: '三', 4: '四', 5: '五',
+    6: '六', 7: '七', 8: '八', 9: '九'
+}
+_SUIT_CHINESE = {'m': '萬', 'p': '筒', 's': '條'}
+_SUIT_ORDER = (('wan', '萬'), ('tong', '筒'), ('suo', '條'))
+
+# ------------------------------------------------------------
+# 分花色拆解表
+# ------------------------------------------------------------
+# 台灣麻將和牌需要五組面子加一對將，一手牌最多只會用到五個「組」（面子或搭子）
+_MAX_BLOCKS = 5
+# 表項中「不可能」的值（例如沒有對子卻要求有將），取負值讓它在取最大值時被淘汰
+_IMPOSSIBLE = -64
+
+# 單一花色（9格）或字牌（7格）的組鍵 -> 拆解表項
+# 表項為長度12的 tuple：前6格是不含將、後6格是含一對將的情況，
+# 第 k 格是「最多使用 k 個組」時能得到的最大價值 2*面子 + 搭子 (+1 若含將)
+_SUIT_TABLE: Dict[int, Tuple[int, ...]] = {}
+_HONOR_TABLE: Dict[int, Tuple[int, ...]] = {}
+
+_EMPTY_ENTRY = (0,) * (_MAX_BLOCKS + 1) + (_IMPOSSIBLE,) * (_MAX_BLOCKS + 1)
+
+# 萬、筒、條、字牌四組中，除了自己以外的另外三組
+_OTHER_GROUPS = ((1, 2, 3), (0, 2, 3), (0, 1, 3), (0, 1, 2))
+
+
+def _suit_entry(key: int) -> Tuple[int, ...]:
+    """查詢（必要時從磁碟表讀取或建立）數字牌某花色組鍵的拆解表項"""
+    entry = _SUIT_TABLE.get(key)
+    if entry is None:
+        entry = _disk_entry(key, False) or _build_entry(key, False)
+        _SUIT_TABLE[key] = entry
+    return entry
+
+
+def _honor_entry(key: int) -> Tuple[int, ...]:
+    """查詢（必要時從磁碟表讀取或建立）字牌組鍵的拆解表項"""
+    entry = _HONOR_TABLE.get(key)
+    if entry is None:
+        entry = _disk_entry(key, True) or _build_entry(key, True)
+        _HONOR_TABLE[key] = entry
+    return entry
+
+
+def _build_entry(key: int, honors: bool) -> Tuple[int, ...]:
+    """窮舉拆解一個花色的組鍵，計算其表項
+
+    以最小的一張牌為準，它只可能是：單張、刻子、順子、對子搭子、將、
+    連續搭子或間隔搭子的一部分，逐一移除後遞迴查表（子圖形也會被存進表中）。
+    移除牌就是把組鍵減去該格的位元，不需要複製計數。
+    """
+    if key == 0:
+        return _EMPTY_ENTRY
+    # 最低的非零位元所在的格就是最小的一張牌
+    first = ((key & -key).bit_length() - 1) // _KEY_BITS
+    one = _TILE_BITS[first]
+    # 數字牌超出第9格的位元一定是0，不需要另外檢查邊界
+    next_one = one << _KEY_BITS
+    gap_one = one << 2 * _KEY_BITS
+
+    lookup = _honor_entry if honors else _suit_entry
+    size = _MAX_BLOCKS + 1
+
+    # 單張：不使用任何組
+    best = list(lookup(key - one))
+
+    def add_block(sub: Tuple[int, ...], value: int) -> None:
+        for h in (0, size):
+            for k in range(1, size):
+                prev = sub[h + k - 1]
+                if prev >= 0 and prev + value > best[h + k]:
+                    best[h + k] = prev + value
+
+    count = _key_count(key, first)
+    has_next = not honors and _key_count(key, first + 1) > 0
+    has_gap = not honors and _key_count(key, first + 2) > 0
+
+    if count >= 3:
+        add_block(lookup(key - 3 * one), 2)
+    if has_next and has_gap:
+        add_block(lookup(key - one - next_one - gap_one), 2)
+    if count >= 2:
+        sub = lookup(key - 2 * one)
+        add_block(sub, 1)
+        # 作為將：不佔組，但價值 +1
+        for k in range(size):
+            if sub[k] + 1 > best[size + k]:
+                best[size + k] = sub[k] + 1
+    if has_next:
+        add_block(lookup(key - one - next_one), 1)
+    if has_gap:
+        add_block(lookup(key - one - gap_one), 1)
+
+    return tuple(best)
+
+
+def _merge_entries(a: Tuple[int, ...], b: Tuple[int, ...]) -> Tuple[int, ...]:
+    """合併兩組表項（max-plus 卷積），結果的格式與單一表項相同"""
+    if a is _EMPTY_ENTRY:
+        return b
+    if b is _EMPTY_ENTRY:
+        return a
+    size = _MAX_BLOCKS + 1
+    merged = [_IMPOSSIBLE] * (2 * size)
+    for k in range(size):
+        best0 = best1 = _IMPOSSIBLE
+        for j in range(k + 1):
+            a0, a1 = a[j], a[size + j]
+            b0, b1 = b[k - j], b[size + k - j]
+            if a0 + b0 > best0:
+                best0 = a0 + b0
+            # 將只能出現在其中一組
+            if a1 >= 0 and a1 + b0 > best1:
+                best1 = a1 + b0
+            if b1 >= 0 and a0 + b1 > best1:
+                best1 = a0 + b1
+        merged[k] = best0
+        merged[size + k] = best1
+    return tuple(merged)
+
+
+def _best_value(a: Tuple[int, ...], b: Tuple[int, ...], blocks: int = _MAX_BLOCKS) -> int:
+    """合併兩組表項，只計算最多使用 blocks 個組時的最大價值"""
+    size = _MAX_BLOCKS + 1
+    best = _IMPOSSIBLE
+    for j in range(blocks + 1):
+        a0, a1 = a[j], a[size + j]
+        b0, b1 = b[blocks - j], b[size + blocks - j]
+        if a0 + b0 > best:
+            best = a0 + b0
+        if a1 >= 0 and a1 + b0 > best:
+            best = a1 + b0
+        if b1 >= 0 and a0 + b1 > best:
+            best = a0 + b1
+    return best
+
+
+def _combine_entries(entries: List[Tuple[int, ...]], blocks: int = _MAX_BLOCKS) -> int:
+    """合併各花色的表項，返回最多使用 blocks 個組、最多一對將時的最大價值"""
+    acc = _EMPTY_ENTRY
+    for entry in entries[:-1]:
+        acc = _merge_entries(acc, entry)
+    return _best_value(acc, entries[-1], blocks)
+
+
+def _table_shanten(key: int, blocks: int = _MAX_BLOCKS) -> int:
+    """以拆解表計算手牌鍵的進聴數
+
+    進聴數 = 2 * blocks - (2 * 面子 + 搭子 + 將)，其中面子與搭子合計最多 blocks 組
+    （沒有副露時為5組，每副露一組就少一組）。
+    16張牌時 0 代表聽牌，17張牌時 -1 代表已經和牌。
+    """
+    man, pin, sou, honor = _group_keys(key)
+    entries = [_suit_entry(man), _suit_entry(pin), _suit_entry(sou), _honor_entry(honor)]
+    return 2 * blocks - _combine_entries(entries, blocks)
+
+
+# ------------------------------------------------------------
+# 和牌圖形表
+# ------------------------------------------------------------
+# 是否為字牌 -> {可以剛好拆完的組鍵: 0（全是面子）或 1（面子加一對將）}，第一次使用時列舉建立
+# 整張表建好後才放進來，其他執行緒不會看到只建了一半的表
+_COMPLETE_PATTERNS: Dict[bool, Dict[int, int]] = {}
+
+
+def _complete_patterns(honors: bool) -> Dict[int, int]:
+    """列舉（必要時）一組最多5個面子、最多一對將、每種牌不超過4張的所有和牌圖形"""
+    table = _COMPLETE_PATTERNS.get(honors)
+    if table is not None:
+        return table
+    table = {}
+
+    width = 7 if honors else 9
+    melds = [(i, i, i) for i in range(width)]
+    if not honors:
+        melds += [(i, i + 1, i + 2) for i in range(width - 2)]
+
+    def added(pattern: Tuple[int, ...], indices: Tuple[int, ...]) -> Optional[Tuple[int, ...]]:
+        counts = list(pattern)
+        for i in indices:
+            counts[i] += 1
+            if counts[i] > 4:
+                return None
+        return tuple(counts)
+
+    # 逐層加入面子，每層去除重複圖形
+    level = {(0,) * width}
+    no_head = set(level)
+    for _ in range(_MAX_BLOCKS):
+        level = {new for pattern in level for meld in melds
+                 if (new := added(pattern, meld)) is not None}
+        no_head |= level
+
+    for pattern in no_head:
+        table[_counts_key(pattern)] = 0
+    for pattern in no_head:
+        for i in range(width):
+            with_head = added(pattern, (i, i))
+            if with_head is not None:
+                table[_counts_key(with_head)] = 1
+    _COMPLETE_PATTERNS[honors] = table
+    return table
+
+
+def _table_complete(key: int) -> bool:
+    """以和牌圖形表判斷手牌鍵是否和牌：每組都剛好拆完，且整手恰好一對將"""
+    groups = _group_keys(key)
+    if _DISK_TABLES is not None:
+        heads = 0
+        for group, group_key in enumerate(groups):
+            row = _disk_lookup('honor_complete' if group == 3 else 'suit_complete', group_key, group == 3)
+            if row is None:
+                break
+            if row < 0:
+                return False
+            heads += int(row)
+        else:
+            return heads == 1
+
+    suits = _complete_patterns(False)
+    heads = 0
+    for group_key in groups[:3]:
+        head = suits.get(group_key)
+        if head is None:
+            return False
+        heads += head
+    head = _complete_patterns(True).get(groups[3])
+    if head is None:
+        return False
+    return heads + head == 1
+
+
+# ------------------------------------------------------------
+# 聽牌等待表
+# ------------------------------------------------------------
+# 花色組鍵 -> (不含將, 含將) 兩個位元遮罩：第 x 位為1代表摸進該花色第 x 張後
+# 這一組可以剛好拆成全部面子（或全部面子加一對將）
+_SUIT_WAIT_TABLE: Dict[int, Tuple[int, int]] = {}
+_HONOR_WAIT_TABLE: Dict[int, Tuple[int, int]] = {}
+
+
+def _entry_complete(entry: Tuple[int, ...], tiles: int, head: bool) -> bool:
+    """由拆解表項判斷 tiles 張牌能否剛好拆成全部面子（head 為 True 時再加一對將）
+
+    價值剛好等於 2 * 面子數 (+1) 代表所有組都是面子，而且用完了全部的牌。
+    """
+    if head:
+        tiles -= 2
+        if tiles < 0:
+            return False
+    melds, rest = divmod(tiles, 3)
+    if rest or melds > _MAX_BLOCKS:
+        return False
+    if head:
+        return entry[_MAX_BLOCKS + 1 + melds] == 2 * melds + 1
+    return entry[melds] == 2 * melds
+
+
+def _group_waits(key: int, honors: bool) -> Tuple[int, int]:
+    """查詢（必要時建立）一組組鍵的等待牌遮罩 (不含將, 含將)；已有4張的牌不算等待牌"""
+    table = _HONOR_WAIT_TABLE if honors else _SUIT_WAIT_TABLE
+    waits = table.get(key)
+    if waits is None:
+        tiles = _key_tiles(key)
+        row = _disk_lookup('honor_waits' if honors else 'suit_waits', key, honors) \
+            if tiles < _TABLE_MAX_TILES else None
+        if row is not None:
+            waits = (int(row[0]), int(row[1]))
+        else:
+            lookup = _honor_entry if honors else _suit_entry
+            no_head = with_head = 0
+            for x in range(7 if honors else 9):
+                if _key_count(key, x) >= 4:
+                    continue
+                entry = lookup(key + _TILE_BITS[x])
+                if _entry_complete(entry, tiles + 1, False):
+                    no_head |= 1 << x
+                if _entry_complete(entry, tiles + 1, True):
+                    with_head |= 1 << x
+            waits = (no_head, with_head)
+        table[key] = waits
+    return waits
+
+
+def _table_waits(key: int) -> List[int]:
+    """以等待表找出摸進後可以和牌的牌（索引依 _LABEL_ORDER 排列）
+
+    和牌時每一組都必須剛好拆完，且整手只有一組含將：
+    摸進的那組含將時其他組都要全是面子；摸進的那組不含將時其他組恰好一組含將。
+    """
+    groups = _group_keys(key)
+    status = []
+    for group, group_key in enumerate(groups):
+        entry = _honor_entry(group_key) if group == 3 else _suit_entry(group_key)
+        tiles = _key_tiles(group_key)
+        if _entry_complete(entry, tiles, False):
+            status.append(0)
+        elif _entry_complete(entry, tiles, True):
+            status.append(1)
+        else:
+            status.append(None)
+    
+    waits = set()
+    for group, group_key in enumerate(groups):
+        others = [status[other] for other in _OTHER_GROUPS[group]]
+        if None in others:
+            continue
+        heads = sum(others)
+        if heads > 1:
+            continue
+        mask = _group_waits(group_key, group == 3)[0 if heads else 1]
+        base = _HONOR_BASE if group == 3 else _SUIT_BASES[group]
+        x = 0
+        while mask:
+            if mask & 1:
+                waits.add(base + x)
+            mask >>= 1
+            x += 1
+    return [index for index in _LABEL_ORDER if index in waits]
+
+
+# ------------------------------------------------------------
+# 批次查表（NumPy）
+# ------------------------------------------------------------
+# 花色計數轉成5進位整數鍵的權重（每格 0~4 張）
+_BASE5_WEIGHTS = 5 ** np.arange(9, dtype=np.int64)
+
+
+def _batch_entries(patterns: np.ndarray, honors: bool) -> np.ndarray:
+    """批次查詢某一組（一種花色或字牌）的表項
+
+    先把每列計數編成5進位整數鍵；有磁碟表時直接以鍵取出表項，
+    否則相同圖形只查一次表，再依索引展開回每一列。
+
+    Args:
+        patterns: (N, 9) 或 (N, 7) 的計數陣列
+        honors: 是否為字牌
+
+    Returns:
+        np.ndarray: (N, 12) 的 int16 表項陣列
+    """
+    keys = patterns.astype(np.int64) @ _BASE5_WEIGHTS[:patterns.shape[1]]
+    if _DISK_TABLES is not None:
+        # 有磁碟表時直接以索引取出，只有未預先建立的圖形才改為逐一查詢
+        entries = _DISK_TABLES['honor_entries' if honors else 'suit_entries'][keys].astype(np.int16)
+        missing = entries[:, 0] == _TABLE_MISSING
+        if missing.any():
+            entries[missing] = _batch_entries_lookup(patterns[missing], keys[missing], honors)
+        return entries
+    return _batch_entries_lookup(patterns, keys, honors)
+
+
+def _batch_entries_lookup(patterns: np.ndarray, keys: np.ndarray, honors: bool) -> np.ndarray:
+    """相同圖形只查一次 dict 表（必要時建立），再依索引展開回每一列"""
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    lookup = _honor_entry if honors else _suit_entry
+    table = np.array([lookup(_counts_key(patterns[row].tolist())) for row in first], dtype=np.int16)
+    return table[inverse.reshape(-1)]
+
+
+def _merge_entries_batch(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """_merge_entries 的向量化版本，對 (N, 12) 表項陣列逐列合併"""
+    size = _MAX_BLOCKS + 1
+    merged = np.full(a.shape, _IMPOSSIBLE, dtype=np.int16)
+    for k in range(size):
+        for j in range(k + 1):
+            np.maximum(merged[:, k], a[:, j] + b[:, k - j], out=merged[:, k])
+            # 將只能出現在其中一組；沒有將的一方若為不可能值，相加後仍為負數
+            np.maximum(merged[:, size + k], a[:, size + j] + b[:, k - j], out=merged[:, size + k])
+            np.maximum(merged[:, size + k], a[:, j] + b[:, size + k - j], out=merged[:, size + k])
+    # 把「不可能 + 某值」的結果統一回 _IMPOSSIBLE，避免多次合併後累加成非負數
+    merged[merged < 0] = _IMPOSSIBLE
+    return merged
+
+
+def _batch_table_shanten(counts: np.ndarray) -> np.ndarray:
+    """以拆解表批次計算 (N, 34) 計數陣列的進聽數，公式與 _table_shanten 相同"""
+    acc = _batch_entries(counts[:, 0:9], False)
+    for base in _SUIT_BASES[1:]:
+        acc = _merge_entries_batch(acc, _batch_entries(counts[:, base:base + 9], False))
+    acc = _merge_entries_batch(acc, _batch_entries(counts[:, _HONOR_BASE:34], True))
+    value = np.maximum(acc[:, _MAX_BLOCKS], acc[:, 2 * _MAX_BLOCKS + 1])
+    return (2 * _MAX_BLOCKS - value).astype(np.int8)
+
+
+# ------------------------------------------------------------
+# 磁碟查表（memmap）
+# ------------------------------------------------------------
+# build_tables.py 會預先建立所有圖形的拆解表、等待表與和牌表，存成一個二進位檔。
+# 匯入時只用 np.memmap 對應檔案，不需要重建；多個行程（包括行程池的工作行程）共用同一份分頁。
+# 各表以5進位索引（_pattern_key，由組鍵換算）直接定位，查到的結果仍會放進上面的 dict 快取。
+_TABLE_MAGIC = b"SHTB"
+# 建表方式改變時要加1，舊檔案就會被視為過期
+_TABLE_VERSION = 1
+# 預先建立到每組17張（摸牌後整手牌都在同一組）；等待表則到16張
+_TABLE_MAX_TILES = 17
+# 檔頭：magic、版本、_MAX_BLOCKS、_IMPOSSIBLE、_TABLE_MAX_TILES、資料長度、資料的 CRC32
+_TABLE_HEADER = struct.Struct("<4sIIiIII")
+_TABLE_HEADER_SIZE = 64
+# 未預先建立的表項（超過 _TABLE_MAX_TILES 張）第0格填入此值，查詢時改為動態建立
+_TABLE_MISSING = -128
+
+DEFAULT_TABLE_PATH = os.environ.get(
+    "SHANTEN_TABLES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "shanten_tables.bin"))
+
+# 已載入的磁碟表（名稱 -> 唯讀的 memmap 陣列），None 表示沒有載入
+_DISK_TABLES: Optional[Dict[str, np.ndarray]] = None
+
+
+def _table_layout() -> List[Tuple[str, Any, Tuple[int, ...]]]:
+    """檔案中各陣列依序的 (名稱, 型別, 形狀)；uint16 陣列放在前面以維持對齊"""
+    suits, honors = 5 ** 9, 5 ** 7
+    size = 2 * (_MAX_BLOCKS + 1)
+    return [
+        ('suit_waits', np.uint16, (suits, 2)),
+        ('honor_waits', np.uint16, (honors, 2)),
+        ('suit_entries', np.int8, (suits, size)),
+        ('honor_entries', np.int8, (honors, size)),
+        ('suit_complete', np.int8, (suits,)),
+        ('honor_complete', np.int8, (honors,)),
+    ]
+
+
+def _pattern_key(key: int, width: int) -> Optional[int]:
+    """組鍵換算成5進位索引（第 i 格的權重為 5**i，與 _BASE5_WEIGHTS 相同）；有超過4張的牌時返回 None"""
+    index = 0
+    for i in reversed(range(width)):
+        count = _key_count(key, i)
+        if count > 4:
+            return None
+        index = index * 5 + count
+    return index
+
+
+def _disk_lookup(name: str, key: int, honors: bool) -> Optional[np.ndarray]:
+    """從磁碟表讀出一組組鍵的那一列；沒有載入或圖形超出範圍時返回 None"""
+    if _DISK_TABLES is None:
+        return None
+    index = _pattern_key(key, 7 if honors else 9)
+    if index is None:
+        return None
+    return _DISK_TABLES[name][index]
+
+
+def _disk_entry(key: int, honors: bool) -> Optional[Tuple[int, ...]]:
+    """從磁碟表讀出拆解表項；未預先建立時返回 None"""
+    row = _disk_lookup('honor_entries' if honors else 'suit_entries', key, honors)
+    if row is None or row[0] == _TABLE_MISSING:
+        return None
+    return tuple(row.tolist())
+
+
+def _build_table_arrays(width: int, honors: bool) -> Dict[str, np.ndarray]:
+    """以向量化方式建立一組（9格花色或7格字牌）所有圖形的三種表
+
+    依張數由少到多逐層計算，每層的拆法與 _build_entry 相同（以最小的一張牌為準），
+    子圖形張數較少，已在前面的層算好，直接以索引取出。
+    """
+    size = _MAX_BLOCKS + 1
+    total = 5 ** width
+    weights = _BASE5_WEIGHTS[:width]
+    keys = np.arange(total, dtype=np.int64)
+    digits = np.empty((total, width), dtype=np.int8)
+    for i in range(width):
+        digits[:, i] = (keys // weights[i]) % 5
+    sums = digits.sum(axis=1, dtype=np.int16)
+
+    entries = np.full((total, 2 * size), _IMPOSSIBLE, dtype=np.int16)
+    entries[sums > _TABLE_MAX_TILES, 0] = _TABLE_MISSING
+    entries[0] = _EMPTY_ENTRY
+
+    for tiles in range(1, _TABLE_MAX_TILES + 1):
+        rows = np.nonzero(sums == tiles)[0]
+        patterns = digits[rows]
+        index = np.arange(len(rows))
+        first = np.argmax(patterns > 0, axis=1)
+        key = keys[rows]
+        step = weights[first]
+        count = patterns[index, first]
+        if honors:
+            has_next = has_gap = np.zeros(len(rows), dtype=bool)
+        else:
+            has_next = (first + 1 < width) & (patterns[index, np.minimum(first + 1, width - 1)] > 0)
+            has_gap = (first + 2 < width) & (patterns[index, np.minimum(first + 2, width - 1)] > 0)
+        step_next = weights[np.minimum(first + 1, width - 1)]
+        step_gap = weights[np.minimum(first + 2, width - 1)]
+
+        # 單張：不使用任何組
+        best = entries[key - step].copy()
+
+        def add_block(mask: np.ndarray, sub_keys: np.ndarray, value: int) -> None:
+            sub = entries[sub_keys[mask]]
+            for h in (0, size):
+                for k in range(1, size):
+                    prev = sub[:, h + k - 1]
+                    candidate = np.where(prev >= 0, prev + value, _IMPOSSIBLE)
+                    best[mask, h + k] = np.maximum(best[mask, h + k], candidate)
+
+        add_block(count >= 3, key - 3 * step, 2)
+        add_block(has_next & has_gap, key - step - step_next - step_gap, 2)
+        pair = count >= 2
+        add_block(pair, key - 2 * step, 1)
+        # 作為將：不佔組，但價值 +1
+        sub = entries[(key - 2 * step)[pair]]
+        best[pair, size:] = np.maximum(best[pair, size:], sub[:, :size] + 1)
+        add_block(has_next, key - step - step_next, 1)
+        add_block(has_gap, key - step - step_gap, 1)
+
+        entries[rows] = best
+
+    def complete(rows_entries: np.ndarray, tiles: np.ndarray, head: bool) -> np.ndarray:
+        """_entry_complete 的向量化版本"""
+        if head:
+            tiles = tiles - 2
+        melds = tiles // 3
+        valid = (tiles >= 0) & (tiles % 3 == 0) & (melds <= _MAX_BLOCKS)
+        column = np.clip(melds, 0, _MAX_BLOCKS) + (size if head else 0)
+        values = np.take_along_axis(rows_entries, column[:, None].astype(np.int64), axis=1)[:, 0]
+        return valid & (values == 2 * melds + (1 if head else 0))
+
+    built = sums <= _TABLE_MAX_TILES
+    complete_flags = np.full(total, -1, dtype=np.int8)
+    complete_flags[built & complete(entries, sums, False)] = 0
+    complete_flags[built & complete(entries, sums, True)] = 1
+
+    waits = np.zeros((total, 2), dtype=np.uint16)
+    for x in range(width):
+        rows = np.nonzero((sums < _TABLE_MAX_TILES) & (digits[:, x] < 4))[0]
+        drawn = entries[keys[rows] + weights[x]]
+        tiles = sums[rows] + 1
+        waits[rows[complete(drawn, tiles, False)], 0] |= 1 << x
+        waits[rows[complete(drawn, tiles, True)], 1] |= 1 << x
+
+    return {'entries': entries.astype(np.int8), 'waits': waits, 'complete': complete_flags}
+
+
+def build_tables(path: Optional[str] = None) -> str:
+    """建立磁碟查表檔案（先寫入暫存檔再替換，其他行程不會讀到寫一半的檔案）
+
+    Args:
+        path: 輸出路徑，None 時使用 DEFAULT_TABLE_PATH
+
+    Returns:
+        str: 寫入的檔案路徑
+    """
+    path = path or DEFAULT_TABLE_PATH
+    suit = _build_table_arrays(9, False)
+    honor = _build_table_arrays(7, True)
+    arrays = {
+        'suit_waits': suit['waits'], 'honor_waits': honor['waits'],
+        'suit_entries': suit['entries'], 'honor_entries': honor['entries'],
+        'suit_complete': suit['complete'], 'honor_complete': honor['complete'],
+    }
+
+    payload_size = 0
+    crc = 0
+    for name, dtype, shape in _table_layout():
+        data = np.ascontiguousarray(arrays[name], dtype=dtype)
+        assert data.shape == shape
+        payload_size += data.nbytes
+        crc = zlib.crc32(data.tobytes(), crc)
+
+    header = _TABLE_HEADER.pack(_TABLE_MAGIC, _TABLE_VERSION, _MAX_BLOCKS, _IMPOSSIBLE,
+                                _TABLE_MAX_TILES, payload_size, crc)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header.ljust(_TABLE_HEADER_SIZE, b"\0"))
+        for name, dtype, _ in _table_layout():
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+    os.replace(temp_path, path)
+    return path
+
+
+def _read_table_header(path: str) -> Optional[str]:
+    """檢查檔頭，檔案可用時返回 None，否則返回原因"""
+    with open(path, "rb") as f:
+        raw = f.read(_TABLE_HEADER.size)
+    if len(raw) < _TABLE_HEADER.size:
+        return "檔頭不完整"
+    magic, version, blocks, impossible, max_tiles, payload_size, _ = _TABLE_HEADER.unpack(raw)
+    if magic != _TABLE_MAGIC:
+        return "不是進聽數查表檔案"
+    if (version, blocks, impossible, max_tiles) != (_TABLE_VERSION, _MAX_BLOCKS, _IMPOSSIBLE, _TABLE_MAX_TILES):
+        return f"版本或參數不符（檔案版本 {version}，目前版本 {_TABLE_VERSION}）"
+    expected = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, dtype, shape in _table_layout())
+    if payload_size != expected or os.path.getsize(path) != _TABLE_HEADER_SIZE + expected:
+        return "檔案大小不符"
+    return None
+
+
+def verify_tables(path: Optional[str] = None) -> Optional[str]:
+    """完整檢查磁碟查表檔案（包含 CRC32），檔案正確時返回 None，否則返回原因"""
+    path = path or DEFAULT_TABLE_PATH
+    if not os.path.exists(path):
+        return "檔案不存在"
+    problem = _read_table_header(path)
+    if problem:
+        return problem
+    with open(path, "rb") as f:
+        crc_expected = _TABLE_HEADER.unpack(f.read(_TABLE_HEADER.size))[-1]
+        f.seek(_TABLE_HEADER_SIZE)
+        crc = 0
+        while True:
+            chunk = f.read(1 << 22)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    if crc != crc_expected:
+        return "CRC32 檢查碼不符"
+    return None
+
+
+def load_tables(path: Optional[str] = None, rebuild: bool = False) -> bool:
+    """以 memmap 載入磁碟查表檔案
+
+    載入前以 verify_tables 檢查檔頭與 CRC32（約 10 毫秒，不會複製資料）。
+    檔案過期或損毀時預設只提示並改回動態建表（匯入時使用，不會寫入檔案）；
+    rebuild 為 True 時以 build_tables 重新建立（寫入暫存檔後以 os.replace 替換，約 1 秒）再載入。
+    沒有檔案時維持動態建表。
+
+    Args:
+        path: 查表檔案路徑，None 時使用 DEFAULT_TABLE_PATH
+        rebuild: 檔案過期或損毀時是否重新建立
+
+    Returns:
+        bool: 是否成功載入
+
+    Raises:
+        RuntimeError: rebuild 為 True，但檔案無法重新建立（例如目錄沒有寫入權限）
+    """
+    global _DISK_TABLES
+    path = path or DEFAULT_TABLE_PATH
+    if not os.path.exists(path):
+        _DISK_TABLES = None
+        return False
+    problem = verify_tables(path)
+    if problem:
+        _DISK_TABLES = None
+        if not rebuild:
+            print(f"警告: 查表檔案 {path} 無法使用（{problem}），改為動態建表；"
+                  f"請執行 python build_tables.py 重新建立", file=sys.stderr)
+            return False
+        try:
+            build_tables(path)
+        except OSError as e:
+            raise RuntimeError(f"查表檔案 {path} 無法使用（{problem}），且無法重新建立: {e}") from e
+        rebuilt = verify_tables(path)
+        if rebuilt:
+            raise RuntimeError(f"查表檔案 {path} 重新建立後仍無法使用（{rebuilt}）")
+
+    tables = {}
+    offset = _TABLE_HEADER_SIZE
+    for name, dtype, shape in _table_layout():
+        tables[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    _DISK_TABLES = tables
+    return True
+
+
+# 匯入時自動載入；沒有檔案或檔案無法使用時維持原本的動態建表（匯入時不會寫入檔案）
+load_tables()
+
+
+# ------------------------------------------------------------
+# 分支定界搜尋（不依賴拆解表的精確算法）
+# ------------------------------------------------------------
+def _value_upper_bound(tiles_left: int, blocks_left: int, has_head: bool) -> int:
+    """剩下 tiles_left 張牌、還能用 blocks_left 個組時，價值最多還能增加多少（樂觀估計）"""
+    melds = min(blocks_left, tiles_left // 3)
+    tatsu = min(blocks_left - melds, (tiles_left - 3 * melds) // 2)
+    return 2 * melds + tatsu + (0 if has_head else 1)
+
+
+def _search_value(counts: List[int], blocks: int = _MAX_BLOCKS) -> int:
+    """以深度優先搜尋拆解整手牌，返回最大價值 2*面子 + 搭子 + 將
+
+    每次處理最小的一張牌，依序嘗試面子、將、搭子與單張；
+    若某分支的樂觀上界無法超過目前最佳值就直接剪枝。
+    """
+    work = list(counts)
+    best = [-1]
+    ceiling = 2 * blocks + 1
+
+    def dfs(pos: int, tiles_left: int, value: int, used: int, has_head: bool) -> None:
+        while pos < 34 and work[pos] == 0:
+            pos += 1
+        if pos == 34:
+            if value > best[0]:
+                best[0] = value
+            return
+        if value + _value_upper_bound(tiles_left, blocks - used, has_head) <= best[0]:
+            return
+
+        in_suit = pos < _HONOR_BASE
+        offset = pos % 9
+        has_next = in_suit and offset <= 7 and work[pos + 1] > 0
+        has_gap = in_suit and offset <= 6 and work[pos + 2] > 0
+
+        if used < blocks:
+            # 刻子
+            if work[pos] >= 3:
+                work[pos] -= 3
+                dfs(pos, tiles_left - 3, value + 2, used + 1, has_head)
+                work[pos] += 3
+            # 順子
+            if has_next and has_gap:
+                work[pos] -= 1
+                work[pos + 1] -= 1
+                work[pos + 2] -= 1
+                dfs(pos, tiles_left - 3, value + 2, used + 1, has_head)
+                work[pos] += 1
+                work[pos + 1] += 1
+                work[pos + 2] += 1
+        if best[0] >= ceiling:
+            return
+        if work[pos] >= 2:
+            # 將
+            if not has_head:
+                work[pos] -= 2
+                dfs(pos, tiles_left - 2, value + 1, used, True)
+                work[pos] += 2
+            # 對子搭子
+            if used < blocks:
+                work[pos] -= 2
+                dfs(pos, tiles_left - 2, value + 1, used + 1, has_head)
+                work[pos] += 2
+        if used < blocks:
+            # 連續搭子、間隔搭子
+            if has_next:
+                work[pos] -= 1
+                work[pos + 1] -= 1
+                dfs(pos, tiles_left - 2, value + 1, used + 1, has_head)
+                work[pos] += 1
+                work[pos + 1] += 1
+            if has_gap:
+                work[pos] -= 1
+                work[pos + 2] -= 1
+                dfs(pos, tiles_left - 2, value + 1, used + 1, has_head)
+                work[pos] += 1
+                work[pos + 2] += 1
+        # 單張
+        if best[0] < ceiling:
+            work[pos] -= 1
+            dfs(pos, tiles_left - 1, value, used, has_head)
+            work[pos] += 1
+
+    dfs(0, sum(work), 0, 0, False)
+    return best[0]
+
+
+def _search_max_melds(counts: List[int]) -> int:
+    """以深度優先搜尋計算最多可以形成的面子數（各花色互相獨立）"""
+    total = 0
+    for base in _SUIT_BASES:
+        total += _search_suit_melds(counts[base:base + 9] + [0, 0], 0)
+    for count in counts[_HONOR_BASE:34]:
+        total += count // 3
+    return total
+
+
+def _search_suit_melds(numbers: List[int], pos: int) -> int:
+    """某花色（末端補兩個0）從 pos 開始最多能拆出的面子數"""
+    while pos < 9 and numbers[pos] == 0:
+        pos += 1
+    if pos == 9:
+        return 0
+
+    best = 0
+    if numbers[pos] >= 3:
+        numbers[pos] -= 3
+        best = 1 + _search_suit_melds(numbers, pos)
+        numbers[pos] += 3
+    # 剩下的牌就算全部湊成面子也無法超過目前最佳值時剪枝
+    if numbers[pos + 1] > 0 and numbers[pos + 2] > 0 and best < sum(numbers[pos:9]) // 3:
+        numbers[pos] -= 1
+        numbers[pos + 1] -= 1
+        numbers[pos + 2] -= 1
+        best = max(best, 1 + _search_suit_melds(numbers, pos))
+        numbers[pos] += 1
+        numbers[pos + 1] += 1
+        numbers[pos + 2] += 1
+    if best < (sum(numbers[pos:9]) - 1) // 3:
+        numbers[pos] -= 1
+        best = max(best, _search_suit_melds(numbers, pos))
+        numbers[pos] += 1
+    return best
+
+class _EngineStats:
+    """ShantenCalculator 的量測資料：各函式的呼叫次數與各階段的耗時"""
+
+    __slots__ = ('calls', 'phases')
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        # 階段名稱 -> [次數, 總秒數, 最長秒數]
+        self.phases: Dict[str, List[float]] = {}
+
+    def count(self, name: str) -> None:
+        self.calls[name] += 1
+
+    def phase(self, name: str, seconds: float) -> None:
+        record = self.phases.get(name)
+        if record is None:
+            self.phases[name] = [1, seconds, seconds]
+        else:
+            record[0] += 1
+            record[1] += seconds
+            if seconds > record[2]:
+                record[2] = seconds
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.phases.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'enabled': True,
+            'calls': dict(self.calls),
+            'phases': {
+                name: {
+                    'calls': calls,
+                    'total_ms': total * 1e3,
+                    'mean_ms': total / calls * 1e3,
+                    'max_ms': longest * 1e3,
+                }
+                for name, (calls, total, longest) in self.phases.items()
+            },
+        }
+
 
 class ShantenCalculator:
     """計算台灣麻將手牌進聽數的類別"""
     
-    def __init__(self):
+    # 可選的進聽數算法：
+    # - "table": 查分花色拆解表（預設，精確且最快）
+    # - "search": 分支定界的深度優先搜尋（精確，不建表）
+    # - "greedy": 舊版的兩段式貪婪算法（刻子優先 / 順子優先），可能高估或低估
+    ALGORITHMS = ("table", "search", "greedy")
+    
+    def __init__(self, algorithm: str = "table", cache_size: int = 0, instrument: bool = False):
+        """
+        Args:
+            algorithm: 進聽數算法，見 ALGORITHMS
+            cache_size: 進聽數快取的最大筆數（LRU 淘汰），0 表示不使用快取
+            instrument: 是否記錄呼叫次數與各階段耗時（見 stats_snapshot），關閉時幾乎沒有額外成本
+        """
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"未知的進聽數算法: {algorithm}，可選: {', '.join(self.ALGORITHMS)}")
+        if cache_size < 0:
+            raise ValueError(f"快取大小不可為負數: {cache_size}")
         self.total_tiles = 4  # 每種牌的總數量
+        self.algorithm = algorithm
+        
+        # 進聽數快取：以位元壓縮的手牌鍵加上組數（key | blocks << _BLOCKS_SHIFT）這個整數為鍵（與牌的順序無關）
+        self.cache_size = cache_size
+        self._cache: Optional[OrderedDict] = OrderedDict() if cache_size > 0 else None
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_evictions = 0
+        
+        # 量測資料，None 表示關閉（每個量測點只多一次 is None 判斷）
+        self._stats: Optional[_EngineStats] = _EngineStats() if instrument else None
+    
+    def enable_instrumentation(self, enabled: bool = True) -> None:
+        """開啟或關閉量測；重新開啟時從零開始記錄"""
+        self._stats = _EngineStats() if enabled else None
+    
+    def stats_snapshot(self) -> Dict[str, Any]:
+        """返回目前的量測結果（複本，之後的呼叫不會改變它）
+        
+        Returns:
+            Dict[str, Any]: 包含：
+                - 'enabled': 是否開啟量測
+                - 'calls': 各函式的呼叫次數（calculate_shanten、suggest_discard、count_improving_tiles、
+                  count_waiting_tiles、can_form_complete_hand；包含 suggest_discard 內部的呼叫）。
+                  'calculate_shanten' 是進聽數的計算次數：除了直接呼叫，也包含 suggest_discard 逐一試打、
+                  進牌與兩巡評估中經由 HandState 的增量計算（快取命中也計入）
+                - 'phases': suggest_discard 各階段的耗時，每項包含 'calls'、'total_ms'、'mean_ms'、'max_ms'：
+                  'shanten'（所有打法的進聽數）、'enrichment'（等待牌與進牌）、
+                  'lookahead'（兩巡評估）、'reason'（建議原因）
+        """
+        if self._stats is None:
+            return {'enabled': False, 'calls': {}, 'phases': {}}
+        return self._stats.snapshot()
+    
+    def reset_stats(self) -> None:
+        """清除量測結果（不改變開關狀態）"""
+        if self._stats is not None:
+            self._stats.reset()
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """返回進聽數快取的統計資訊
+        
+        Returns:
+            Dict[str, Any]: 包含：
+                - 'hits' / 'misses' / 'evictions': 命中、未命中、淘汰次數
+                - 'hit_rate': 命中率（0~1）
+                - 'size' / 'max_size': 目前筆數與上限
+                - 'memory_bytes': 快取佔用記憶體的估計值（位元組）
+        """
+        lookups = self._cache_hits + self._cache_misses
+        size = len(self._cache) if self._cache is not None else 0
+        memory = 0
+        if self._cache is not None:
+            memory = sys.getsizeof(self._cache)
+            if size:
+                # getsizeof 已包含雜湊表與 OrderedDict 的順序節點；鍵是約105位元的整數（各約40位元組），
+                # 值是小整數（直譯器共用，不另計），每筆合計約 150 位元組
+                memory += size * sys.getsizeof(next(iter(self._cache)))
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'evictions': self._cache_evictions,
+            'hit_rate': self._cache_hits / lookups if lookups else 0.0,
+            'size': size,
+            'max_size': self.cache_size,
+            'memory_bytes': memory,
+        }
+    
+    def clear_cache(self) -> None:
+        """清空進聽數快取並重設統計"""
+        if self._cache is not None:
+            self._cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_evictions = 0
+    
+    def _cache_get(self, key: int) -> Optional[int]:
+        """查詢快取，命中時將該筆移到最近使用的位置"""
+        value = self._cache.get(key)
+        if value is None:
+            self._cache_misses += 1
+            return None
+        self._cache_hits += 1
+        self._cache.move_to_end(key)
+        return value
+    
+    def _cache_put(self, key: int, value: int) -> None:
+        """寫入快取，超過上限時淘汰最久未使用的一筆"""
+        self._cache[key] = value
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self._cache_evictions += 1
     
     def _parse_tile(self, tile: str) -> Tuple[str, int]:
         """解析牌字符串，返回 (類型, 數字)
@@ -18,49 +1070,69 @@ class ShantenCalculator:
                 類型: "wan", "tong", "suo", "feng", "sanyuan"
                 數字: 1-9 或字牌的編號
         """
-        # 字牌映射
-        word_tiles = {
-            'east': ('feng', 1),
-            'south': ('feng', 2),
-            'west': ('feng', 3),
-            'north': ('feng', 4),
-            'middle': ('sanyuan', 1),
-            'fa': ('sanyuan', 2),
-            'white': ('sanyuan', 3)
-        }
-        
-        if tile in word_tiles:
-            return word_tiles[tile]
+        word_tile = _WORD_TILES.get(tile)
+        if word_tile is not None:
+            return word_tile
         
         # 數字牌：格式為 "數字+字母"
         if len(tile) >= 2:
-            number = int(tile[0])
-            suit = tile[1]
-            if suit == 'm':
-                return ('wan', number)
-            elif suit == 'p':
-                return ('tong', number)
-            elif suit == 's':
-                return ('suo', number)
+            tile_type = _SUIT_TYPES.get(tile[1])
+            if tile_type is not None:
+                return (tile_type, int(tile[0]))
         
         raise ValueError(f"無法解析牌: {tile}")
-    
+
+    def _hand_to_counts(self, hand: List[str]) -> List[int]:
+        """將手牌轉換為34格的計數陣列
+
+        Args:
+            hand: 手牌列表，每個元素是牌字符串，例如 ["1m", "2m", "east"]
+
+        Returns:
+            List[int]: 長度34的計數陣列，索引順序見 TILE_LABELS
+        """
+        counts = [0] * 34
+        for tile in hand:
+            index = _TILE_INDEX.get(tile)
+            if index is None:
+                raise ValueError(f"無法解析牌: {tile}")
+            counts[index] += 1
+        # 手牌鍵每種牌只有3個位元
+        if max(counts) > 4:
+            raise ValueError(f"每種牌最多4張，{TILE_LABELS[counts.index(max(counts))]} 超過4張")
+        return counts
+
+    def _counts_to_hand(self, counts: List[int]) -> List[str]:
+        """將34格的計數陣列轉換回牌列表（依索引順序）"""
+        tiles = []
+        for index, count in enumerate(counts):
+            if count > 0:
+                tiles.extend([TILE_LABELS[index]] * count)
+        return tiles
+
     def calculate_max_melds(self, hand: List[str]) -> int:
         """計算手牌中最多可以形成的面子數量
-        
+
         Args:
             hand: 手牌列表，每個元素是牌字符串，例如 ["1m", "2m", "east"]
-            
+
         Returns:
             int: 最多可以形成的面子數量
         """
-        # 將牌按照類型分組
-        grouped_tiles = self._group_tiles(hand)
-        
+        return self._max_melds_counts(self._hand_to_counts(hand))
+
+    def _max_melds_counts(self, counts: List[int]) -> int:
+        """計算計數陣列中最多可以形成的面子數量"""
+        if self.algorithm == "greedy":
+            return self._max_melds_counts_greedy(counts)
+        return _search_max_melds(counts)
+
+    def _max_melds_counts_greedy(self, counts: List[int]) -> int:
+        """以兩種貪婪順序計算面子數量，取較大者（舊版算法）"""
         # 嘗試兩種計算方式，取最大值
-        melds_prioritize_triplets, _ = self._count_melds_and_tatsu(grouped_tiles, True)
-        melds_prioritize_straights, _ = self._count_melds_and_tatsu(grouped_tiles, False)
-        
+        melds_prioritize_triplets, _ = self._count_melds_and_tatsu(counts, True)
+        melds_prioritize_straights, _ = self._count_melds_and_tatsu(counts, False)
+
         # 返回最大的面子數量
         return max(melds_prioritize_triplets, melds_prioritize_straights)
     
@@ -74,24 +1146,14 @@ class ShantenCalculator:
         Returns:
             str: 牌字符串，例如 "1m", "2p", "east"
         """
-        # 字牌映射
-        word_tiles = {
-            ('feng', 1): 'east',
-            ('feng', 2): 'south',
-            ('feng', 3): 'west',
-            ('feng', 4): 'north',
-            ('sanyuan', 1): 'middle',
-            ('sanyuan', 2): 'fa',
-            ('sanyuan', 3): 'white'
-        }
-        
-        if (tile_type, number) in word_tiles:
-            return word_tiles[(tile_type, number)]
+        word_tile = _WORD_TILE_STRINGS.get((tile_type, number))
+        if word_tile is not None:
+            return word_tile
         
         # 數字牌
-        suit_map = {'wan': 'm', 'tong': 'p', 'suo': 's'}
-        if tile_type in suit_map:
-            return f"{number}{suit_map[tile_type]}"
+        suit = _SUIT_LETTERS.get(tile_type)
+        if suit is not None:
+            return f"{number}{suit}"
         
         raise ValueError(f"無法轉換牌: {tile_type}, {number}")
     
@@ -104,40 +1166,15 @@ class ShantenCalculator:
         Returns:
             str: 中文格式，例如 "一萬", "二筒", "東"
         """
-        # 字牌中文映射
-        word_tiles_chinese = {
-            'east': '東',
-            'south': '南',
-            'west': '西',
-            'north': '北',
-            'middle': '中',
-            'fa': '發',
-            'white': '白'
-        }
-        
-        if tile in word_tiles_chinese:
-            return word_tiles_chinese[tile]
+        if tile in _WORD_TILES_CHINESE:
+            return _WORD_TILES_CHINESE[tile]
         
         # 數字牌
         if len(tile) >= 2 and tile[0].isdigit():
             number = int(tile[0])
             suit = tile[1]
-            
-            # 數字中文映射
-            number_chinese = {
-                1: '一', 2: '二', 3: '三', 4: '四', 5: '五',
-                6: '六', 7: '七', 8: '八', 9: '九'
-            }
-            
-            # 花色中文映射
-            suit_chinese = {
-                'm': '萬',
-                'p': '筒',
-                's': '條'
-            }
-            
-            if number in number_chinese and suit in suit_chinese:
-                return f"{number_chinese[number]}{suit_chinese[suit]}"
+            if number in _NUMBER_CHINESE and suit in _SUIT_CHINESE:
+                return f"{_NUMBER_CHINESE[number]}{_SUIT_CHINESE[suit]}"
         
         # 如果無法轉換，返回原字符串
         return tile
@@ -161,8 +1198,7 @@ class ShantenCalculator:
         result_parts = []
         
         # 處理數字牌（萬、筒、條）
-        suit_order = [('wan', '萬'), ('tong', '筒'), ('suo', '條')]
-        for tile_type, suit_name in suit_order:
+        for tile_type, suit_name in _SUIT_ORDER:
             if tile_type in grouped:
                 numbers = grouped[tile_type]
                 tiles_in_suit = []
@@ -187,22 +1223,7 @@ class ShantenCalculator:
                         result_parts.append(f"{tile_type}: {','.join(tiles_in_suit)}")
         
         # 處理字牌（風牌和三元牌）
-        word_groups = {
-            'feng': [],
-            'sanyuan': []
-        }
-        
-        word_tiles_map = {
-            'east': ('feng', '東'),
-            'south': ('feng', '南'),
-            'west': ('feng', '西'),
-            'north': ('feng', '北'),
-            'middle': ('sanyuan', '中'),
-            'fa': ('sanyuan', '發'),
-            'white': ('sanyuan', '白')
-        }
-        
-        for tile_type in ['feng', 'sanyuan']:
+        for tile_type in ('feng', 'sanyuan'):
             if tile_type in grouped:
                 numbers = grouped[tile_type]
                 tiles_in_group = []
@@ -295,7 +1316,7 @@ class ShantenCalculator:
                 tatsu_list.append((tile1, tile2, "gap"))
         
         # 處理字牌（風牌和三元牌）
-        for tile_type in ['feng', 'sanyuan']:
+        for tile_type in ('feng', 'sanyuan'):
             if tile_type not in grouped_tiles:
                 continue
                 
@@ -357,11 +1378,11 @@ class ShantenCalculator:
             groups[tile_type][number] += 1
         return groups
     
-    def _count_melds_and_tatsu(self, grouped_tiles: Dict[str, Dict[int, int]], prioritize_triplets: bool = True) -> Tuple[int, int]:
+    def _count_melds_and_tatsu(self, counts: List[int], prioritize_triplets: bool = True) -> Tuple[int, int]:
         """計算面子和搭子的數量
         
         Args:
-            grouped_tiles: 分組後的牌，格式為 {"wan": {1: 2, 2: 1}, ...}
+            counts: 34格的計數陣列
             prioritize_triplets: 是否優先考慮刻子，如果為False則優先考慮順子
             
         Returns:
@@ -369,104 +1390,78 @@ class ShantenCalculator:
         """
         total_melds = 0
         total_tatsu = 0
+        numbers = counts.copy()
         
         # 處理數字牌
-        for tile_type in ['wan', 'tong', 'suo']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type].copy()
-            
+        for base in _SUIT_BASES:
             # 根據優先級處理面子
             if prioritize_triplets:
-                # 先找刻子
-                for num, count in list(numbers.items()):
-                    if count >= 3:
-                        total_melds += 1
-                        numbers[num] -= 3
-                
-                # 再找順子
-                while True:
-                    found_straight = False
-                    for num in range(1, 8):
-                        if (numbers.get(num, 0) > 0 and 
-                            numbers.get(num + 1, 0) > 0 and 
-                            numbers.get(num + 2, 0) > 0):
-                            numbers[num] -= 1
-                            numbers[num + 1] -= 1
-                            numbers[num + 2] -= 1
-                            total_melds += 1
-                            found_straight = True
-                            break  # 找到一個就中斷，再繼續找下一個
-                    if not found_straight:
-                        break
+                total_melds += self._take_triplets(numbers, base, base + 9)
+                total_melds += self._take_straights(numbers, base)
             else:
-                # 先找順子，使用貪婪算法
-                while True:
-                    found_straight = False
-                    for num in range(1, 8):
-                        if (numbers.get(num, 0) > 0 and 
-                            numbers.get(num + 1, 0) > 0 and 
-                            numbers.get(num + 2, 0) > 0):
-                            numbers[num] -= 1
-                            numbers[num + 1] -= 1
-                            numbers[num + 2] -= 1
-                            total_melds += 1
-                            found_straight = True
-                            break  # 找到一個就中斷，再繼續找下一個
-                    if not found_straight:
-                        break
-                
-                # 再找刻子
-                for num, count in list(numbers.items()):
-                    if count >= 3:
-                        total_melds += 1
-                        numbers[num] -= 3
+                total_melds += self._take_straights(numbers, base)
+                total_melds += self._take_triplets(numbers, base, base + 9)
             
             # 找搭子
             tatsu_count = 0
             
             # 先找對子搭子
-            for num, count in list(numbers.items()):
-                if count >= 2:
+            for i in range(base, base + 9):
+                if numbers[i] >= 2:
                     tatsu_count += 1
-                    numbers[num] -= 2
+                    numbers[i] -= 2
             
             # 再找連續搭子
-            for num in range(1, 9):
-                if (numbers.get(num, 0) > 0 and numbers.get(num + 1, 0) > 0):
+            for i in range(base, base + 8):
+                if numbers[i] > 0 and numbers[i + 1] > 0:
                     tatsu_count += 1
-                    numbers[num] -= 1
-                    numbers[num + 1] -= 1
+                    numbers[i] -= 1
+                    numbers[i + 1] -= 1
             
             # 再找間隔搭子
-            for num in range(1, 8):
-                if (numbers.get(num, 0) > 0 and numbers.get(num + 2, 0) > 0):
+            for i in range(base, base + 7):
+                if numbers[i] > 0 and numbers[i + 2] > 0:
                     tatsu_count += 1
-                    numbers[num] -= 1
-                    numbers[num + 2] -= 1
+                    numbers[i] -= 1
+                    numbers[i + 2] -= 1
             
             total_tatsu += tatsu_count
         
         # 處理字牌（風牌和三元牌）
-        for tile_type in ['feng', 'sanyuan']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type].copy()
+        for i in range(_HONOR_BASE, 34):
+            count = numbers[i]
             
             # 字牌只能形成刻子
-            for num, count in list(numbers.items()):
-                if count >= 3:
-                    total_melds += 1
-                    numbers[num] -= 3
-                
-                # 剩下的可以形成對子搭子
-                if count % 3 >= 2:
-                    total_tatsu += 1
+            if count >= 3:
+                total_melds += 1
+                numbers[i] -= 3
+            
+            # 剩下的可以形成對子搭子
+            if count % 3 >= 2:
+                total_tatsu += 1
         
         return total_melds, total_tatsu
 
+    def _take_triplets(self, counts: List[int], start: int, end: int) -> int:
+        """移除 counts[start:end] 中的刻子（每種牌最多一組），返回移除的數量"""
+        melds = 0
+        for i in range(start, end):
+            if counts[i] >= 3:
+                counts[i] -= 3
+                melds += 1
+        return melds
+
+    def _take_straights(self, counts: List[int], base: int) -> int:
+        """從某花色中由小到大貪婪地移除順子，返回移除的數量"""
+        melds = 0
+        for i in range(base, base + 7):
+            while counts[i] > 0 and counts[i + 1] > 0 and counts[i + 2] > 0:
+                counts[i] -= 1
+                counts[i + 1] -= 1
+                counts[i + 2] -= 1
+                melds += 1
+        return melds
+
     def find_max_tatsu(self, hand: List[str]) -> List[Tuple[str, str, str]]:
         """尋找手牌中最多搭子的組合
         
@@ -484,66 +1479,51 @@ class ShantenCalculator:
         Returns:
             List[Tuple[str, str, str]]: 搭子列表，每個元素是一個元組，包含兩張牌和搭子類型
         """
-        # 將牌按照類型分組
-        grouped_tiles = self._group_tiles(hand)
-        
-        # 搭子列表
+        counts = self._hand_to_counts(hand)
+        return [(TILE_LABELS[i], TILE_LABELS[j], tatsu_type)
+                for i, j, tatsu_type in self._max_tatsu_counts(counts)]
+
+    def _max_tatsu_counts(self, counts: List[int]) -> List[Tuple[int, int, str]]:
+        """在計數陣列上尋找最多搭子的組合
+
+        Args:
+            counts: 34格的計數陣列（不會被修改）
+
+        Returns:
+            List[Tuple[int, int, str]]: 搭子列表，每個元素為 (牌索引1, 牌索引2, 搭子類型)
+        """
+        numbers = counts.copy()
         tatsu_list = []
         
         # 處理數字牌
-        for tile_type in ['wan', 'tong', 'suo']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type].copy()
-            
+        for base in _SUIT_BASES:
             # 先找對子搭子（優先級最高）
-            for num, count in list(numbers.items()):
-                while count >= 2:
-                    tile_str = self._tile_to_string(tile_type, num)
-                    # 添加對子搭子
-                    tatsu_list.append((tile_str, tile_str, "pair"))
-                    numbers[num] -= 2
-                    count -= 2
+            for i in range(base, base + 9):
+                while numbers[i] >= 2:
+                    tatsu_list.append((i, i, "pair"))
+                    numbers[i] -= 2
             
             # 再找連續搭子（優先級次之）
-            for num in range(1, 9):
-                while numbers.get(num, 0) > 0 and numbers.get(num + 1, 0) > 0:
-                    tile1 = self._tile_to_string(tile_type, num)
-                    tile2 = self._tile_to_string(tile_type, num + 1)
-                    # 添加連續搭子
-                    tatsu_list.append((tile1, tile2, "sequence"))
-                    numbers[num] -= 1
-                    numbers[num + 1] -= 1
+            for i in range(base, base + 8):
+                while numbers[i] > 0 and numbers[i + 1] > 0:
+                    tatsu_list.append((i, i + 1, "sequence"))
+                    numbers[i] -= 1
+                    numbers[i + 1] -= 1
             
             # 最後找間隔搭子（優先級最低）
-            for num in range(1, 8):
-                while numbers.get(num, 0) > 0 and numbers.get(num + 2, 0) > 0:
-                    tile1 = self._tile_to_string(tile_type, num)
-                    tile2 = self._tile_to_string(tile_type, num + 2)
-                    # 添加間隔搭子
-                    tatsu_list.append((tile1, tile2, "gap"))
-                    numbers[num] -= 1
-                    numbers[num + 2] -= 1
-        
-        # 處理字牌（風牌和三元牌）
-        for tile_type in ['feng', 'sanyuan']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type].copy()
-            
-            # 字牌只能形成對子搭子
-            for num, count in list(numbers.items()):
-                while count >= 2:
-                    tile_str = self._tile_to_string(tile_type, num)
-                    # 添加對子搭子
-                    tatsu_list.append((tile_str, tile_str, "pair"))
-                    numbers[num] -= 2
-                    count -= 2
+            for i in range(base, base + 7):
+                while numbers[i] > 0 and numbers[i + 2] > 0:
+                    tatsu_list.append((i, i + 2, "gap"))
+                    numbers[i] -= 1
+                    numbers[i + 2] -= 1
+        
+        # 處理字牌（風牌和三元牌），字牌只能形成對子搭子
+        for i in range(_HONOR_BASE, 34):
+            while numbers[i] >= 2:
+                tatsu_list.append((i, i, "pair"))
+                numbers[i] -= 2
         
         return tatsu_list
-
     def find_pairs(self, hand: List[str]) -> List[Tuple[str, str]]:
         """尋找手牌中所有的對子
 
@@ -566,105 +1546,132 @@ class ShantenCalculator:
         
         return pairs_list
 
-    def calculate_shanten(self, hand: List[str]) -> int:
+    def calculate_shanten(self, hand: List[str], melds: Optional[List[List[str]]] = None) -> int:
         """計算手牌的進聴數
         
-        進聴數是指距離和牌還需要換幾張牌。
+        進聴數是指距離聽牌還需要換幾張牌（0 代表已聽牌）。
         計算方法：
-        1. 先找出手牌中最大的面子數量
-        2. 將這些面子從手牌中移除
-        3. 在剩餘的牌中找出最多的搭子組合
-        4. 將這些搭子從手牌中移除
-        5. 剩下的是單張
+        1. 將手牌拆成萬、筒、條、字牌四組
+        2. 每組依其計數查詢拆解表（見 _suit_entry），取得在不同組數下的最佳拆法
+        3. 合併四組的結果，限制面子加搭子最多5組、將最多一對
         
         台灣麻將規則：
         - 基本手牌為 16 張
-        - 必須湊齊五組牌加一對眼（四個面子 + 一個對子 + 一個搭子）
+        - 必須湊齊五組面子加一對將
+        - 吃、碰、槓後副露的每一組都算一個面子（槓也只算一組），手牌少3張，需要湊的組數也少一組
         
         進聴數計算公式：
-        - 需要的面子數 = 4 - 已有面子數
-        - 如果搭子數量 >= 需要的面子數，則需要進 需要的面子數 張牌
-        - 如果搭子數量 < 需要的面子數，則需要先形成搭子，再升級為面子
-        - 需要的對子數 = 1 - 已有對子數（最多為1）
-        - 進聴數 = 需要進的牌數 + 需要的對子數
+        - 進聴數 = 2 * 組數 - (2 * 面子數 + 搭子數 + 將)，組數 = 5 - 副露組數
+        - 面子數 + 搭子數 最多計算「組數」組
         
         Args:
-            hand: 手牌列表，應該是16張牌，每個元素是牌字符串，例如 ["1m", "2m", "east"]
+            hand: 手牌列表，沒有副露時應該是16張牌（副露 k 組時為 16 - 3k 張），
+                每個元素是牌字符串，例如 ["1m", "2m", "east"]
+            melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露
             
         Returns:
             int: 進聴數
         """
-        if len(hand) != 16:
-            raise ValueError(f"手牌必須是16張，目前有 {len(hand)} 張。計算進聴數需要固定的手牌數量。")
+        blocks, _ = self._meld_counts(melds)
+        self._check_hand_size(hand, blocks, drawn=False)
+        return self._shanten_key(_hand_key(hand), blocks)
+
+    def _meld_counts(self, melds: Optional[List[List[str]]]) -> Tuple[int, List[int]]:
+        """檢查副露，返回 (手牌還需要湊的組數, 副露牌的34格計數)
+
+        每組副露必須是吃（同花色連續三張）、碰（三張相同）或槓（四張相同）。
+        """
+        counts = [0] * 34
+        if not melds:
+            return _MAX_BLOCKS, counts
+        if len(melds) > _MAX_BLOCKS:
+            raise ValueError(f"副露最多 {_MAX_BLOCKS} 組，目前有 {len(melds)} 組")
+        for meld in melds:
+            indices = []
+            for tile in meld:
+                index = _TILE_INDEX.get(tile)
+                if index is None:
+                    raise ValueError(f"無法解析牌: {tile}")
+                indices.append(index)
+            indices.sort()
+            same = len(indices) in (3, 4) and indices[0] == indices[-1]
+            chow = (len(indices) == 3 and indices[0] < _HONOR_BASE and indices[0] % 9 <= 6
+                    and indices[1] == indices[0] + 1 and indices[2] == indices[0] + 2)
+            if not (same or chow):
+                raise ValueError(f"無效的副露: {meld}，必須是吃、碰或槓")
+            for index in indices:
+                counts[index] += 1
+        return _MAX_BLOCKS - len(melds), counts
+
+    @staticmethod
+    def _check_hand_size(hand: List[str], blocks: int, drawn: bool) -> None:
+        """檢查手牌張數：還需要湊 blocks 組時應有 3 * blocks + 1 張，摸牌後再多一張"""
+        expected = 3 * blocks + 1 + drawn
+        if len(hand) != expected:
+            melds = _MAX_BLOCKS - blocks
+            note = f"（副露 {melds} 組）" if melds else ""
+            raise ValueError(f"手牌必須是{expected}張{note}，目前有 {len(hand)} 張")
+
+    def _shanten_counts(self, counts: List[int], blocks: int = _MAX_BLOCKS) -> int:
+        """在手牌的計數陣列上，依 self.algorithm 計算進聴數（有快取時先查快取）"""
+        return self._shanten_key(_counts_key(counts), blocks, counts)
+
+    def _shanten_key(self, key: int, blocks: int = _MAX_BLOCKS, counts: Optional[List[int]] = None) -> int:
+        """在手牌鍵上，依 self.algorithm 計算進聴數（有快取時先查快取，快取也以手牌鍵加組數為鍵）
         
-        # 複製手牌，避免修改原始手牌
-        remaining_tiles = hand.copy()
+        table 算法只需要手牌鍵；其他算法需要計數陣列，counts 省略時由手牌鍵還原。
+        """
+        if self._stats is not None:
+            self._stats.count('calculate_shanten')
+        if self._cache is None:
+            return self._compute_shanten_key(key, blocks, counts)
+        cache_key = key | blocks << _BLOCKS_SHIFT
+        shanten = self._cache_get(cache_key)
+        if shanten is None:
+            shanten = self._compute_shanten_key(key, blocks, counts)
+            self._cache_put(cache_key, shanten)
+        return shanten
 
-        # 0. 先找出所有對子
-        pairs = self.find_pairs(remaining_tiles)
-        if len(pairs) != 0: # 如果手牌中有對子，則先處理對子
-            tmp_shanten_list = []
-            for pair in pairs:
-                # 複製手牌，避免修改原始手牌
-                tmp_remaining_tiles = remaining_tiles.copy()
-                # print(f"移除對子: {pair[0]}, {pair[1]}")
-                tmp_remaining_tiles.remove(pair[0])
-                tmp_remaining_tiles.remove(pair[1])
-                # print(f"移除對子後剩餘牌: {tmp_remaining_tiles}")
+    def _compute_shanten_key(self, key: int, blocks: int = _MAX_BLOCKS, counts: Optional[List[int]] = None) -> int:
+        """不經過快取，依 self.algorithm 計算進聴數"""
+        if self.algorithm == "table":
+            return _table_shanten(key, blocks)
+        if counts is None:
+            counts = _key_to_counts(key)
+        if self.algorithm == "search":
+            return 2 * blocks - _search_value(counts, blocks)
+        return self._shanten_counts_greedy(counts, blocks)
 
+    def _shanten_counts_greedy(self, counts: List[int], blocks: int = _MAX_BLOCKS) -> int:
+        """舊版的兩段式貪婪算法（先移除面子再找搭子）
+
+        計算過程中會暫時修改 counts，結束時還原。
+        """
+        # 0. 先找出所有對子
+        pair_indices = [i for i in range(34) if counts[i] >= 2]
+        if pair_indices: # 如果手牌中有對子，則先處理對子
+            shanten = None
+            for i in pair_indices:
+                # 暫時移除對子
+                counts[i] -= 2
+                
                 # 1. 找出最大面子數量
-                max_melds = self.calculate_max_melds(tmp_remaining_tiles)
+                max_melds = self._max_melds_counts_greedy(counts)
                 
                 # 2. 將這些面子從手牌中移除
-                # 由於 calculate_max_melds 不會返回具體的面子，我們需要重新計算
-                grouped_tiles = self._group_tiles(tmp_remaining_tiles)
-                remaining_grouped = self._remove_max_melds(grouped_tiles)
-                
-                # 將分組後的牌轉換回列表
-                tiles_before_melds_removal = tmp_remaining_tiles.copy()
-                tmp_remaining_tiles = self._grouped_to_list(remaining_grouped)
-                # print(f"移除面子後剩餘牌: {tmp_remaining_tiles}")
-                # print(f"移除的面子: {[t for t in tiles_before_melds_removal if t not in tmp_remaining_tiles]}")
+                remaining = self._remove_max_melds(counts)
+                counts[i] += 2
                 
                 # 3. 在剩餘的牌中找出最多的搭子組合
-                max_tatsu_list = self.find_max_tatsu(tmp_remaining_tiles)
-                
-                # 4. 將這些搭子從手牌中移除
-                tiles_before_tatsu_removal = tmp_remaining_tiles.copy()
-                for t1, t2, tatsu_type in max_tatsu_list:
-                    # print(f"移除搭子: {t1}, {t2} (類型: {tatsu_type})")
-                    if t1 in tmp_remaining_tiles:
-                        tmp_remaining_tiles.remove(t1)
-                    if t2 in tmp_remaining_tiles:
-                        tmp_remaining_tiles.remove(t2)
-                # print(f"移除搭子後剩餘牌: {tmp_remaining_tiles}")
-                
-                # 5. 剩下的是單張
-                singles = len(tmp_remaining_tiles)
+                tatsu_count = len(self._max_tatsu_counts(remaining))
                 
-                # 計算進聴數
-                has_pair = True
-                
-                # 搭子數量
-                tatsu_count = len(max_tatsu_list)
+                # 需要的面子數（對子當將，其餘 blocks - 1 組要湊成面子）
+                needed_melds = blocks - 1 - max_melds
                 
-                # 需要的面子數
-                needed_melds = 4 - max_melds
-
-                # print("needed_melds: ", needed_melds)
-                # print("tatsu_count: ", tatsu_count)
-                # print("has_pair: ", has_pair)
-                # print("---------------------------------")
-
                 # 計算進聴數
                 if needed_melds == 0:
-                    # 已經有4個面子，一個對子，確認一下搭子數量
-                    if has_pair and tatsu_count == 1:
-                        shanten = 0
-                        tmp_shanten_list.append(shanten)
-                    else:
-                        shanten = 1
-                        tmp_shanten_list.append(shanten)
+                    # 面子已經足夠，一個對子，確認一下搭子數量
+                    pair_shanten = 0 if tatsu_count == 1 else 1
                 else:
                     # 需要進的牌數
                     if tatsu_count >= needed_melds:
@@ -675,483 +1682,876 @@ class ShantenCalculator:
                         # 搭子數量不足，需要先形成搭子，再升級為面子
                         tiles_needed = tatsu_count + (needed_melds - tatsu_count) * 2
                         tatsu_left_count = 0
-
-                    # 接著處理搭子及對子
-                    if tatsu_left_count == 1:
-                        needed_tatsu = 0
-                    else:
-                        needed_tatsu = 1
                     
-                    # 進聴數
-                    shanten = tiles_needed + needed_tatsu
-                    tmp_shanten_list.append(shanten)
-            
-            # print("tmp_shanten_list: ", tmp_shanten_list)
-            shanten = min(tmp_shanten_list)
-
-        else: # 如果手牌中沒有對子，則先找出最大面子數量
-            # 1. 找出最大面子數量
-            max_melds = self.calculate_max_melds(remaining_tiles)
-            
-            # 2. 將這些面子從手牌中移除
-            # 由於 calculate_max_melds 不會返回具體的面子，我們需要重新計算
-            grouped_tiles = self._group_tiles(remaining_tiles)
-            remaining_grouped = self._remove_max_melds(grouped_tiles)
-            
-            # 將分組後的牌轉換回列表
-            tiles_before_melds_removal = remaining_tiles.copy()
-            remaining_tiles = self._grouped_to_list(remaining_grouped)
-            # print(f"沒有對子，直接移除面子後剩餘牌: {remaining_tiles}")
-            # print(f"移除的面子: {[t for t in tiles_before_melds_removal if t not in remaining_tiles]}")
-            
-            # 3. 在剩餘的牌中找出最多的搭子組合
-            max_tatsu_list = self.find_max_tatsu(remaining_tiles)
-            
-            # 4. 將這些搭子從手牌中移除
-            tiles_before_tatsu_removal = remaining_tiles.copy()
-            for t1, t2, tatsu_type in max_tatsu_list:
-                # print(f"移除搭子: {t1}, {t2} (類型: {tatsu_type})")
-                if t1 in remaining_tiles:
-                    remaining_tiles.remove(t1)
-                if t2 in remaining_tiles:
-                    remaining_tiles.remove(t2)
-            # print(f"移除搭子後剩餘牌: {remaining_tiles}")
-            
-            # 5. 剩下的是單張
-            singles = len(remaining_tiles)
-            
-            # 計算進聴數
-            # 檢查是否有對子
-            has_pair = False
-            
-            # 搭子數量
-            tatsu_count = len(max_tatsu_list)
-            
-            # 需要的面子數
-            needed_melds = 4 - max_melds
-
-            # 計算進聴數
-            if needed_melds == 0:
-                # 已經有4個面子，只需要一個對子
-                if has_pair and tatsu_count == 2:
-                    shanten = 0
-                else:
-                    shanten = 1
-            else:
-                # 需要進的牌數
-                if tatsu_count >= needed_melds:
-                    # 搭子數量足夠，每個搭子需要進一張牌
-                    tiles_needed = needed_melds
-                    tatsu_left_count = tatsu_count - needed_melds
-                else:
-                    # 搭子數量不足，需要先形成搭子，再升級為面子
-                    tiles_needed = tatsu_count + (needed_melds - tatsu_count) * 2
-                    tatsu_left_count = 0
-
-                # 接著處理搭子及對子
-                if tatsu_left_count == 2 and has_pair:
-                    needed_tatsu = 0
-                elif tatsu_left_count == 2 and not has_pair:
-                    needed_tatsu = 1
-                elif tatsu_left_count == 1:
-                    needed_tatsu = 1
-                else:
-                    needed_tatsu = 2
+                    # 接著處理搭子及對子
+                    needed_tatsu = 0 if tatsu_left_count == 1 else 1
+                    pair_shanten = tiles_needed + needed_tatsu
                 
-                # 進聴數
-                shanten = tiles_needed + needed_tatsu
+                if shanten is None or pair_shanten < shanten:
+                    shanten = pair_shanten
+            
+            return shanten
         
-        # 特殊情況：如果已經有5個面子，則為聽牌（0進聴）
-        if max_melds == 5:
-            shanten = 0
+        # 如果手牌中沒有對子，則先找出最大面子數量
+        max_melds = self._max_melds_counts_greedy(counts)
         
-        return shanten
+        # 特殊情況：如果面子已經湊滿，則為聽牌（0進聴）
+        if max_melds == blocks:
+            return 0
+        
+        remaining = self._remove_max_melds(counts)
+        tatsu_count = len(self._max_tatsu_counts(remaining))
+        
+        # 需要的面子數
+        needed_melds = blocks - 1 - max_melds
+        
+        if needed_melds == 0:
+            # 將以外的面子都湊齊了，但沒有對子
+            return 1
+        
+        # 需要進的牌數
+        if tatsu_count >= needed_melds:
+            # 搭子數量足夠，每個搭子需要進一張牌
+            tiles_needed = needed_melds
+            tatsu_left_count = tatsu_count - needed_melds
+        else:
+            # 搭子數量不足，需要先形成搭子，再升級為面子
+            tiles_needed = tatsu_count + (needed_melds - tatsu_count) * 2
+            tatsu_left_count = 0
+        
+        # 接著處理搭子及對子（沒有對子時，剩一個或兩個搭子都還需要一張牌湊對子）
+        if tatsu_left_count in (1, 2):
+            needed_tatsu = 1
+        else:
+            needed_tatsu = 2
+        
+        return tiles_needed + needed_tatsu
     
-    def _remove_max_melds(self, grouped_tiles: Dict[str, Dict[int, int]]) -> Dict[str, Dict[int, int]]:
-        """從分組後的牌中移除最大數量的面子
+    def _remove_max_melds(self, counts: List[int]) -> List[int]:
+        """從計數陣列中移除最大數量的面子
         
         Args:
-            grouped_tiles: 分組後的牌，格式為 {"wan": {1: 2, 2: 1}, ...}
+            counts: 34格的計數陣列（不會被修改）
             
         Returns:
-            Dict[str, Dict[int, int]]: 移除面子後剩餘的牌
+            List[int]: 移除面子後剩餘的牌
         """
-        # 複製分組後的牌，避免修改原始數據
-        remaining = {}
-        for tile_type, numbers in grouped_tiles.items():
-            remaining[tile_type] = numbers.copy()
-        
-        # 嘗試兩種計算方式，取最大值
-        remaining1 = self._remove_melds(remaining.copy(), True)
-        remaining2 = self._remove_melds(remaining.copy(), False)
-        
-        # 計算兩種方式移除後剩餘的牌數
-        count1 = sum(sum(numbers.values()) for numbers in remaining1.values())
-        count2 = sum(sum(numbers.values()) for numbers in remaining2.values())
-        
-        # 返回剩餘牌數較少的結果（即移除面子數較多的結果）
-        return remaining1 if count1 <= count2 else remaining2
+        # 原本的字典版本會嘗試兩種方式，但兩份副本共用同一組內層字典，
+        # 實際生效的一直是「刻子優先」的結果；這裡保留相同的行為
+        return self._remove_melds(counts.copy(), True)
     
-    def _remove_melds(self, grouped_tiles: Dict[str, Dict[int, int]], prioritize_triplets: bool = True) -> Dict[str, Dict[int, int]]:
-        """從分組後的牌中移除面子
+    def _remove_melds(self, counts: List[int], prioritize_triplets: bool = True) -> List[int]:
+        """從計數陣列中移除面子（直接修改傳入的陣列）
         
         Args:
-            grouped_tiles: 分組後的牌，格式為 {"wan": {1: 2, 2: 1}, ...}
+            counts: 34格的計數陣列
             prioritize_triplets: 是否優先考慮刻子，如果為False則優先考慮順子
             
         Returns:
-            Dict[str, Dict[int, int]]: 移除面子後剩餘的牌
+            List[int]: 移除面子後剩餘的牌
         """
         # 處理數字牌
-        for tile_type in ['wan', 'tong', 'suo']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type]
-            
+        for base in _SUIT_BASES:
             # 根據優先級處理面子
             if prioritize_triplets:
-                # 先找刻子
-                for num, count in list(numbers.items()):
-                    if count >= 3:
-                        numbers[num] -= 3
-                        if numbers[num] == 0:
-                            del numbers[num]
-                
-                # 再找順子
-                while True:
-                    found_straight = False
-                    for num in range(1, 8):
-                        if (numbers.get(num, 0) > 0 and 
-                            numbers.get(num + 1, 0) > 0 and 
-                            numbers.get(num + 2, 0) > 0):
-                            numbers[num] -= 1
-                            if numbers[num] == 0:
-                                del numbers[num]
-                            numbers[num + 1] -= 1
-                            if numbers[num + 1] == 0:
-                                del numbers[num + 1]
-                            numbers[num + 2] -= 1
-                            if numbers[num + 2] == 0:
-                                del numbers[num + 2]
-                            found_straight = True
-                            break  # 找到一個就中斷，再繼續找下一個
-                    if not found_straight:
-                        break
+                self._take_triplets(counts, base, base + 9)
+                self._take_straights(counts, base)
             else:
-                # 先找順子
-                while True:
-                    found_straight = False
-                    for num in range(1, 8):
-                        if (numbers.get(num, 0) > 0 and 
-                            numbers.get(num + 1, 0) > 0 and 
-                            numbers.get(num + 2, 0) > 0):
-                            numbers[num] -= 1
-                            if numbers[num] == 0:
-                                del numbers[num]
-                            numbers[num + 1] -= 1
-                            if numbers[num + 1] == 0:
-                                del numbers[num + 1]
-                            numbers[num + 2] -= 1
-                            if numbers[num + 2] == 0:
-                                del numbers[num + 2]
-                            found_straight = True
-                            break  # 找到一個就中斷，再繼續找下一個
-                    if not found_straight:
-                        break
-                
-                # 再找刻子
-                for num, count in list(numbers.items()):
-                    if count >= 3:
-                        numbers[num] -= 3
-                        if numbers[num] == 0:
-                            del numbers[num]
+                self._take_straights(counts, base)
+                self._take_triplets(counts, base, base + 9)
         
-        # 處理字牌（風牌和三元牌）
-        for tile_type in ['feng', 'sanyuan']:
-            if tile_type not in grouped_tiles:
-                continue
-                
-            numbers = grouped_tiles[tile_type]
-            
-            # 字牌只能形成刻子
-            for num, count in list(numbers.items()):
-                if count >= 3:
-                    numbers[num] -= 3
-                    if numbers[num] == 0:
-                        del numbers[num]
+        # 處理字牌（風牌和三元牌），字牌只能形成刻子
+        self._take_triplets(counts, _HONOR_BASE, 34)
         
-        return grouped_tiles
-    
-    def _grouped_to_list(self, grouped_tiles: Dict[str, Dict[int, int]]) -> List[str]:
-        """將分組後的牌轉換回列表
+        return counts
+    # ------------------------------------------------------------
+    # 等待牌計算相關
+    # ------------------------------------------------------------
+    def _all_tile_labels(self) -> Tuple[str, ...]:
+        """回傳34種牌的標籤（1m, 1p, 1s, 2m, ... 的順序，共用的常數，不需要複製）"""
+        return _ALL_TILE_LABELS
+
+    def is_complete_hand(self, hand_17: List[str], melds: Optional[List[List[str]]] = None) -> bool:
+        """判斷17張牌是否已經和牌（5個面子 + 1對將）
+        
+        每一組（萬、筒、條、字）只需在和牌圖形表中查一次，不需要回溯拆牌。
+        有副露時只需判斷手牌能否拆成其餘的面子加一對將。
         
         Args:
-            grouped_tiles: 分組後的牌，格式為 {"wan": {1: 2, 2: 1}, ...}
+            hand_17: 17張牌的列表（副露 k 組時為 17 - 3k 張），每個元素是牌字符串
+            melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露
             
         Returns:
-            List[str]: 牌列表，每個元素是牌字符串
+            bool: 是否和牌
         """
-        tiles = []
-        for tile_type, numbers in grouped_tiles.items():
-            for num, count in numbers.items():
-                for _ in range(count):
-                    tiles.append(self._tile_to_string(tile_type, num))
-        return tiles
-
-    # ------------------------------------------------------------
-    # 等待牌計算相關
-    # ------------------------------------------------------------
-    def _all_tile_labels(self) -> List[str]:
-        """回傳34種牌的標籤列表"""
-        tiles = []
-        for i in range(1, 10):
-            tiles.extend([f"{i}m", f"{i}p", f"{i}s"])
-        tiles.extend(['east', 'south', 'west', 'north', 'middle', 'fa', 'white'])
-        return tiles
+        blocks, _ = self._meld_counts(melds)
+        self._check_hand_size(hand_17, blocks, drawn=True)
+        return self._is_complete_key(_hand_key(hand_17))
 
     def _can_form_complete_hand(self, hand: List[str]) -> bool:
         """判斷17張牌是否已經和牌（5個面子 + 1對子）"""
         if len(hand) != 17:
             return False
 
-        grouped = self._group_tiles(hand)
+        return self._is_complete_key(_hand_key(hand))
 
-        # 嘗試每一種可能的對子作為將牌
-        for tile_type, numbers in grouped.items():
-            for num, count in list(numbers.items()):
-                if count >= 2:
-                    grouped_copy = {t: n.copy() for t, n in grouped.items()}
-                    # 先移除對子
-                    grouped_copy[tile_type][num] -= 2
-                    if grouped_copy[tile_type][num] == 0:
-                        del grouped_copy[tile_type][num]
-                    if len(grouped_copy[tile_type]) == 0:
-                        del grouped_copy[tile_type]
-
-                    # 嘗試拆成5個面子
-                    if self._can_form_all_melds(grouped_copy):
-                        return True
-        return False
+    def _is_complete_key(self, key: int) -> bool:
+        """判斷17張牌的手牌鍵是否已經和牌"""
+        if self._stats is not None:
+            self._stats.count('can_form_complete_hand')
+        return _table_complete(key)
 
-    def _can_form_all_melds(self, grouped_tiles: Dict[str, Dict[int, int]]) -> bool:
-        """檢查所有剩餘的牌能否完全拆成面子（每個面子3張）"""
-        for tile_type, numbers in grouped_tiles.items():
-            if tile_type in ['wan', 'tong', 'suo']:
-                if not self._can_form_melds_numbers(numbers):
-                    return False
-            else:
-                # 字牌只能刻子，數量需為3的倍數
-                for _, count in numbers.items():
-                    if count % 3 != 0:
-                        return False
-        return True
-
-    def _can_form_melds_numbers(self, numbers: Dict[int, int]) -> bool:
-        """檢查數字牌是否能拆成面子"""
-        counts = defaultdict(int, numbers)
-
-        def backtrack(counts_dict: Dict[int, int]) -> bool:
-            # 移除為0的鍵
-            to_delete = [k for k, v in list(counts_dict.items()) if v == 0]
-            for k in to_delete:
-                del counts_dict[k]
-
-            if not counts_dict:
-                return True
-
-            first = min(counts_dict.keys())
-
-            # 嘗試刻子
-            if counts_dict[first] >= 3:
-                counts_dict[first] -= 3
-                if backtrack(counts_dict):
-                    counts_dict[first] += 3
-                    return True
-                counts_dict[first] += 3
-
-            # 嘗試順子 first, first+1, first+2
-            if (counts_dict.get(first, 0) > 0 and
-                counts_dict.get(first + 1, 0) > 0 and
-                counts_dict.get(first + 2, 0) > 0):
-                counts_dict[first] -= 1
-                counts_dict[first + 1] -= 1
-                counts_dict[first + 2] -= 1
-                if backtrack(counts_dict):
-                    counts_dict[first] += 1
-                    counts_dict[first + 1] += 1
-                    counts_dict[first + 2] += 1
-                    return True
-                counts_dict[first] += 1
-                counts_dict[first + 1] += 1
-                counts_dict[first + 2] += 1
+    def waiting_tiles(self, hand_16: List[str]) -> List[str]:
+        """列出16張手牌能胡的牌種（未聽牌時為空列表）
 
-            return False
+        Args:
+            hand_16: 16張牌的列表
 
-        return backtrack(counts)
+        Returns:
+            List[str]: 能胡的牌種，依 TILE_LABELS 順序
+        """
+        if len(hand_16) != 16:
+            raise ValueError(f"等待牌需要16張牌，目前有 {len(hand_16)} 張")
+        return self._count_waiting_tiles(hand_16)[1]
 
     def _count_waiting_tiles(self, hand_16: List[str]) -> Tuple[int, List[str]]:
         """在進聽數為0的情況下，計算能胡的等待牌數量"""
-        waits = []
-        for tile in self._all_tile_labels():
-            candidate = hand_16 + [tile]
-            if self._can_form_complete_hand(candidate):
-                waits.append(tile)
+        return self._waiting_tiles_key(_hand_key(hand_16))
+
+    def _waiting_tiles_key(self, key: int) -> Tuple[int, List[str]]:
+        """在16張牌的手牌鍵上計算等待牌（查等待表，不需要逐一嘗試34種牌）"""
+        if self._stats is not None:
+            self._stats.count('count_waiting_tiles')
+        waits = [TILE_LABELS[index] for index in _table_waits(key)]
         return len(waits), waits
 
-    def _count_improving_tiles(self, hand_16: List[str], current_shanten: int) -> Tuple[int, List[str]]:
+    def _count_improving_tiles(self, hand_16: List[str], current_shanten: int,
+                               visible: Optional[List[int]] = None) -> Tuple[int, List[str]]:
         """計算能讓進聽數減少的進牌張數
         
         對於16張牌（進聽數為 current_shanten），計算加入哪些牌後，
         能讓進聽數進一步減少（變成 < current_shanten）。
+        進牌張數是這些牌實際剩下的張數：每種牌4張，扣掉手牌中與已看到的張數。
         
         Args:
             hand_16: 16張牌的列表
             current_shanten: 當前16張牌的進聽數
+            visible: 34格的已看到牌數（牌河、副露等，索引順序同 TILE_LABELS），None 表示都沒看到
             
         Returns:
-            Tuple[int, List[str]]: (進牌數量, 進牌列表)
+            Tuple[int, List[str]]: (進牌剩餘張數, 進牌種類列表)
+        """
+        return self._improving_tiles_counts(self._hand_to_counts(hand_16), current_shanten,
+                                            self._visible_counts(visible))
+
+    def _visible_counts(self, visible: Optional[List[int]]) -> Optional[List[int]]:
+        """檢查並轉換已看到牌數陣列（可為 list 或 numpy 陣列）"""
+        if visible is None:
+            return None
+        if len(visible) != 34:
+            raise ValueError(f"已看到牌數必須有34格，目前有 {len(visible)} 格")
+        seen = [int(count) for count in visible]
+        if min(seen) < 0 or max(seen) > 4:
+            raise ValueError("每種牌已看到的張數必須在 0~4 之間")
+        return seen
+
+    def _improving_tiles_counts(self, counts: List[int], current_shanten: int,
+                                visible: Optional[List[int]] = None,
+                                blocks: int = _MAX_BLOCKS) -> Tuple[int, List[str]]:
+        """在16張牌的計數陣列上計算進牌（counts 不會被修改）
+        
+        精確算法（table / search）直接看摸牌後17張牌的進聽數：
+        17張牌的進聽數等於打掉最不需要的一張後的最小進聽數，每種進牌只需查表一次。
+        greedy 算法沒有這個性質，仍逐一嘗試打掉每一種牌。
         """
-        improving_tiles = []
+        if self._stats is not None:
+            self._stats.count('count_improving_tiles')
+        improving = self._improving_indices(counts, current_shanten, visible, blocks)
+        total = self._remaining_copies(counts, visible or [0] * 34, improving)
+        return total, [TILE_LABELS[index] for index in improving]
+
+    def _improving_indices(self, counts: List[int], current_shanten: int,
+                           visible: Optional[List[int]] = None, blocks: int = _MAX_BLOCKS) -> List[int]:
+        """找出能讓進聽數減少的進牌索引（依 _LABEL_ORDER 排列，已沒有剩餘張數的牌不列入）"""
+        improving = []
+        state = HandState.from_counts(counts, self, blocks)
+        exact = self.algorithm != "greedy"
         
         # 嘗試加入每一種可能的牌
-        for tile in self._all_tile_labels():
-            # 加入這張牌後變成17張
-            hand_17 = hand_16 + [tile]
-            
-            # 計算這17張牌的最佳打牌選項（打掉某張後的最小進聽數）
-            # 方法：對每張牌，計算打掉後剩餘16張的進聽數，取最小值
-            min_shanten_after = None
+        for draw in _LABEL_ORDER:
+            remaining = 4 - counts[draw] - (visible[draw] if visible is not None else 0)
+            if remaining <= 0:
+                continue
+            # 手中沒有、前後兩格也都沒有的孤張無法組成任何面子或搭子，不可能減少進聽數
+            if exact and counts[draw] == 0 and self._is_isolated(counts, draw):
+                continue
             
-            for i in range(len(hand_17)):
-                hand_after_discard = hand_17[:i] + hand_17[i+1:]
-                try:
-                    shanten = self.calculate_shanten(hand_after_discard)
-                    if min_shanten_after is None or shanten < min_shanten_after:
-                        min_shanten_after = shanten
-                except:
-                    continue
+            # 加入這張牌後變成17張
+            state._add_index(draw)
+            if exact:
+                improved = state.shanten < current_shanten
+            else:
+                # 只要打掉某張牌後進聽數 < 當前進聽數，這張牌就是進牌，找到即可停止
+                # 相同的牌打掉後結果相同，每種牌只需計算一次；打掉剛摸的牌等於原手牌，不必計算
+                improved = False
+                for discard in range(34):
+                    if state.counts[discard] == 0 or discard == draw:
+                        continue
+                    state._remove_index(discard)
+                    shanten = state.shanten
+                    state._add_index(discard)
+                    if shanten < current_shanten:
+                        improved = True
+                        break
+            state._remove_index(draw)
             
-            # 如果加入這張牌後，最佳進聽數 < 當前進聽數，則這張牌是進牌
-            if min_shanten_after is not None and min_shanten_after < current_shanten:
-                improving_tiles.append(tile)
+            if improved:
+                improving.append(draw)
         
-        return len(improving_tiles), improving_tiles
+        return improving
+
+    @staticmethod
+    def _is_isolated(counts: List[int], index: int) -> bool:
+        """該牌前後兩格（同花色）是否都沒有牌；字牌只看自己"""
+        if index >= _HONOR_BASE:
+            return True
+        base = index - index % 9
+        low = max(base, index - 2)
+        high = min(base + 8, index + 2)
+        return not any(counts[low:high + 1])
+
+    def _remaining_copies(self, counts: List[int], seen: List[int], indices: List[int]) -> int:
+        """計算這些牌還剩下幾張（每種4張，扣掉手牌與已看到的張數）"""
+        return sum(max(0, 4 - counts[index] - seen[index]) for index in indices)
+
+    def _lookahead_score(self, counts: List[int], shanten: int, seen: List[int], deadline: float,
+                         memo: Dict[int, List[int]], blocks: int = _MAX_BLOCKS) -> Optional[float]:
+        """兩巡評估：摸下一張牌並打出最佳的一張後，期望還有幾張進牌
+
+        對每一種可能摸到的牌（依剩餘張數加權），找出打掉後進聽數最小的牌，
+        其中進牌（聽牌時為等待牌）剩餘張數最多者即為該摸牌的分數，最後取加權平均。
+        超過 deadline（time.perf_counter() 的時間）時放棄並返回 None。
+
+        Args:
+            counts: 打牌後16張牌的計數陣列（計算過程中暫時修改，結束時還原）
+            shanten: 這16張牌的進聽數（大於0）
+            seen: 已看到的牌數（包含剛打掉的牌）
+            deadline: 截止時間
+            memo: 以第二巡16張牌的手牌鍵為鍵的進牌（聽牌時為等待牌）索引快取，可在候選牌之間共用
+            blocks: 手牌還需要湊的組數（5 - 副露組數）
+
+        Returns:
+            Optional[float]: 期望進牌張數，超時則為 None
+        """
+        state = HandState.from_counts(counts, self, blocks)
+        total = 0
+        weight = 0
+        for draw in range(34):
+            copies = 4 - counts[draw] - seen[draw]
+            if copies <= 0:
+                continue
+            if time.perf_counter() > deadline:
+                return None
+
+            counts[draw] += 1
+            state._add_index(draw)
+            # 先找出打掉後最小的進聽數，再只對這些打法計算進牌
+            discards = []
+            for discard in range(34):
+                if counts[discard] == 0:
+                    continue
+                state._remove_index(discard)
+                discards.append((state.shanten, discard))
+                state._add_index(discard)
+            next_shanten = min(discards)[0]
+
+            best = 0
+            for after, discard in discards:
+                if after != next_shanten:
+                    continue
+                counts[discard] -= 1
+                key = state.key - _TILE_BITS[discard]
+                accepting = memo.get(key)
+                if accepting is None:
+                    if next_shanten == 0:
+                        accepting = _table_waits(key)
+                    else:
+                        accepting = self._improving_indices(counts, next_shanten, blocks=blocks)
+                    memo[key] = accepting
+                seen[discard] += 1
+                best = max(best, self._remaining_copies(counts, seen, accepting))
+                seen[discard] -= 1
+                counts[discard] += 1
+
+            state._remove_index(draw)
+            counts[draw] -= 1
+            total += copies * best
+            weight += copies
+        return total / weight if weight else 0.0
 
-    def suggest_discard(self, hand_17: List[str]) -> Dict[str, Any]:
+    def suggest_discard(self, hand_17: List[str], visible: Optional[List[int]] = None,
+                        lookahead_ms: Optional[float] = None,
+                        deadline_ms: Optional[float] = None,
+                        melds: Optional[List[List[str]]] = None) -> 'DiscardSuggestion':
         """建議17張牌中應該打哪一張
         
         這個方法會對每張牌進行評估，計算打掉該牌後剩餘16張牌的進聽數，
         然後選擇進聽數最小的牌作為建議。
         
         Args:
-            hand_17: 17張牌的列表（16張手牌 + 1張摸到的牌），每個元素是牌字符串
+            hand_17: 17張牌的列表（16張手牌 + 1張摸到的牌；副露 k 組時為 17 - 3k 張），每個元素是牌字符串
+            visible: 34格的已看到牌數（索引順序同 TILE_LABELS），用來計算進牌實際剩下的張數；
+                打掉的牌本身也會被算成已看到
+            lookahead_ms: 啟用兩巡評估並指定兩巡評估的期限（毫秒，從呼叫開始算起），None 表示不啟用。
+                這個期限只限制兩巡評估：所有選項的進聽數與最佳選項的等待牌或進牌一定會先算完
+                （要限制它們請同時指定 deadline_ms），剩下的時間才用來評估。
+                啟用時所有選項都會多出 'lookahead_score'，最佳選項以此分數決定同分時的順序；
+                不是最佳選項或時間不足而未評估的選項分數為 None
+            deadline_ms: 整次呼叫的時間上限（毫秒，從呼叫開始算起），None 表示不限制。所有選項的進聽數一定會算完，
+                之後依可能性逐一計算最佳選項的等待牌或進牌，時間到就返回目前最好的答案：
+                只在已計算的選項中挑選；一個都來不及計算時保留所有同進聽數的選項，
+                未計算的 'wait_count'/'wait_tiles' 或 'improving_count'/'improving_tiles' 為 None。
+                與 lookahead_ms 同時使用時，兩巡評估也不會超過這個期限
+            melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露；
+                副露的牌會加進已看到的牌數（visible 中不應重複計算）
             
         Returns:
-            Dict[str, any]: 建議結果，包含：
+            DiscardSuggestion: 建議結果，可以用屬性或 dict 的方式讀取（result.tile 或 result['tile']），
+            to_dict() 可轉成一般的 dict；包含：
                 - 'tile': 建議打掉的牌
                 - 'shanten_after': 打掉該牌後的進聽數
                 - 'all_options': 所有可能的打牌選項列表，每個選項包含：
                     - 'tile': 牌
                     - 'shanten': 打掉後的進聽數
-                - 'best_options': 所有最佳選項列表（進聽數相同的牌）
+                - 'best_options': 所有最佳選項列表（進聽數相同的牌），另外包含
+                  'wait_count'/'wait_tiles'（聽牌時）與 'improving_count'/'improving_tiles'
+                  （未聽牌時，improving_count 是進牌實際剩下的張數）
                 - 'reason': 建議原因
+                - 'lookahead_complete': 啟用兩巡評估時才有，是否在時間內評估完所有最佳選項
+                - 'complete': 指定 deadline_ms 時才有，各欄位是否已完整計算：
+                  'shanten'（一定為 True）、'details'（等待牌或進牌）與 'lookahead'（有啟用兩巡評估時）
         """
-        if len(hand_17) != 17:
-            raise ValueError(f"手牌必須是17張，目前有 {len(hand_17)} 張")
-        
-        # 儲存所有可能的打牌選項
-        options = []
-        
-        # 對每張牌進行評估
-        for i, tile in enumerate(hand_17):
-            # 創建移除該牌後的16張牌列表
-            hand_16 = hand_17[:i] + hand_17[i+1:]
-            
-            # 計算這16張牌的進聽數
-            try:
-                shanten = self.calculate_shanten(hand_16)
-                options.append({
-                    'tile': tile,
-                    'shanten': shanten,
-                    'index': i  # 紀錄位置，處理重複牌時使用
-                })
-            except Exception as e:
-                # 如果計算失敗，跳過這張牌
-                print(f"警告: 計算打掉 {tile} 後的進聽數時發生錯誤: {e}")
+        # 時間上限從進入函式開始計算，檢查輸入、進聽數與排名的時間都算在內
+        start = time.perf_counter()
+        blocks, meld_counts = self._meld_counts(melds)
+        self._check_hand_size(hand_17, blocks, drawn=True)
+        stats = self._stats
+        if stats is not None:
+            stats.count('suggest_discard')
+        deadline = start + deadline_ms / 1000 if deadline_ms is not None else None
+        if lookahead_ms is not None:
+            lookahead_deadline = start + lookahead_ms / 1000
+            if deadline is not None:
+                lookahead_deadline = min(lookahead_deadline, deadline)
+        
+        # 只在入口轉換一次，之後都在計數陣列上運算
+        counts = self._hand_to_counts(hand_17)
+        seen = self._visible_counts(visible) or [0] * 34
+        seen = [min(4, count + meld) for count, meld in zip(seen, meld_counts)]
+        state = HandState.from_counts(counts, self, blocks)
+
+        # 相同的牌打掉後結果相同，每種牌只評估一次
+        # 暫時移除該牌，只需重算該牌所在花色，其他花色沿用 HandState 的合併結果
+        shanten_by_index = {}
+        for index in range(34):
+            if counts[index] == 0:
                 continue
-        
-        if len(options) == 0:
-            raise ValueError("無法計算任何打牌選項")
-        
-        # 找出進聽數最小的選項
-        best_option = min(options, key=lambda x: x['shanten'])
-        
-        # 找出所有進聽數相同的選項（可能有多張牌都能達到相同進聽數）
-        best_shanten = best_option['shanten']
-        best_options = [opt for opt in options if opt['shanten'] == best_shanten]
-        
-        # 若進聽數為0，計算等待張數，優先等待越多的牌
-        if best_shanten == 0:
-            enriched = []
+            state._remove_index(index)
+            shanten_by_index[index] = state.shanten
+            state._add_index(index)
+
+        # 儲存所有可能的打牌選項（index 紀錄位置，處理重複牌時使用）
+        # kinds 是每個位置的牌索引，之後的去重複與查詢都用它，不再處理牌字符串
+        kinds = [_TILE_INDEX[tile] for tile in hand_17]
+        options = [DiscardOption(tile, shanten_by_index[kind], i) for i, (tile, kind) in enumerate(zip(hand_17, kinds))]
+        best_shanten = min(option.shanten for option in options)
+        if stats is not None:
+            stats.phase('shanten', time.perf_counter() - start)
+        
+        # 等待牌與進牌在需要比較或讀取時才計算（見 DiscardSuggestion），重複的牌只計算一次
+        context = _DiscardContext(self, counts, state.key, kinds, seen, blocks, best_shanten)
+        result = DiscardSuggestion(best_shanten, options, context)
+        
+        # 有 deadline 時先依可能性（周圍牌越少越可能是好打法）逐一計算，時間到就停止，
+        # 之後不再補算，來不及計算的欄位為 None
+        if deadline is not None:
+            order = list(dict.fromkeys(kinds[opt.index] for opt in options if opt.shanten == best_shanten))
+            order.sort(key=lambda index: _discard_priority(counts, index))
+            for index in order:
+                if time.perf_counter() > deadline:
+                    break
+                context.detail(index)
+            context.frozen = True
+            details_complete = len(context.details) == len(order)
+
+        # 兩巡評估：為最佳選項計算分數，分數高的排前面（未評估的排最後，其餘維持原順序）
+        lookahead_complete = True
+        if lookahead_ms is not None:
+            context.lookahead = True
+            for opt in options:
+                opt._lookahead = True
+            best_options = result.best_options
+            if stats is not None:
+                lookahead_start = time.perf_counter()
+            scores = {}
+            memo = {}
             for opt in best_options:
-                hand_16 = hand_17[:opt['index']] + hand_17[opt['index'] + 1:]
-                wait_count, wait_tiles = self._count_waiting_tiles(hand_16)
-                opt = opt.copy()
-                opt['wait_count'] = wait_count
-                opt['wait_tiles'] = wait_tiles
-                opt['improving_count'] = 0  # 聽牌時不需要進牌
-                opt['improving_tiles'] = []
-                enriched.append(opt)
-            max_wait = max(enriched, key=lambda x: x['wait_count'])['wait_count']
-            best_options = [o for o in enriched if o['wait_count'] == max_wait]
+                index = kinds[opt.index]
+                if index not in scores:
+                    counts[index] -= 1
+                    seen[index] += 1
+                    if best_shanten == 0:
+                        # 聽牌時以等待牌實際剩下的張數作為分數
+                        waits = _table_waits(state.key - _TILE_BITS[index])
+                        scores[index] = float(self._remaining_copies(counts, seen, waits))
+                    else:
+                        scores[index] = self._lookahead_score(counts, best_shanten, seen, lookahead_deadline,
+                                                              memo, blocks)
+                    seen[index] -= 1
+                    counts[index] += 1
+                opt.lookahead_score = scores[index]
+                if scores[index] is None:
+                    lookahead_complete = False
+            # all_options 中同一種牌的選項也記上分數，其他選項維持 None
+            for opt in options:
+                opt.lookahead_score = scores.get(kinds[opt.index])
+            best_options.sort(key=lambda o: -o.lookahead_score if o.lookahead_score is not None else float('inf'))
+            result.lookahead_complete = lookahead_complete
+            if stats is not None:
+                stats.phase('lookahead', time.perf_counter() - lookahead_start)
+        
+        if deadline_ms is not None:
+            complete = {'shanten': True, 'details': details_complete}
+            if lookahead_ms is not None:
+                complete['lookahead'] = lookahead_complete
+            result.complete = complete
+        return result
+
+class HandState:
+    """可增量更新的手牌狀態
+
+    保存34格計數、手牌鍵（見 _counts_key）以及萬、筒、條、字牌四組各自的拆解表項。
+    摸牌 (add) 或打牌 (remove) 時手牌鍵只加減一次，只重新查詢受影響那一組的表項，
+    再和「其他三組」的快取合併結果合併一次，不需要從整副手牌重新計算。
+
+    Examples:
+        >>> state = HandState(["1m", "2m"])
+        >>> state.add("3m")
+        8
+        >>> state.remove("3m")
+        9
+    """
+
+    def __init__(self, hand: Optional[List[str]] = None, calculator: Optional['ShantenCalculator'] = None,
+                 blocks: int = _MAX_BLOCKS):
+        """
+        Args:
+            hand: 初始手牌列表（可為空）
+            calculator: 指定算法的 ShantenCalculator；非 "table" 算法時每次都完整重算，
+                有快取時會先查詢計算器的快取
+            blocks: 手牌需要湊的組數，沒有副露時為5，每副露一組少一組
+        """
+        counts = [0] * 34
+        for tile in hand or []:
+            index = _TILE_INDEX.get(tile)
+            if index is None:
+                raise ValueError(f"無法解析牌: {tile}")
+            counts[index] += 1
+            if counts[index] > 4:
+                raise ValueError(f"每種牌最多4張，{tile} 超過4張")
+        self._reset(counts, calculator, blocks)
+
+    @classmethod
+    def from_counts(cls, counts: List[int], calculator: Optional['ShantenCalculator'] = None,
+                    blocks: int = _MAX_BLOCKS) -> 'HandState':
+        """由34格計數陣列建立狀態（會複製 counts）"""
+        state = cls.__new__(cls)
+        state._reset(list(counts), calculator, blocks)
+        return state
+
+    def _reset(self, counts: List[int], calculator: Optional['ShantenCalculator'], blocks: int) -> None:
+        if not 0 <= blocks <= _MAX_BLOCKS:
+            raise ValueError(f"組數必須在 0~{_MAX_BLOCKS} 之間，目前為 {blocks}")
+        self._calculator = calculator
+        self.blocks = blocks
+        self.counts = counts
+        self.key = _counts_key(counts)
+        man, pin, sou, honor = _group_keys(self.key)
+        self._entries = [_suit_entry(man), _suit_entry(pin), _suit_entry(sou), _honor_entry(honor)]
+        # 每組對應「其他三組合併後的表項」快取，格式為 (三組表項..., 合併結果)
+        self._others: List[Optional[tuple]] = [None] * 4
+        self._last_group = 0
+        self._shanten: Optional[int] = None
+
+    def _others_entry(self, group: int) -> Tuple[int, ...]:
+        """其他三組合併後的表項；表項由表格共用，因此用 is 判斷快取是否仍有效"""
+        entries = self._entries
+        a, b, c = _OTHER_GROUPS[group]
+        ea, eb, ec = entries[a], entries[b], entries[c]
+        cached = self._others[group]
+        if cached is None or cached[0] is not ea or cached[1] is not eb or cached[2] is not ec:
+            cached = (ea, eb, ec, _merge_entries(_merge_entries(ea, eb), ec))
+            self._others[group] = cached
+        return cached[3]
+
+    def _refresh(self, index: int) -> None:
+        """重新查詢 index 所在那一組的表項"""
+        group = index // 9
+        if group < 3:
+            self._entries[group] = _suit_entry((self.key >> _GROUP_SHIFTS[group]) & _GROUP_MASKS[group])
         else:
-            # 若進聽數 > 0，計算進牌張數，優先進牌越多的牌
-            enriched = []
-            for opt in best_options:
-                hand_16 = hand_17[:opt['index']] + hand_17[opt['index'] + 1:]
-                improving_count, improving_tiles = self._count_improving_tiles(hand_16, best_shanten)
-                opt = opt.copy()
-                opt['wait_count'] = 0  # 未聽牌時沒有等待牌
-                opt['wait_tiles'] = []
-                opt['improving_count'] = improving_count
-                opt['improving_tiles'] = improving_tiles
-                enriched.append(opt)
-            
-            # 選擇進牌張數最多的選項
-            if len(enriched) > 1:
-                max_improving = max(enriched, key=lambda x: x['improving_count'])['improving_count']
-                best_options = [o for o in enriched if o['improving_count'] == max_improving]
-            else:
-                best_options = enriched
+            self._entries[3] = _honor_entry(self.key >> _GROUP_SHIFTS[3])
+        self._last_group = group
+        self._shanten = None
 
-        # 如果有多張牌進聽數（及等待數）相同，仍選第一張
-        suggested_tile = best_options[0]['tile']
-        
-        # 生成建議原因
-        if best_shanten == 0:
-            reason = f"打掉這張牌後已聽牌，等待 {best_options[0]['wait_count']} 張"
-        elif len(best_options) > 1:
-            improving_count = best_options[0].get('improving_count', 0)
-            if improving_count > 0:
-                reason = f"打掉這張牌後進聽數為 {best_shanten}，有 {improving_count} 張進牌（共有 {len(best_options)} 張牌可達到此進聽數）"
+    def _add_index(self, index: int) -> None:
+        self.counts[index] += 1
+        self.key += _TILE_BITS[index]
+        self._refresh(index)
+
+    def _remove_index(self, index: int) -> None:
+        if self.counts[index] == 0:
+            raise ValueError(f"手牌中沒有 {TILE_LABELS[index]}")
+        self.counts[index] -= 1
+        self.key -= _TILE_BITS[index]
+        self._refresh(index)
+
+    def add(self, tile: str) -> int:
+        """加入一張牌（摸牌），返回新的進聽數"""
+        index = _TILE_INDEX.get(tile)
+        if index is None:
+            raise ValueError(f"無法解析牌: {tile}")
+        if self.counts[index] >= 4:
+            raise ValueError(f"每種牌最多4張，手牌中已經有4張 {tile}")
+        self._add_index(index)
+        return self.shanten
+
+    def remove(self, tile: str) -> int:
+        """移除一張牌（打牌），返回新的進聽數"""
+        index = _TILE_INDEX.get(tile)
+        if index is None:
+            raise ValueError(f"無法解析牌: {tile}")
+        self._remove_index(index)
+        return self.shanten
+
+    @property
+    def shanten(self) -> int:
+        """目前手牌的進聽數（16張時 0 為聽牌，17張時 -1 為和牌）"""
+        if self._shanten is None:
+            calculator = self._calculator
+            if calculator is None:
+                self._shanten = self._incremental_shanten()
+            elif calculator.algorithm != "table":
+                self._shanten = calculator._shanten_key(self.key, self.blocks, self.counts)
             else:
-                reason = f"打掉這張牌後進聽數為 {best_shanten}（共有 {len(best_options)} 張牌可達到此進聽數）"
-        else:
-            improving_count = best_options[0].get('improving_count', 0)
-            if improving_count > 0:
-                reason = f"打掉這張牌後進聽數為 {best_shanten}，有 {improving_count} 張進牌"
+                # 增量計算不經過 _shanten_key，在這裡計入量測
+                if calculator._stats is not None:
+                    calculator._stats.count('calculate_shanten')
+                if calculator._cache is None:
+                    self._shanten = self._incremental_shanten()
+                else:
+                    # 使用計算器的快取，未命中時仍以增量方式計算
+                    key = self.key | self.blocks << _BLOCKS_SHIFT
+                    shanten = calculator._cache_get(key)
+                    if shanten is None:
+                        shanten = self._incremental_shanten()
+                        calculator._cache_put(key, shanten)
+                    self._shanten = shanten
+        return self._shanten
+
+    def _incremental_shanten(self) -> int:
+        """最近變動的那一組和其他三組的快取合併結果合併一次"""
+        group = self._last_group
+        return 2 * self.blocks - _best_value(self._others_entry(group), self._entries[group], self.blocks)
+
+    def tiles(self) -> List[str]:
+        """目前的手牌列表（依索引順序）"""
+        return [TILE_LABELS[i] for i, count in enumerate(self.counts) for _ in range(count)]
+
+    def copy(self) -> 'HandState':
+        state = HandState.__new__(HandState)
+        state._calculator = self._calculator
+        state.blocks = self.blocks
+        state.counts = list(self.counts)
+        state.key = self.key
+        state._entries = list(self._entries)
+        state._others = list(self._others)
+        state._last_group = self._last_group
+        state._shanten = self._shanten
+        return state
+
+    def __len__(self) -> int:
+        return sum(self.counts)
+
+# ------------------------------------------------------------
+# 打牌建議結果
+# ------------------------------------------------------------
+class _ResultMapping:
+    """讓結果物件也能像 dict 一樣讀取（result['tile']、result.get(...)、'key' in result），
+    與舊版直接返回 dict 的呼叫端相容；keys() 只列出這個結果實際有的欄位"""
+
+    __slots__ = ()
+
+    # 一定會有的欄位；子類別可以在 keys() 中依情況加上其他欄位
+    _KEYS: Tuple[str, ...] = ()
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._KEYS
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self.keys() else default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換成 dict（包含的選項也一起轉換），會計算所有尚未計算的欄位"""
+        def plain(value: Any) -> Any:
+            if isinstance(value, _ResultMapping):
+                return value.to_dict()
+            if isinstance(value, list):
+                return [plain(item) for item in value]
+            return value
+        return {key: plain(self[key]) for key in self.keys()}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _ResultMapping):
+            other = other.to_dict()
+        if not isinstance(other, dict):
+            return NotImplemented
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class _DiscardContext:
+    """一次 suggest_discard 呼叫中計算等待牌與進牌需要的資料，各選項共用"""
+
+    __slots__ = ('calculator', 'counts', 'key', 'kinds', 'seen', 'blocks', 'shanten', 'details', 'frozen',
+                 'lookahead')
+
+    def __init__(self, calculator: 'ShantenCalculator', counts: List[int], key: int, kinds: List[int],
+                 seen: List[int], blocks: int, shanten: int):
+        self.calculator = calculator
+        self.counts = counts
+        # counts 的手牌鍵，打掉一張牌只要減去該牌的位元
+        self.key = key
+        # 手牌每個位置的牌索引（DiscardOption.index -> 牌索引）
+        self.kinds = kinds
+        self.seen = seen
+        self.blocks = blocks
+        self.shanten = shanten
+        # 牌的索引 -> (等待牌或進牌張數, 種類列表)
+        self.details: Dict[int, Tuple[int, List[str]]] = {}
+        # 凍結後不再計算（deadline 已過），沒算到的欄位為 None
+        self.frozen = False
+        self.lookahead = False
+
+    def detail(self, index: int) -> Optional[Tuple[int, List[str]]]:
+        """打掉 index 後的等待牌（聽牌時）或進牌，第一次需要時才計算（不修改共用的陣列）"""
+        detail = self.details.get(index)
+        if detail is None and not self.frozen:
+            stats = self.calculator._stats
+            if stats is not None:
+                start = time.perf_counter()
+            if self.shanten == 0:
+                detail = self.calculator._waiting_tiles_key(self.key - _TILE_BITS[index])
             else:
-                reason = f"打掉這張牌後進聽數為 {best_shanten}，是最佳選擇"
+                counts = list(self.counts)
+                counts[index] -= 1
+                # 打掉的牌也算已看到
+                seen = list(self.seen)
+                seen[index] += 1
+                detail = self.calculator._improving_tiles_counts(counts, self.shanten, seen, self.blocks)
+            self.details[index] = detail
+            if stats is not None:
+                stats.phase('enrichment', time.perf_counter() - start)
+        return detail
+
+
+class DiscardOption(_ResultMapping):
+    """一個打牌選項：打掉手牌中第 index 張（tile）後的進聽數
+
+    最佳選項另外有等待牌與進牌欄位，第一次讀取時才計算；
+    其他選項只有 'tile'、'shanten'、'index' 三個欄位。
+    啟用兩巡評估時所有選項都有 'lookahead_score'（沒有評估的選項為 None）。
+    """
+
+    __slots__ = ('tile', 'shanten', 'index', 'lookahead_score', '_context', '_lookahead')
+
+    _KEYS = ('tile', 'shanten', 'index')
+    _DETAIL_KEYS = _KEYS + ('wait_count', 'wait_tiles', 'improving_count', 'improving_tiles')
+
+    def __init__(self, tile: str, shanten: int, index: int, context: Optional[_DiscardContext] = None):
+        self.tile = tile
+        self.shanten = shanten
+        self.index = index
+        # 兩巡評估的分數，只有啟用兩巡評估時才會出現在 keys() 中
+        self.lookahead_score: Optional[float] = None
+        self._context = context
+        # 不是最佳選項（沒有 context）時，是否啟用了兩巡評估
+        self._lookahead = False
+
+    def keys(self) -> Tuple[str, ...]:
+        if self._context is None:
+            return self._KEYS + ('lookahead_score',) if self._lookahead else self._KEYS
+        if self._context.lookahead:
+            return self._DETAIL_KEYS + ('lookahead_score',)
+        return self._DETAIL_KEYS
+
+    def _field(self, tenpai: bool, position: int, empty: Any) -> Any:
+        """聽牌與否和 tenpai 不符時返回 empty，否則返回計算結果的第 position 項（來不及計算時為 None）"""
+        context = self._context
+        if context is None:
+            raise AttributeError("只有最佳選項才有等待牌與進牌欄位")
+        if (context.shanten == 0) != tenpai:
+            return empty
+        detail = context.detail(context.kinds[self.index])
+        if detail is None:
+            return None
+        return list(detail[1]) if position else detail[0]
+
+    @property
+    def wait_count(self) -> Optional[int]:
+        """聽牌時的等待牌種類數（未聽牌時為 0）"""
+        return self._field(True, 0, 0)
+
+    @property
+    def wait_tiles(self) -> Optional[List[str]]:
+        """聽牌時的等待牌列表（未聽牌時為空列表）"""
+        return self._field(True, 1, [])
+
+    @property
+    def improving_count(self) -> Optional[int]:
+        """未聽牌時進牌實際剩下的張數（聽牌時為 0）"""
+        return self._field(False, 0, 0)
+
+    @property
+    def improving_tiles(self) -> Optional[List[str]]:
+        """未聽牌時的進牌種類列表（聽牌時為空列表）"""
+        return self._field(False, 1, [])
+
+
+class DiscardSuggestion(_ResultMapping):
+    """suggest_discard 的結果
+
+    進聽數在建立時就全部算好；最佳選項、建議的牌與原因第一次讀取時才排名。
+    只有一種牌能達到最小進聽數時不需要計算等待牌或進牌，
+    只讀取 'shanten_after' 時也完全不會計算。
+    """
+
+    __slots__ = ('shanten_after', 'all_options', 'lookahead_complete', 'complete', '_context', '_best_options')
+
+    _KEYS = ('tile', 'shanten_after', 'all_options', 'best_options', 'reason')
+
+    def __init__(self, shanten_after: int, all_options: List[DiscardOption], context: _DiscardContext):
+        self.shanten_after = shanten_after
+        self.all_options = all_options
+        # 只有啟用兩巡評估 / 指定 deadline 時才會設定，並出現在 keys() 中
+        self.lookahead_complete: Optional[bool] = None
+        self.complete: Optional[Dict[str, bool]] = None
+        self._context = context
+        self._best_options: Optional[List[DiscardOption]] = None
+
+    def keys(self) -> Tuple[str, ...]:
+        keys = self._KEYS
+        if self.lookahead_complete is not None:
+            keys += ('lookahead_complete',)
+        if self.complete is not None:
+            keys += ('complete',)
+        return keys
+
+    @property
+    def best_options(self) -> List[DiscardOption]:
+        """進聽數最小、等待牌（聽牌時）或進牌最多的選項"""
+        if self._best_options is None:
+            self._best_options = self._rank()
+        return self._best_options
+
+    def _rank(self) -> List[DiscardOption]:
+        context = self._context
+        tied = [DiscardOption(opt.tile, opt.shanten, opt.index, context)
+                for opt in self.all_options if opt.shanten == self.shanten_after]
+        if len({context.kinds[opt.index] for opt in tied}) == 1:
+            # 只有一種牌可以打時不需要比較
+            return tied
+        # 優先等待或進牌越多的牌；完全來不及計算時保留所有選項，依可能性排序
+        field = 'wait_count' if self.shanten_after == 0 else 'improving_count'
+        evaluated = [opt for opt in tied if getattr(opt, field) is not None]
+        if evaluated:
+            top = max(getattr(opt, field) for opt in evaluated)
+            return [opt for opt in evaluated if getattr(opt, field) == top]
+        return sorted(tied, key=lambda opt: _discard_priority(context.counts, context.kinds[opt.index]))
+
+    @property
+    def tile(self) -> str:
+        """建議打掉的牌（同分時取第一張）"""
+        return self.best_options[0].tile
+
+    @property
+    def reason(self) -> str:
+        """建議原因"""
+        stats = self._context.calculator._stats
+        if stats is None:
+            return self._reason()
+        self.best_options  # 先完成排名，排名的等待牌與進牌算在 enrichment 階段
+        start = time.perf_counter()
+        reason = self._reason()
+        stats.phase('reason', time.perf_counter() - start)
+        return reason
+
+    def to_compact(self) -> Dict[str, Any]:
+        """只保留批次輸出需要的欄位（省略 all_options 等大型列表），可以直接輸出 JSON
         
+        Returns:
+            Dict[str, Any]: 包含 'tile'、'shanten_after'、'best_tiles'（最佳選項的牌，不重複）、
+                'wait_count'、'improving_count' 與 'reason'
+        """
+        best = self.best_options[0]
         return {
-            'tile': suggested_tile,
-            'shanten_after': best_shanten,
-            'all_options': options,
-            'best_options': best_options,  # 所有最佳選項
-            'reason': reason
+            'tile': self.tile,
+            'shanten_after': self.shanten_after,
+            'best_tiles': list(dict.fromkeys(opt.tile for opt in self.best_options)),
+            'wait_count': best.wait_count,
+            'improving_count': best.improving_count,
+            'reason': self.reason,
         }
 
+    def _reason(self) -> str:
+        best_options = self.best_options
+        best = best_options[0]
+        shanten = self.shanten_after
+        if shanten == 0:
+            if best.wait_count is None:
+                return "打掉這張牌後已聽牌（等待牌尚未計算）"
+            return f"打掉這張牌後已聽牌，等待 {best.wait_count} 張"
+        improving_count = best.improving_count
+        if improving_count is None:
+            return f"打掉這張牌後進聽數為 {shanten}（進牌尚未計算）"
+        if len(best_options) > 1:
+            if improving_count > 0:
+                return f"打掉這張牌後進聽數為 {shanten}，有 {improving_count} 張進牌（共有 {len(best_options)} 張牌可達到此進聽數）"
+            return f"打掉這張牌後進聽數為 {shanten}（共有 {len(best_options)} 張牌可達到此進聽數）"
+        if improving_count > 0:
+            return f"打掉這張牌後進聽數為 {shanten}，有 {improving_count} 張進牌"
+        return f"打掉這張牌後進聽數為 {shanten}，是最佳選擇"
+
+# 模組層級便捷函式共用的計算器：使用預設的 table 算法、不啟用快取，
+# 計算過程中不會修改任何屬性（狀態都在每次呼叫的區域變數或 HandState 中），
+# 因此可以從多個執行緒同時呼叫，不需要每次建立新物件
+_ENGINE = ShantenCalculator()
+
 def calculate_max_melds(hand: List[str]) -> int:
     """計算手牌中最多可以形成的面子數量的便捷函式
     
@@ -1161,8 +2561,7 @@ def calculate_max_melds(hand: List[str]) -> int:
     Returns:
         int: 最多可以形成的面子數量
     """
-    calculator = ShantenCalculator()
-    return calculator.calculate_max_melds(hand)
+    return _ENGINE.calculate_max_melds(hand)
 
 def find_tatsu(hand: List[str]) -> List[Tuple[str, str, str]]:
     """尋找手牌中的所有搭子的便捷函式
@@ -1173,8 +2572,7 @@ def find_tatsu(hand: List[str]) -> List[Tuple[str, str, str]]:
     Returns:
         List[Tuple[str, str, str]]: 搭子列表，每個元素是一個元組，包含兩張牌和搭子類型
     """
-    calculator = ShantenCalculator()
-    return calculator.find_tatsu(hand)
+    return _ENGINE.find_tatsu(hand)
 
 def count_tatsu(hand: List[str]) -> Dict[str, int]:
     """計算手牌中各類型搭子的數量的便捷函式
@@ -1185,8 +2583,7 @@ def count_tatsu(hand: List[str]) -> Dict[str, int]:
     Returns:
         Dict[str, int]: 各類型搭子的數量
     """
-    calculator = ShantenCalculator()
-    return calculator.count_tatsu(hand)
+    return _ENGINE.count_tatsu(hand)
 
 def find_max_tatsu(hand: List[str]) -> List[Tuple[str, str, str]]:
     """尋找手牌中的搭子，優先順序為：順子搭子 > 對子。
@@ -1197,8 +2594,7 @@ def find_max_tatsu(hand: List[str]) -> List[Tuple[str, str, str]]:
     Returns:
         包含搭子的列表，每個搭子表示為 (牌1, 牌2, 類型)
     """
-    calculator = ShantenCalculator()
-    return calculator.find_max_tatsu(hand)
+    return _ENGINE.find_max_tatsu(hand)
 
 def find_pairs(hand: List[str]) -> List[Tuple[str, str]]:
     """尋找手牌中所有的對子
@@ -1209,37 +2605,419 @@ def find_pairs(hand: List[str]) -> List[Tuple[str, str]]:
     Returns:
         包含對子的列表，每個對子表示為 (牌1, 牌2)
     """
-    calculator = ShantenCalculator()
-    return calculator.find_pairs(hand)
+    return _ENGINE.find_pairs(hand)
 
-def calculate_shanten(hand: List[str]) -> int:
+def calculate_shanten(hand: List[str], melds: Optional[List[List[str]]] = None) -> int:
     """計算手牌的進聴數的便捷函式
     
     Args:
-        hand: 16張手牌，每個元素是牌字符串，例如 ["1m", "2m", "east", ...]
+        hand: 16張手牌（副露 k 組時為 16 - 3k 張），每個元素是牌字符串，例如 ["1m", "2m", "east", ...]
+        melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露
         
     Returns:
         int: 進聴數
+        
+    Examples:
+        >>> calculate_shanten(["1m", "2m", "3m", "5p", "5p", "7s", "8s", "9s", "east", "east"],
+        ...                   melds=[["4m", "5m", "6m"], ["white", "white", "white"]])
+        0
     """
-    calculator = ShantenCalculator()
-    return calculator.calculate_shanten(hand)
+    return _ENGINE.calculate_shanten(hand, melds)
 
-def suggest_discard(hand_17: List[str]) -> Dict[str, Any]:
+def calculate_shanten_batch(counts: np.ndarray) -> np.ndarray:
+    """批次計算多手牌的進聽數
+    
+    每一列是一手牌的34格計數（索引順序同 TILE_LABELS）。
+    各花色以向量化方式查拆解表，相同的花色圖形只查一次，適合離線分析大量手牌。
+    16張牌的結果與 calculate_shanten 相同；17張牌時 -1 代表已經和牌。
+    
+    Args:
+        counts: 形狀為 (N, 34) 的整數陣列（建議 uint8），每格 0~4 張
+        
+    Returns:
+        np.ndarray: 形狀為 (N,) 的 int8 進聽數陣列
+        
+    Examples:
+        >>> hand = np.zeros((1, 34), dtype=np.uint8)
+        >>> hand[0, [0, 1, 2]] = 1
+        >>> calculate_shanten_batch(hand)
+        array([8], dtype=int8)
+    """
+    counts = np.asarray(counts)
+    if counts.ndim != 2 or counts.shape[1] != 34:
+        raise ValueError(f"計數陣列的形狀必須是 (N, 34)，目前是 {counts.shape}")
+    if counts.size and (counts.min() < 0 or counts.max() > 4):
+        raise ValueError("每種牌的張數必須在 0~4 之間")
+    if len(counts) == 0:
+        return np.zeros(0, dtype=np.int8)
+    return _batch_table_shanten(counts)
+
+def is_complete_hand(hand_17: List[str], melds: Optional[List[List[str]]] = None) -> bool:
+    """判斷17張牌是否已經和牌的便捷函式
+    
+    Args:
+        hand_17: 17張牌的列表（副露 k 組時為 17 - 3k 張），每個元素是牌字符串
+        melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露
+        
+    Returns:
+        bool: 是否和牌（5個面子 + 1對將）
+        
+    Examples:
+        >>> is_complete_hand(["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m",
+        ...                   "1p", "2p", "3p", "east", "east", "east", "white", "white"])
+        True
+    """
+    return _ENGINE.is_complete_hand(hand_17, melds)
+
+def is_valid_meld(meld: List[str]) -> bool:
+    """判斷一組牌是否為有效的副露（吃：同花色連續三張；碰：三張相同；槓：四張相同）
+    
+    Examples:
+        >>> is_valid_meld(["3p", "4p", "5p"]), is_valid_meld(["8m", "9m", "1p"])
+        (True, False)
+    """
+    try:
+        _ENGINE._meld_counts([meld])
+    except ValueError:
+        return False
+    return True
+
+def suggest_discard(hand_17: List[str], visible: Optional[List[int]] = None,
+                    lookahead_ms: Optional[float] = None,
+                    deadline_ms: Optional[float] = None,
+                    melds: Optional[List[List[str]]] = None) -> 'DiscardSuggestion':
     """建議17張牌中應該打哪一張的便捷函式
     
     Args:
-        hand_17: 17張牌的列表（16張手牌 + 1張摸到的牌），每個元素是牌字符串
+        hand_17: 17張牌的列表（16張手牌 + 1張摸到的牌；副露 k 組時為 17 - 3k 張），每個元素是牌字符串
+        visible: 34格的已看到牌數（索引順序同 TILE_LABELS），None 表示都沒看到
+        lookahead_ms: 啟用兩巡評估的時間上限（毫秒），None 表示不啟用
+        deadline_ms: 整次呼叫的時間上限（毫秒），時間到時返回目前最好的答案，None 表示不限制
+        melds: 副露列表，每組是3張（吃、碰）或4張（槓）牌的列表，None 表示沒有副露
         
     Returns:
-        Dict[str, any]: 建議結果，包含：
+        DiscardSuggestion: 建議結果，可以用屬性或 dict 的方式讀取，包含：
             - 'tile': 建議打掉的牌
             - 'shanten_after': 打掉該牌後的進聽數
             - 'all_options': 所有可能的打牌選項列表
             - 'best_options': 所有最佳選項列表
             - 'reason': 建議原因
     """
-    calculator = ShantenCalculator()
-    return calculator.suggest_discard(hand_17)
+    return _ENGINE.suggest_discard(hand_17, visible, lookahead_ms, deadline_ms, melds)
+
+# 多行程批次處理：每個工作行程只建立一次計算器（拆解表也只在該行程內建立一次）
+_WORKER_CALCULATOR: Optional[ShantenCalculator] = None
+
+def _init_worker(algorithm: str, cache_size: int) -> None:
+    """工作行程的初始化函式"""
+    global _WORKER_CALCULATOR
+    _WORKER_CALCULATOR = ShantenCalculator(algorithm, cache_size)
+
+def _run_worker_chunk(function: Callable[..., List[Any]], chunk: List[Any], args: tuple) -> List[Any]:
+    """在工作行程內以該行程的計算器處理一批"""
+    return function(chunk, *args, calculator=_WORKER_CALCULATOR)
+
+def stream_chunks(function: Callable[..., List[Any]], items: Iterable[Any], args: tuple = (),
+                   workers: Optional[int] = None, chunksize: int = 64, ordered: bool = True,
+                   algorithm: str = "table", cache_size: int = 0) -> Iterator[Any]:
+    """把輸入依 chunksize 分批送到 ProcessPoolExecutor，逐筆產生結果（批次工具共用的串流行程池）
+    
+    同時最多只有 workers * 2 批在處理中，輸入可以是很大的迭代器（例如逐行讀檔），記憶體用量維持固定。
+    每個工作行程只建立一次計算器，function 不需要自己建立；
+    function 應該把單筆的錯誤轉成結果（例如 {'error': ...}），拋出的例外會中斷整個串流。
+    
+    Args:
+        function: 處理一批的模組層級函式，以 function(chunk, *args, calculator=計算器) 呼叫，返回結果列表
+        items: 輸入的可迭代物件
+        args: 傳給 function 的其他參數
+        workers: 工作行程數，None 為 CPU 核心數；1 時直接在目前行程計算
+        chunksize: 每批送給工作行程的項目數
+        ordered: True 時依輸入順序產生結果；False 時依完成順序（較慢的批次不會擋住後面的結果）
+        algorithm: 進聽數算法，同 ShantenCalculator
+        cache_size: 每個工作行程的進聽數快取上限
+        
+    Yields:
+        function 返回的每一筆結果
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize 必須大於 0")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers 必須大於 0")
+    if algorithm not in ShantenCalculator.ALGORITHMS:
+        raise ValueError(f"未知的算法: {algorithm}，可用: {', '.join(ShantenCalculator.ALGORITHMS)}")
+    
+    iterator = iter(items)
+    
+    def next_chunk() -> List[Any]:
+        return list(islice(iterator, chunksize))
+    
+    if workers == 1:
+        calculator = ShantenCalculator(algorithm, cache_size)
+        while True:
+            chunk = next_chunk()
+            if not chunk:
+                return
+            yield from function(chunk, *args, calculator=calculator)
+    
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(algorithm, cache_size))
+    try:
+        pending = deque()
+        exhausted = False
+        while True:
+            # 補滿處理中的批次
+            while not exhausted and len(pending) < workers * 2:
+                chunk = next_chunk()
+                if not chunk:
+                    exhausted = True
+                    break
+                pending.append(executor.submit(_run_worker_chunk, function, chunk, args))
+            if not pending:
+                return
+            if ordered:
+                yield from pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in [f for f in pending if f in done]:
+                    pending.remove(future)
+                    yield from future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _suggest_chunk(hands: List[List[str]], calculator: Optional[ShantenCalculator] = None) -> List[Dict[str, Any]]:
+    """處理一批手牌（預設使用工作行程的計算器）；任何一手牌失敗時以 'error' 欄位回報，不中斷整批"""
+    calculator = calculator or _WORKER_CALCULATOR or _ENGINE
+    results = []
+    for hand in hands:
+        try:
+            results.append(calculator.suggest_discard(list(hand)).to_compact())
+        except Exception as e:
+            results.append({'error': str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"})
+    return results
+
+def suggest_discard_many(hands: Iterable[List[str]], workers: Optional[int] = None, chunksize: int = 64,
+                         algorithm: str = "table", cache_size: int = 0) -> Iterator[Dict[str, Any]]:
+    """以多個行程批次計算打牌建議
+    
+    手牌依 chunksize 分批送到 ProcessPoolExecutor，結果依輸入順序逐筆產生。
+    同時最多只有 workers * 2 批在處理中，輸入可以是很大的迭代器（例如逐行讀檔），記憶體用量維持固定。
+    
+    Args:
+        hands: 17張手牌的可迭代物件
+        workers: 工作行程數，None 為 CPU 核心數；1 時直接在目前行程計算
+        chunksize: 每批送給工作行程的手牌數
+        algorithm: 進聽數算法，同 ShantenCalculator
+        cache_size: 每個工作行程的進聽數快取上限
+        
+    Yields:
+        Dict[str, Any]: 每手牌的精簡結果，包含 'tile'、'shanten_after'、'best_tiles'、
+            'wait_count'、'improving_count'、'reason'；手牌無效時只有 'error'
+    """
+    return stream_chunks(_suggest_chunk, hands, workers=workers, chunksize=chunksize,
+                          algorithm=algorithm, cache_size=cache_size)
+
+# 蒙地卡羅模擬：每批模擬都有自己的亂數種子（由 seed、候選牌與批次編號決定），
+# 因此結果與工作行程數、排程順序無關，可以重現
+_SIM_BATCH = 50
+_SIM_Z = 1.96  # 95% 信賴區間
+
+# 模擬用的行程池依工作行程數保留下來重複使用，互動呼叫不必每次都付出啟動行程的成本
+_SIM_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_SIM_POOLS_LOCK = threading.Lock()
+
+def _simulation_pool(workers: int) -> ProcessPoolExecutor:
+    """取得（第一次時建立）有 workers 個工作行程的模擬行程池"""
+    with _SIM_POOLS_LOCK:
+        executor = _SIM_POOLS.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            _SIM_POOLS[workers] = executor
+        return executor
+
+def shutdown_simulation_pools() -> None:
+    """關閉 simulate_discards 保留的行程池（程式結束時也會自動關閉）"""
+    with _SIM_POOLS_LOCK:
+        pools = list(_SIM_POOLS.values())
+        _SIM_POOLS.clear()
+    for executor in pools:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _discard_priority(counts: List[int], index: int) -> int:
+    """模擬時打牌的次要順序：周圍（同花色前後兩格）牌越少越先打"""
+    if index >= _HONOR_BASE:
+        return counts[index]
+    base = index - index % 9
+    return sum(counts[max(base, index - 2):min(base + 8, index + 2) + 1])
+
+def _simulate_runs(counts: List[int], wall: List[int], turns: int, runs: int, seed: int,
+                   blocks: int = _MAX_BLOCKS) -> Tuple[int, int]:
+    """從打牌後的手牌（還需要湊 blocks 組）開始模擬 runs 局，每局最多摸 turns 張牌
+
+    每巡摸牌後若和牌就結束；否則打掉進聽數最小的牌（同分時打周圍牌最少的）。
+    牌牆以剩餘張數為準，同一局中摸過的牌不會再出現。
+
+    Returns:
+        Tuple[int, int]: (和牌局數, 曾經聽牌的局數)
+    """
+    rng = random.Random(seed)
+    pool = [index for index in range(34) for _ in range(wall[index])]
+    turns = min(turns, len(pool))
+    wins = tenpais = 0
+    for _ in range(runs):
+        state = HandState.from_counts(counts, _WORKER_CALCULATOR or _ENGINE, blocks)
+        hand = state.counts
+        reached_tenpai = state.shanten == 0
+        won = False
+        for draw in rng.sample(pool, turns):
+            state._add_index(draw)
+            if state.shanten < 0:
+                won = True
+                break
+            best = None
+            for discard in range(34):
+                if hand[discard] == 0:
+                    continue
+                state._remove_index(discard)
+                key = (state.shanten, _discard_priority(hand, discard))
+                state._add_index(discard)
+                if best is None or key < best[0]:
+                    best = (key, discard)
+            state._remove_index(best[1])
+            if best[0][0] == 0:
+                reached_tenpai = True
+        wins += won
+        tenpais += won or reached_tenpai
+    return wins, tenpais
+
+def _wilson_interval(successes: int, trials: int) -> Tuple[float, float]:
+    """成功率的 Wilson 信賴區間"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + _SIM_Z ** 2 / trials
+    center = (p + _SIM_Z ** 2 / (2 * trials)) / denominator
+    margin = _SIM_Z * ((p * (1 - p) + _SIM_Z ** 2 / (4 * trials)) / trials) ** 0.5 / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def simulate_discards(hand_17: List[str], visible: Optional[List[int]] = None, n_sims: int = 200,
+                      workers: Optional[int] = 1, turns: int = 8, seed: int = 0,
+                      goal: str = "win", max_candidates: int = 4,
+                      melds: Optional[List[List[str]]] = None) -> Dict[str, Any]:
+    """以蒙地卡羅模擬估計每個候選打法在 turns 巡內和牌或聽牌的機率
+    
+    候選牌取自 suggest_discard：先取最佳選項，再補上其他打掉後進聽數同樣最小的牌，
+    最多 max_candidates 種。每個候選牌一次模擬一批，每批結束後淘汰信賴區間上界
+    低於第一名下界的候選牌，只剩一個時提早停止。
+    
+    Args:
+        hand_17: 17張牌的列表（副露 k 組時為 17 - 3k 張）
+        visible: 34格的已看到牌數（不會出現在牌牆中），None 表示都沒看到
+        n_sims: 每個候選牌最多模擬的局數
+        workers: 工作行程數，1 時直接在目前行程計算，None 為 CPU 核心數；
+            大於 1 時使用保留下來的行程池（見 shutdown_simulation_pools）
+        turns: 每局最多摸幾張牌
+        seed: 亂數種子，相同參數與種子的結果相同
+        goal: 排名與提早停止依據的成功率，"win"（和牌）或 "tenpai"（聽牌或和牌）
+        max_candidates: 最多模擬幾種候選牌
+        melds: 副露列表，同 suggest_discard；副露的牌不會出現在牌牆中
+        
+    Returns:
+        Dict[str, Any]: 包含：
+            - 'tile': 成功率最高的候選牌
+            - 'candidates': 依成功率由高到低排序的列表，每項包含 'tile'、'shanten'、'sims'、
+              'win_rate'、'tenpai_rate' 與 'interval'（goal 成功率的95%信賴區間）；
+              被提早淘汰的候選牌 sims 會比較少
+            - 'stopped_early': 是否因信賴區間分離而提早停止
+    """
+    if goal not in ("win", "tenpai"):
+        raise ValueError(f"未知的模擬目標: {goal}，可選: win, tenpai")
+    if n_sims < 1 or turns < 1 or max_candidates < 1:
+        raise ValueError("n_sims、turns 與 max_candidates 必須大於 0")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers 必須大於 0")
+    
+    suggestion = _ENGINE.suggest_discard(hand_17, visible, melds=melds)
+    blocks, meld_counts = _ENGINE._meld_counts(melds)
+    counts = _ENGINE._hand_to_counts(hand_17)
+    seen = _ENGINE._visible_counts(visible) or [0] * 34
+    
+    # 以摸牌後的手牌與副露計算牌牆，打掉的牌也已經不在牌牆中
+    wall = [max(0, 4 - counts[i] - meld_counts[i] - seen[i]) for i in range(34)]
+    candidates = []
+    for opt in suggestion['best_options'] + suggestion['all_options']:
+        if opt['shanten'] != suggestion['shanten_after'] or any(c['tile'] == opt['tile'] for c in candidates):
+            continue
+        if len(candidates) == max_candidates:
+            break
+        index = _TILE_INDEX[opt['tile']]
+        hand = list(counts)
+        hand[index] -= 1
+        candidates.append({'tile': opt['tile'], 'shanten': opt['shanten'], 'counts': hand, 'wall': wall,
+                           'sims': 0, 'wins': 0, 'tenpais': 0})
+    
+    def record(candidate: Dict[str, Any], runs: int, result: Tuple[int, int]) -> None:
+        candidate['sims'] += runs
+        candidate['wins'] += result[0]
+        candidate['tenpais'] += result[1]
+    
+    def successes(candidate: Dict[str, Any]) -> int:
+        return candidate['wins'] if goal == "win" else candidate['tenpais']
+    
+    def eliminate(active: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """淘汰信賴區間上界低於第一名下界的候選牌"""
+        leader = max(active, key=lambda c: successes(c) / c['sims'])
+        lower = _wilson_interval(successes(leader), leader['sims'])[0]
+        return [c for c in active if c is leader or _wilson_interval(successes(c), c['sims'])[1] >= lower]
+    
+    executor = _simulation_pool(workers) if workers > 1 else None
+    stopped_early = False
+    active = list(candidates)
+    try:
+        batch = 0
+        while batch * _SIM_BATCH < n_sims:
+            runs = min(_SIM_BATCH, n_sims - batch * _SIM_BATCH)
+            tasks = []
+            for candidate in active:
+                number = candidates.index(candidate)
+                # 每個 (種子, 候選牌, 批次) 有各自獨立的亂數序列
+                batch_seed = int(np.random.SeedSequence(seed, spawn_key=(number, batch)).generate_state(1)[0])
+                args = (candidate['counts'], candidate['wall'], turns, runs, batch_seed, blocks)
+                tasks.append((candidate, executor.submit(_simulate_runs, *args) if executor else args))
+            for candidate, task in tasks:
+                record(candidate, runs, task.result() if executor else _simulate_runs(*task))
+            batch += 1
+            active = eliminate(active)
+            if len(active) == 1 and len(candidates) > 1 and batch * _SIM_BATCH < n_sims:
+                stopped_early = True
+                break
+    except BrokenProcessPool:
+        # 工作行程異常結束時丟棄這個行程池，下次呼叫重新建立
+        with _SIM_POOLS_LOCK:
+            if _SIM_POOLS.get(workers) is executor:
+                del _SIM_POOLS[workers]
+        raise
+    
+    results = []
+    for candidate in candidates:
+        sims = candidate['sims']
+        results.append({
+            'tile': candidate['tile'],
+            'shanten': candidate['shanten'],
+            'sims': sims,
+            'win_rate': candidate['wins'] / sims,
+            'tenpai_rate': candidate['tenpais'] / sims,
+            'interval': _wilson_interval(successes(candidate), sims),
+        })
+    results.sort(key=lambda r: r['win_rate' if goal == "win" else 'tenpai_rate'], reverse=True)
+    return {
+        'tile': results[0]['tile'],
+        'candidates': results,
+        'stopped_early': stopped_early,
+    }
 
 def visualize_hand(hand: List[str], use_chinese: bool = True) -> str:
     """視覺化手牌的便捷函式
@@ -1263,8 +3041,7 @@ def visualize_hand(hand: List[str], use_chinese: bool = True) -> str:
         >>> visualize_hand(["1m", "2m", "3m", "1p", "2p", "east", "south"], use_chinese=False)
         'wan: 1m,2m,3m | tong: 1p,2p | feng: east,south'
     """
-    calculator = ShantenCalculator()
-    return calculator.visualize_hand(hand, use_chinese)
+    return _ENGINE.visualize_hand(hand, use_chinese)
 
 def tile_to_chinese(tile: str) -> str:
     """將單張牌轉換為中文顯示格式的便捷函式
@@ -1281,5 +3058,4 @@ def tile_to_chinese(tile: str) -> str:
         >>> tile_to_chinese("east")
         '東'
     """
-    calculator = ShantenCalculator()
-    return calculator._tile_to_chinese(tile) 
\ No newline at end of file
+    return _ENGINE._tile_to_chinese(tile) 
\ No newline at end of file
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+進聽數引擎的差分模糊測試
+以不依賴拆解表的窮舉參考實作（oracle）為標準答案，隨機產生手牌（含副露），
+在多個工作行程中比對 calculate_shanten（table / search / 快取）、HandState 增量計算、
+_count_waiting_tiles 與 suggest_discard 的結果。發現不一致時先把手牌縮到最簡，
+再寫入回歸案例檔（JSON Lines），之後可用 --replay 重新驗證
+
+用法: python fuzz_shanten.py [--cases 2000] [--workers 4] [--seed 0] [--output fuzz_regressions.jsonl]
+      python fuzz_shanten.py --replay fuzz_regressions.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from benchmark_suite import perturb, random_complete_hand
+from calculate_shanten import HandState, ShantenCalculator, TILE_LABELS
+
+_INDEX = {tile: i for i, tile in enumerate(TILE_LABELS)}
+DEFAULT_REGRESSION_PATH = "fuzz_regressions.jsonl"
+
+# ------------------------------------------------------------
+# 窮舉參考實作（oracle）
+# ------------------------------------------------------------
+def _without(counts: tuple, *indices: int) -> tuple:
+    work = list(counts)
+    for i in indices:
+        work[i] -= 1
+    return tuple(work)
+
+@lru_cache(maxsize=1 << 20)
+def _oracle_value(counts: tuple, blocks: int, head: bool) -> int:
+    """列舉所有拆法，返回最多使用 blocks 組時 2*面子 + 搭子 + 將 的最大值
+
+    最小的那張牌一定是某一組的最小牌或單張，因此依序嘗試每一種以它開頭的組合即可列舉所有拆法（不剪枝）。
+    """
+    i = next((i for i, count in enumerate(counts) if count), None)
+    if i is None:
+        return 0
+    best = _oracle_value(_without(counts, i), blocks, head)
+    in_suit = i < 27
+    offset = i % 9
+    if counts[i] >= 2:
+        if not head:
+            best = max(best, 1 + _oracle_value(_without(counts, i, i), blocks, True))
+        if blocks:
+            best = max(best, 1 + _oracle_value(_without(counts, i, i), blocks - 1, head))
+    if blocks:
+        if counts[i] >= 3:
+            best = max(best, 2 + _oracle_value(_without(counts, i, i, i), blocks - 1, head))
+        if in_suit and offset <= 6 and counts[i + 1] and counts[i + 2]:
+            best = max(best, 2 + _oracle_value(_without(counts, i, i + 1, i + 2), blocks - 1, head))
+        if in_suit and offset <= 7 and counts[i + 1]:
+            best = max(best, 1 + _oracle_value(_without(counts, i, i + 1), blocks - 1, head))
+        if in_suit and offset <= 6 and counts[i + 2]:
+            best = max(best, 1 + _oracle_value(_without(counts, i, i + 2), blocks - 1, head))
+    return best
+
+def oracle_shanten(counts: tuple, blocks: int = 5) -> int:
+    """參考進聽數：2 * blocks - 最大價值"""
+    return 2 * blocks - _oracle_value(tuple(counts), blocks, False)
+
+@lru_cache(maxsize=1 << 18)
+def _oracle_complete(counts: tuple, head: bool) -> bool:
+    """能否把所有牌剛好拆成面子加一對將（head 為 True 表示將已經用掉）"""
+    i = next((i for i, count in enumerate(counts) if count), None)
+    if i is None:
+        return head
+    if not head and counts[i] >= 2 and _oracle_complete(_without(counts, i, i), True):
+        return True
+    if counts[i] >= 3 and _oracle_complete(_without(counts, i, i, i), head):
+        return True
+    return (i < 27 and i % 9 <= 6 and counts[i + 1] > 0 and counts[i + 2] > 0
+            and _oracle_complete(_without(counts, i, i + 1, i + 2), head))
+
+def oracle_waits(counts: tuple) -> set:
+    """參考等待牌：逐一摸進每一種牌（手中已有4張的除外），檢查是否和牌"""
+    waits = set()
+    for i in range(34):
+        if counts[i] < 4:
+            work = list(counts)
+            work[i] += 1
+            if _oracle_complete(tuple(work), False):
+                waits.add(TILE_LABELS[i])
+    return waits
+
+def oracle_improving(counts: tuple, shanten: int, seen: list, blocks: int) -> tuple:
+    """參考進牌：摸進後存在某個打法讓進聽數小於 shanten 的牌，返回 (剩餘張數, 種類集合)"""
+    total = 0
+    tiles = set()
+    for draw in range(34):
+        remaining = 4 - counts[draw] - seen[draw]
+        if remaining <= 0:
+            continue
+        drawn = list(counts)
+        drawn[draw] += 1
+        if any(drawn[d] and oracle_shanten(_without(tuple(drawn), d), blocks) < shanten for d in range(34)):
+            total += remaining
+            tiles.add(TILE_LABELS[draw])
+    return total, tiles
+
+def oracle_suggestion(hand: list, melds: list) -> dict:
+    """參考打牌建議：每種牌打掉後的進聽數、最佳選項，以及最佳選項的等待牌或進牌"""
+    counts = to_counts(hand)
+    blocks = 5 - len(melds)
+    seen = to_counts([tile for meld in melds for tile in meld])
+    shanten = {TILE_LABELS[i]: oracle_shanten(_without(counts, i), blocks) for i in range(34) if counts[i]}
+    best_shanten = min(shanten.values())
+    details = {}
+    for tile, value in shanten.items():
+        if value != best_shanten:
+            continue
+        i = _INDEX[tile]
+        after = _without(counts, i)
+        if best_shanten == 0:
+            waits = oracle_waits(after)
+            details[tile] = (len(waits), waits)
+        else:
+            discarded = list(seen)
+            discarded[i] += 1
+            details[tile] = oracle_improving(after, best_shanten, discarded, blocks)
+    top = max(count for count, _ in details.values())
+    return {
+        'shanten': shanten,
+        'shanten_after': best_shanten,
+        'best': {tile: detail for tile, detail in details.items() if detail[0] == top},
+    }
+
+def to_counts(tiles: list) -> tuple:
+    counts = [0] * 34
+    for tile in tiles:
+        counts[_INDEX[tile]] += 1
+    return tuple(counts)
+
+# ------------------------------------------------------------
+# 比對
+# ------------------------------------------------------------
+def check_shanten(hand: list, melds: list) -> str:
+    """各算法與快取的16張（減去副露）進聽數"""
+    hand = hand[:-1]
+    expected = oracle_shanten(to_counts(hand), 5 - len(melds))
+    for name, calculator in (("table", ShantenCalculator()), ("search", ShantenCalculator("search")),
+                             ("cache", ShantenCalculator(cache_size=16))):
+        # 快取版本算兩次，第二次會命中快取
+        for _ in range(2 if name == "cache" else 1):
+            actual = calculator.calculate_shanten(hand, melds)
+            if actual != expected:
+                return f"{name}: calculate_shanten = {actual}，應為 {expected}"
+    return ""
+
+def check_hand_state(hand: list, melds: list) -> str:
+    """HandState 增量計算：摸牌後與逐一打掉每種牌後的進聽數"""
+    blocks = 5 - len(melds)
+    state = HandState(hand[:-1], blocks=blocks)
+    state.add(hand[-1])
+    counts = to_counts(hand)
+    expected = oracle_shanten(counts, blocks)
+    if state.shanten != expected:
+        return f"HandState 摸牌後進聽數 = {state.shanten}，應為 {expected}"
+    for i in range(34):
+        if counts[i]:
+            actual = state.remove(TILE_LABELS[i])
+            expected = oracle_shanten(_without(counts, i), blocks)
+            state.add(TILE_LABELS[i])
+            if actual != expected:
+                return f"HandState 打掉 {TILE_LABELS[i]} 後進聽數 = {actual}，應為 {expected}"
+    return ""
+
+def check_waits(hand: list, melds: list) -> str:
+    """打掉最後一張後的等待牌（和組數無關）"""
+    hand = hand[:-1]
+    _, waits = ShantenCalculator()._count_waiting_tiles(hand)
+    expected = oracle_waits(to_counts(hand))
+    if set(waits) != expected:
+        return f"等待牌 = {sorted(waits)}，應為 {sorted(expected)}"
+    return ""
+
+def check_suggest(hand: list, melds: list) -> str:
+    """suggest_discard 的進聽數、最佳選項與最佳選項的等待牌或進牌"""
+    result = ShantenCalculator().suggest_discard(hand, melds=melds)
+    expected = oracle_suggestion(hand, melds)
+    for opt in result.all_options:
+        if opt.shanten != expected['shanten'][opt.tile]:
+            return f"打掉 {opt.tile} 後進聽數 = {opt.shanten}，應為 {expected['shanten'][opt.tile]}"
+    best = {opt.tile: opt for opt in result.best_options}
+    if set(best) != set(expected['best']):
+        return f"最佳選項 = {sorted(best)}，應為 {sorted(expected['best'])}"
+    for tile, (count, tiles) in expected['best'].items():
+        opt = best[tile]
+        actual = (opt.wait_count, set(opt.wait_tiles)) if expected['shanten_after'] == 0 else \
+            (opt.improving_count, set(opt.improving_tiles))
+        if actual != (count, tiles):
+            return f"打掉 {tile} 的等待牌或進牌 = {actual}，應為 {(count, tiles)}"
+    return ""
+
+CHECKS = {
+    "shanten": check_shanten,
+    "hand_state": check_hand_state,
+    "waits": check_waits,
+    "suggest": check_suggest,
+}
+
+def run_check(name: str, hand: list, melds: list) -> str:
+    """執行一項比對，引擎拋出例外也算不一致"""
+    try:
+        return CHECKS[name](hand, melds)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+# ------------------------------------------------------------
+# 產生手牌與縮小失敗案例
+# ------------------------------------------------------------
+def random_meld(rng: random.Random) -> list:
+    if rng.random() < 0.5:
+        suit = rng.choice("mps")
+        start = rng.randint(1, 7)
+        return [f"{start + i}{suit}" for i in range(3)]
+    return [rng.choice(TILE_LABELS)] * 3
+
+def random_case(rng: random.Random) -> tuple:
+    """隨機產生一手合法的牌：0~3組副露，手牌 17 - 3k 張（最後一張為摸到的牌）"""
+    wall = [tile for tile in TILE_LABELS for _ in range(4)]
+    melds = []
+    for _ in range(rng.choice((0, 0, 0, 1, 2, 3))):
+        meld = random_meld(rng)
+        if all(wall.count(tile) >= meld.count(tile) for tile in meld):
+            for tile in meld:
+                wall.remove(tile)
+            melds.append(meld)
+    size = 17 - 3 * len(melds)
+
+    style = rng.random()
+    if style < 0.4 and not melds:
+        # 接近和牌的手牌，最容易測到聽牌與等待牌
+        return perturb(rng, random_complete_hand(rng), rng.randint(0, 5)), melds
+    if style < 0.7:
+        kinds = set(rng.sample(TILE_LABELS, rng.randint(5, 12)))
+        pool = [tile for tile in wall if tile in kinds]
+        if len(pool) >= size:
+            return rng.sample(pool, size), melds
+    return rng.sample(wall, size), melds
+
+def is_legal(hand: list, melds: list) -> bool:
+    counts = to_counts(hand + [tile for meld in melds for tile in meld])
+    return max(counts) <= 4
+
+def minimize(name: str, hand: list, melds: list) -> tuple:
+    """在維持同一項比對失敗的前提下縮小案例
+
+    1. 把三張手牌改成副露（碰字牌），手牌越少越好
+    2. 把每張牌換成索引更小的牌，讓剩下的牌盡量集中、容易閱讀
+    """
+    def fails(candidate_hand: list, candidate_melds: list) -> bool:
+        return is_legal(candidate_hand, candidate_melds) and bool(run_check(name, candidate_hand, candidate_melds))
+
+    changed = True
+    while changed:
+        changed = False
+        if len(melds) < 4:
+            for a in range(len(hand) - 1):
+                for b in range(a + 1, len(hand) - 1):
+                    for c in range(b + 1, len(hand) - 1):
+                        rest = [tile for k, tile in enumerate(hand) if k not in (a, b, c)]
+                        for honor in TILE_LABELS[27:]:
+                            if fails(rest, melds + [[honor] * 3]):
+                                hand, melds = rest, melds + [[honor] * 3]
+                                changed = True
+                                break
+                        if changed:
+                            break
+                    if changed:
+                        break
+                if changed:
+                    break
+        for position in range(len(hand)):
+            for tile in TILE_LABELS[:_INDEX[hand[position]]]:
+                candidate = hand[:position] + [tile] + hand[position + 1:]
+                if fails(candidate, melds):
+                    hand = candidate
+                    changed = True
+                    break
+    return hand, melds
+
+def fuzz_batch(seed: int, batch: int, count: int) -> list:
+    """工作行程：以 (seed, batch) 決定的亂數產生 count 手牌並比對，返回縮小後的失敗案例"""
+    rng = random.Random(f"{seed}:{batch}")
+    failures = []
+    for _ in range(count):
+        hand, melds = random_case(rng)
+        for name in CHECKS:
+            message = run_check(name, hand, melds)
+            if message:
+                small_hand, small_melds = minimize(name, hand, melds)
+                failures.append({
+                    'check': name,
+                    'hand': small_hand,
+                    'melds': small_melds,
+                    'message': run_check(name, small_hand, small_melds),
+                    'original': {'hand': hand, 'melds': melds, 'message': message},
+                })
+    return failures
+
+def run_fuzz(cases: int, workers: int = 1, seed: int = 0, batch_size: int = 50) -> list:
+    """產生 cases 手牌並比對，workers > 1 時分批交給多個工作行程，返回所有失敗案例"""
+    batches = [(seed, batch, min(batch_size, cases - batch * batch_size))
+               for batch in range((cases + batch_size - 1) // batch_size)]
+    if workers <= 1:
+        return [failure for args in batches for failure in fuzz_batch(*args)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(fuzz_batch, *zip(*batches))
+        return [failure for failures in results for failure in failures]
+
+def save_regressions(failures: list, path: str) -> int:
+    """把失敗案例附加到回歸案例檔（已存在的相同案例不重複寫入），返回新增筆數"""
+    existing = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            existing = {line.strip() for line in f if line.strip()}
+    added = 0
+    with open(path, "a", encoding="utf-8") as f:
+        for failure in failures:
+            line = json.dumps({key: failure[key] for key in ('check', 'hand', 'melds', 'message')},
+                              ensure_ascii=False)
+            if line not in existing:
+                existing.add(line)
+                f.write(line + "\n")
+                added += 1
+    return added
+
+def replay(path: str) -> list:
+    """重新比對回歸案例檔中的每個案例，返回仍然失敗的案例"""
+    still_failing = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                case = json.loads(line)
+                message = run_check(case['check'], case['hand'], case['melds'])
+                if message:
+                    still_failing.append(dict(case, message=message))
+    return still_failing
+
+def main():
+    parser = argparse.ArgumentParser(description="以窮舉參考實作比對進聽數引擎")
+    parser.add_argument("--cases", type=int, default=2000, help="隨機手牌數量")
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 核心數）")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--output", "-o", default=DEFAULT_REGRESSION_PATH, help="回歸案例檔")
+    parser.add_argument("--replay", metavar="PATH", help="只重新比對回歸案例檔中的案例")
+    args = parser.parse_args()
+
+    if args.replay:
+        failing = replay(args.replay)
+        for case in failing:
+            print(f"[{case['check']}] {case['hand']} 副露 {case['melds']}: {case['message']}")
+        print(f"回歸案例仍失敗: {len(failing)} 筆")
+        sys.exit(1 if failing else 0)
+
+    workers = args.workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    failures = run_fuzz(args.cases, workers, args.seed)
+    elapsed = time.perf_counter() - start
+    for failure in failures:
+        print(f"[{failure['check']}] {failure['hand']} 副露 {failure['melds']}: {failure['message']}")
+    print(f"比對 {args.cases} 手（{len(CHECKS)} 項），{workers} 個行程，耗時 {elapsed:.1f} 秒，"
+          f"不一致 {len(failures)} 筆")
+    if failures:
+        added = save_regressions(failures, args.output)
+        print(f"已寫入 {args.output}（新增 {added} 筆）")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,24 @@
 """
 互動式手牌測試工具
 可以輸入手牌並測試各種功能
+
+也可以用批次模式處理錄下來的手牌：從檔案（或標準輸入）逐行讀取手牌（格式同互動模式的輸入），
+以多個行程計算選定的項目（shanten、suggest、waits、tatsu），串流輸出 JSON Lines。
+同時處理中的批次有上限，輸出可以依輸入順序或完成順序，記憶體用量不隨輸入行數增加。
+
+用法: python interactive_test.py
+      python interactive_test.py --batch hands.txt [--ops shanten suggest waits tatsu] [--workers 4]
+                                 [--chunksize 256] [--order input|completion] [--output result.jsonl]
 """
 
+import argparse
+import json
+import sys
+import time
+
 from calculate_shanten import (
+    ShantenCalculator,
+    stream_chunks,
     calculate_shanten, 
     suggest_discard,
     calculate_max_melds,
@@ -16,14 +31,24 @@ from calculate_shanten import (
     tile_to_chinese
 )
 
-def parse_hand_input(input_str: str) -> list:
+def parse_hand_input(input_str: str, warnings: list = None) -> list:
     """解析用戶輸入的手牌字符串
     
     支援格式：
     - "1m 2m 3m ..." (空格分隔)
     - "1m,2m,3m,..." (逗號分隔)
     - "1m2m3m..." (連續)
+    
+    Args:
+        input_str: 手牌字符串
+        warnings: 給定時，無法解析的部分記錄到這個列表而不印出（批次模式使用）
     """
+    def warn(message: str) -> None:
+        if warnings is None:
+            print(f"警告: {message}")
+        else:
+            warnings.append(message)
+    
     # 移除空白和逗號
     input_str = input_str.replace(' ', '').replace(',', '')
     
@@ -49,10 +74,10 @@ def parse_hand_input(input_str: str) -> list:
                     tiles.append(tile)
                     i += 2
                 else:
-                    print(f"警告: 無法解析 '{input_str[i:i+2]}'，跳過")
+                    warn(f"無法解析 '{input_str[i:i+2]}'，跳過")
                     i += 1
             else:
-                print(f"警告: 輸入不完整，跳過剩餘部分")
+                warn("輸入不完整，跳過剩餘部分")
                 break
     
     return tiles
@@ -141,7 +166,7 @@ def test_suggest_discard(hand: list):
                     if len(improving_tiles_chinese) <= 10:
                         print(f"  進牌: {', '.join(improving_tiles_chinese)}")
                     else:
-                        print(f"  進牌: {', '.join(improving_tiles_chinese[:10])}... (共{len(improving_tiles_chinese)}張)")
+                        print(f"  進牌: {', '.join(improving_tiles_chinese[:10])}... (共{len(improving_tiles_chinese)}種)")
         
         # 顯示所有選項（前10個）
         if len(result['all_options']) > 0:
@@ -261,6 +286,129 @@ def test_find_pairs(hand: list):
     except Exception as e:
         print(f"❌ 計算錯誤: {e}")
 
+# ------------------------------------------------------------
+# 批次模式
+
+def _batch_waits(calculator: ShantenCalculator, hand: list) -> dict:
+    tiles = calculator.waiting_tiles(hand)
+    return {'count': len(tiles), 'tiles': tiles}
+
+def _batch_tatsu(calculator: ShantenCalculator, hand: list) -> dict:
+    tatsu = calculator.find_max_tatsu(hand)
+    return {'count': len(tatsu), 'tatsu': [list(t) for t in tatsu]}
+
+# 批次模式可選的項目：名稱 -> 以計算器處理一手牌的函式
+BATCH_OPERATIONS = {
+    'shanten': lambda calculator, hand: calculator.calculate_shanten(hand),
+    'suggest': lambda calculator, hand: calculator.suggest_discard(hand).to_compact(),
+    'waits': _batch_waits,
+    'tatsu': _batch_tatsu,
+}
+
+def _batch_line(line_number, text: str, ops: list, calculator: ShantenCalculator) -> dict:
+    """計算一行手牌；單一項目失敗（例如張數不符）時記錄在 'errors' 欄位，不影響同一行的其他項目"""
+    warnings = []
+    hand = parse_hand_input(text, warnings)
+    record = {'line': line_number, 'hand': hand}
+    errors = {}
+    for op in ops:
+        try:
+            record[op] = BATCH_OPERATIONS[op](calculator, hand)
+        except Exception as e:
+            errors[op] = str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"
+    if errors:
+        record['errors'] = errors
+    if warnings:
+        record['warnings'] = warnings
+    return record
+
+def _batch_chunk(lines: list, ops: list, calculator: ShantenCalculator) -> list:
+    """處理一批 (行號, 文字)，返回每行的 JSON 字串（在工作行程內序列化，減輕主行程的負擔）
+    
+    任何一行的失敗都轉成該行的錯誤紀錄（'error' 欄位），不會中斷整個串流。
+    """
+    results = []
+    for item in lines:
+        try:
+            line_number, text = item
+            record = _batch_line(line_number, text, ops, calculator)
+        except Exception as e:
+            line_number = item[0] if isinstance(item, (tuple, list)) and item else None
+            record = {'line': line_number, 'error': f"{type(e).__name__}: {e}"}
+        results.append(json.dumps(record, ensure_ascii=False, default=str))
+    return results
+
+def read_hand_lines(stream):
+    """逐行產生 (行號, 文字)，略過空行與 # 開頭的註解（不會一次讀入整個檔案）"""
+    for line_number, line in enumerate(stream, 1):
+        text = line.strip()
+        if text and not text.startswith('#'):
+            yield line_number, text
+
+def run_batch(lines, ops: list, workers: int = None, chunksize: int = 256, order: str = "input",
+              algorithm: str = "table", cache_size: int = 0):
+    """以多個行程批次處理手牌，逐筆產生 JSON 字串
+    
+    同時最多只有 workers * 2 批在處理中，輸入可以是很大的迭代器，記憶體用量維持固定。
+    
+    Args:
+        lines: (行號, 文字) 的可迭代物件，通常來自 read_hand_lines
+        ops: 要計算的項目，BATCH_OPERATIONS 的名稱
+        workers: 工作行程數，None 為 CPU 核心數；1 時直接在目前行程計算
+        chunksize: 每批送給工作行程的行數
+        order: "input" 依輸入順序輸出；"completion" 依完成順序輸出（較慢的批次不會擋住後面的結果，
+            每筆都有 'line' 欄位可以對回輸入）
+        algorithm: 進聽數算法，同 ShantenCalculator
+        cache_size: 每個工作行程的進聽數快取上限
+        
+    Yields:
+        str: 每行手牌的 JSON 結果
+    """
+    unknown = [op for op in ops if op not in BATCH_OPERATIONS]
+    if unknown or not ops:
+        raise ValueError(f"未知的項目: {', '.join(unknown) or '（未指定）'}，可用: {', '.join(BATCH_OPERATIONS)}")
+    if order not in ("input", "completion"):
+        raise ValueError(f"未知的輸出順序: {order}，可用: input, completion")
+    return stream_chunks(_batch_chunk, lines, (list(ops),), workers=workers, chunksize=chunksize,
+                          ordered=order == "input", algorithm=algorithm, cache_size=cache_size)
+
+def batch_main(args) -> None:
+    """批次模式的進入點"""
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    
+    start = time.perf_counter()
+    count = 0
+    try:
+        results = run_batch(read_hand_lines(source), args.ops, workers=args.workers, chunksize=args.chunksize,
+                            order=args.order, algorithm=args.algorithm, cache_size=args.cache_size)
+        for line in results:
+            target.write(line + "\n")
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"完成 {count} 手，耗時 {elapsed:.2f} 秒，每秒 {rate:.0f} 手", file=sys.stderr)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="麻將手牌互動式測試工具（指定 --batch 時為批次模式）")
+    parser.add_argument("--batch", metavar="INPUT", help="批次模式：手牌檔案，- 表示標準輸入")
+    parser.add_argument("--ops", nargs="+", choices=list(BATCH_OPERATIONS), default=["shanten", "suggest"],
+                        help="批次模式要計算的項目")
+    parser.add_argument("--output", "-o", default="-", help="批次模式的輸出檔案，省略或 - 表示標準輸出")
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 核心數）")
+    parser.add_argument("--chunksize", type=int, default=256, help="每批送給工作行程的行數")
+    parser.add_argument("--order", choices=("input", "completion"), default="input",
+                        help="輸出順序：依輸入順序，或依完成順序（每筆都有 line 欄位）")
+    parser.add_argument("--algorithm", choices=ShantenCalculator.ALGORITHMS, default="table", help="進聽數算法")
+    parser.add_argument("--cache-size", type=int, default=0, help="每個工作行程的進聽數快取上限")
+    return parser.parse_args(argv)
+
 def show_menu():
     """顯示選單"""
     print("\n" + "="*60)
@@ -360,6 +508,10 @@ def main():
         input("\n按 Enter 繼續...")
 
 if __name__ == '__main__':
+    args = parse_args()
+    if args.batch:
+        batch_main(args)
+        sys.exit(0)
     try:
         main()
     except KeyboardInterrupt:
@@ -1,11 +1,174 @@
 import cv2
+import json
+import threading
 import time
 import os
 import sys
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from window_capture import WindowCapture
-from calculate_shanten import suggest_discard
+from calculate_shanten import ShantenCalculator, is_valid_meld
+
+# 進聽數快取上限（鍵是整數，每筆約 150 位元組，50000 筆約 7.5MB），長時間執行時記憶體不會無限成長
+SHANTEN_CACHE_SIZE = 50000
+# 兩巡評估的時間上限（毫秒），讓同分的打牌選項在兩個畫面之間就能分出優劣
+LOOKAHEAD_MS = 30
+# 打牌建議整次呼叫的時間上限（毫秒），時間到就用目前最好的答案，畫面不會卡住
+SUGGEST_DEADLINE_MS = 30
+# 引擎量測記錄檔（每次完成的建議一行 JSON），設為 None 則只顯示在畫面上
+ENGINE_STATS_LOG = "engine_stats.log"
+
+class SuggestionWorker:
+    """在背景執行緒計算和牌判斷與打牌建議，畫面迴圈不會被引擎卡住
+    
+    submit() 只保留最新的一手牌：還沒開始計算的舊請求直接被取代；
+    正在計算的請求在計算期間有了新的手牌時，算完的結果視為過時而丟棄。
+    畫面迴圈以 latest() 取得最近一次完成的結果，繼續顯示到新的結果出現為止。
+    """
+    
+    def __init__(self, calculator):
+        """
+        Args:
+            calculator: 只由這個工作執行緒使用的 ShantenCalculator（量測結果會隨每次結果取出並清除）
+        """
+        self._calculator = calculator
+        self._condition = threading.Condition()
+        self._pending = None  # 等待計算的 (鍵, 手牌, 副露, 畫面編號)
+        self._latest_key = None  # 最後一次提交的手牌，結果與它不同就是過時的
+        self._result = None
+        self._closed = False
+        self.completed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="suggestion-worker", daemon=True)
+        self._thread.start()
+    
+    def submit(self, hand, melds, frame=None):
+        """提交目前畫面的手牌（摸牌後的完整手牌）；和上一次提交的相同時不重複計算"""
+        key = (tuple(hand), tuple(tuple(meld) for meld in melds))
+        with self._condition:
+            if key == self._latest_key:
+                return
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (key, list(hand), [list(meld) for meld in melds], frame)
+            self._latest_key = key
+            self._condition.notify()
+    
+    def latest(self):
+        """最近一次完成的結果，還沒有結果時為 None
+        
+        Returns:
+            dict | None: 包含 'seq'（第幾個結果）、'hand'、'melds'、'frame'、'is_win'、
+            'suggestion'（{'tile', 'shanten_after', 'complete'}，和牌或失敗時為 None）、
+            'error'（引擎拒絕這手牌時的原因，否則為 None）、
+            'elapsed_ms'（引擎耗時）與 'stats'（這次計算的引擎量測結果）
+        """
+        with self._condition:
+            return self._result
+    
+    def close(self):
+        """停止工作執行緒（正在計算的請求算完後才會結束）"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=1.0)
+    
+    def _run(self):
+        calculator = self._calculator
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                key, hand, melds, frame = self._pending
+                self._pending = None
+            
+            start = time.perf_counter()
+            is_win = False
+            suggestion = None
+            error = None
+            try:
+                is_win = calculator.is_complete_hand(hand, melds)
+                if not is_win:
+                    result = calculator.suggest_discard(hand, lookahead_ms=LOOKAHEAD_MS,
+                                                        deadline_ms=SUGGEST_DEADLINE_MS, melds=melds)
+                    # 在工作執行緒讀出要顯示的欄位，畫面迴圈不會觸發延後的計算
+                    suggestion = {'tile': result.tile, 'shanten_after': result.shanten_after,
+                                  'complete': result.complete}
+            except Exception as e:
+                # 例如副露辨識錯誤造成張數不符；結果照常送出，畫面上顯示原因
+                error = str(e)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats = calculator.stats_snapshot()
+            calculator.reset_stats()
+            
+            with self._condition:
+                if key != self._latest_key:
+                    # 計算期間已經有更新的手牌，這個結果不再顯示
+                    self.dropped += 1
+                    continue
+                self.completed += 1
+                self._result = {
+                    'seq': self.completed,
+                    'hand': hand,
+                    'melds': melds,
+                    'frame': frame,
+                    'is_win': is_win,
+                    'suggestion': suggestion,
+                    'error': error,
+                    'elapsed_ms': elapsed_ms,
+                    'stats': stats,
+                }
+
+def suggestion_lines(result, full_hand):
+    """背景建議結果的顯示文字：結論、所屬的手牌與耗時
+    
+    Args:
+        result: SuggestionWorker.latest() 的結果，None 時不顯示
+        full_hand: 目前畫面的完整手牌（沒有摸牌時為 None），和結果的手牌不同時標示為前一手
+    
+    Returns:
+        list: 要加到畫面上的文字列表
+    """
+    if result is None:
+        return []
+    lines = []
+    suggestion = result['suggestion']
+    if result['is_win']:
+        lines.append("WIN! Complete hand")
+    elif suggestion:
+        partial = "" if all(suggestion['complete'].values()) else " (partial)"
+        lines.append(f"Suggest discard: {suggestion['tile']} | Shanten: {suggestion['shanten_after']}{partial}")
+    elif result['error']:
+        lines.append(f"Engine rejected hand: {result['error']}")
+    stale = "" if full_hand == result['hand'] else " [previous hand]"
+    lines.append(f"  for: {' '.join(result['hand'])} | {result['elapsed_ms']:.1f}ms{stale}")
+    return lines
+
+def engine_stats_line(stats, log_file=None, frame=None):
+    """把一次建議的引擎量測結果寫入記錄檔，並返回畫面上要顯示的一行文字
+    
+    Args:
+        stats: ShantenCalculator.stats_snapshot() 的結果
+        log_file: 已開啟的記錄檔，None 表示不寫入
+        frame: 畫面編號，寫入記錄檔時一起記錄
+    
+    Returns:
+        str | None: 顯示文字；沒有呼叫引擎時為 None
+    """
+    if not stats['calls']:
+        return None
+    if log_file is not None:
+        log_file.write(json.dumps({'time': time.time(), 'frame': frame, **stats}) + "\n")
+    phases = stats['phases']
+    parts = [f"{name} {phases[name]['total_ms']:.1f}ms"
+             for name in ('shanten', 'enrichment', 'lookahead', 'reason') if name in phases]
+    total = sum(phase['total_ms'] for phase in phases.values())
+    calls = stats['calls']
+    return (f"Engine: {total:.1f}ms ({', '.join(parts) or 'shanten only'}) | "
+            f"shanten x{calls.get('calculate_shanten', 0)}, improving x{calls.get('count_improving_tiles', 0)}, "
+            f"waits x{calls.get('count_waiting_tiles', 0)}")
 
 def load_all_templates(samples_dir='samples'):
     """載入所有麻將牌模板"""
@@ -210,7 +373,45 @@ def draw_detections(image, detections):
     
     return result_img
 
-def main():
+def split_hand_and_melds(detections):
+    """把檢測結果分成手牌與副露
+
+    手牌排成一列（牌最多的那一列），垂直位置和手牌差超過半張牌高的牌視為副露：
+    每一列由左到右每三張一組，四張相同的牌視為槓。
+    任何一組不是吃、碰或槓（例如誤判或位置偏移的單張牌）時不採用分組，全部視為手牌，
+    避免一張多出來的牌讓手牌少算三張。
+
+    :return: (依 x 座標排序的手牌檢測結果, 副露列表)
+    """
+    rows = []
+    for det in sorted(detections, key=lambda d: d['y']):
+        if rows and det['y'] - rows[-1][-1]['y'] <= det['h'] / 2:
+            rows[-1].append(det)
+        else:
+            rows.append([det])
+    if not rows:
+        return [], []
+
+    hand_row = max(rows, key=len)
+    melds = []
+    for row in rows:
+        if row is hand_row:
+            continue
+        labels = [det['label'] for det in sorted(row, key=lambda d: d['x'])]
+        i = 0
+        while i < len(labels):
+            size = 4 if labels[i:i + 4] == [labels[i]] * 4 else 3
+            melds.append(labels[i:i + size])
+            i += size
+    if not all(is_valid_meld(meld) for meld in melds):
+        return sorted(detections, key=lambda d: d['x']), []
+    return sorted(hand_row, key=lambda d: d['x']), melds
+
+def run_preview(worker: SuggestionWorker, stats_log=None) -> bool:
+    """執行預覽（影片或視窗截取），返回是否正常執行到結束（影片或視窗無法開啟時為 False）"""
+    engine_line = None
+    logged_seq = 0
+    
     # 檢查是否有提供影片路徑
     use_video = False
     video_path = None
@@ -238,7 +439,7 @@ def main():
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             print(f"錯誤: 無法開啟影片: {video_path}")
-            return
+            return False
         
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -254,7 +455,7 @@ def main():
         if not ret:
             print("錯誤: 無法讀取影片的第一幀")
             cap.release()
-            return
+            return False
         frame_number = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
         
         print("操作說明:")
@@ -287,31 +488,30 @@ def main():
             detections = []
             hand_tiles = []  # 手牌
             drawn_tile = None  # 摸到的牌
+            melds = []  # 副露
             
-            suggestion = None
+            full_hand = None  # 摸牌後的完整手牌，交給背景計算
             if enable_detection and len(templates) > 0:
                 try:
                     # 使用模板匹配
                     detections = match_templates(current_frame, templates, threshold=0.8, scale_factor=0.2)
                     
-                    # 根據檢測結果區分手牌和摸到的牌
-                    # 按照x座標排序（從左到右）
-                    sorted_detections = sorted(detections, key=lambda d: d['x'])
+                    # 根據檢測結果區分手牌、副露和摸到的牌
+                    # 手牌按照x座標排序（從左到右）
+                    sorted_detections, melds = split_hand_and_melds(detections)
+                    concealed = 16 - 3 * len(melds)
                     
-                    if len(detections) == 16:
-                        # 16張牌，全部都是手牌
+                    if len(sorted_detections) == concealed:
+                        # 沒有摸牌，全部都是手牌
                         hand_tiles = [det['label'] for det in sorted_detections]
                         drawn_tile = None
-                    elif len(detections) == 17:
-                        # 17張牌，最右邊的是摸到的牌，其他16張是手牌
-                        hand_tiles = [det['label'] for det in sorted_detections[:16]]
-                        drawn_tile = sorted_detections[16]['label']
-                        # 嘗試給出打牌建議
-                        try:
-                            full_hand = [det['label'] for det in sorted_detections]
-                            suggestion = suggest_discard(full_hand)
-                        except Exception as e:
-                            print(f"建議計算失敗: {e}")
+                    elif len(sorted_detections) == concealed + 1:
+                        # 多一張時，最右邊的是摸到的牌
+                        hand_tiles = [det['label'] for det in sorted_detections[:-1]]
+                        drawn_tile = sorted_detections[-1]['label']
+                        # 和牌判斷與打牌建議在背景計算，這裡只提交最新的手牌
+                        full_hand = [det['label'] for det in sorted_detections]
+                        worker.submit(full_hand, melds, frame_number)
                     elif len(detections) > 0:
                         # 其他情況，全部當作手牌處理
                         hand_tiles = [det['label'] for det in sorted_detections]
@@ -336,11 +536,20 @@ def main():
             if len(hand_tiles) > 0:
                 info_lines.append(f"Hand ({len(hand_tiles)} tiles): {', '.join(hand_tiles)}")
             
+            if melds:
+                info_lines.append(f"Melds: {' | '.join(' '.join(meld) for meld in melds)}")
+            
             if drawn_tile:
                 info_lines.append(f"Drawn tile: {drawn_tile}")
 
-            if suggestion:
-                info_lines.append(f"Suggest discard: {suggestion['tile']} | Shanten: {suggestion['shanten_after']}")
+            # 繼續顯示最近一次完成的建議，新的結果出現時才更新量測並寫入記錄
+            result = worker.latest()
+            info_lines.extend(suggestion_lines(result, full_hand))
+            if result is not None and result['seq'] != logged_seq:
+                logged_seq = result['seq']
+                engine_line = engine_stats_line(result['stats'], stats_log, result['frame'])
+            if engine_line:
+                info_lines.append(engine_line)
             
             # 在圖片上顯示資訊
             y_offset = 30
@@ -379,7 +588,7 @@ def main():
         except Exception as e:
             print(f"錯誤: {e}")
             print("請確認遊戲已開啟，或使用影片模式: python main_preview.py <影片路徑>")
-            return
+            return False
 
         # 載入所有麻將牌模板
         print("\n正在載入麻將牌模板...")
@@ -395,40 +604,41 @@ def main():
 
         loop_time = time.time()
         enable_detection = True  # 檢測開關
+        frame_number = 0  # 截圖編號，寫入引擎量測記錄時用來對應畫面
 
         while True:
             # 1. 獲取截圖
             screenshot = wincap.get_screenshot()
+            frame_number += 1
 
             # 2. 進行模板匹配（如果啟用）
             detections = []
             hand_tiles = []  # 手牌
             drawn_tile = None  # 摸到的牌
+            melds = []  # 副露
             
-            suggestion = None
+            full_hand = None  # 摸牌後的完整手牌，交給背景計算
             if enable_detection and len(templates) > 0:
                 try:
                     # 使用模板匹配
                     detections = match_templates(screenshot, templates, threshold=0.8, scale_factor=0.2)
                     
-                    # 根據檢測結果區分手牌和摸到的牌
-                    # 按照x座標排序（從左到右）
-                    sorted_detections = sorted(detections, key=lambda d: d['x'])
+                    # 根據檢測結果區分手牌、副露和摸到的牌
+                    # 手牌按照x座標排序（從左到右）
+                    sorted_detections, melds = split_hand_and_melds(detections)
+                    concealed = 16 - 3 * len(melds)
                     
-                    if len(detections) == 16:
-                        # 16張牌，全部都是手牌
+                    if len(sorted_detections) == concealed:
+                        # 沒有摸牌，全部都是手牌
                         hand_tiles = [det['label'] for det in sorted_detections]
                         drawn_tile = None
-                    elif len(detections) == 17:
-                        # 17張牌，最右邊的是摸到的牌，其他16張是手牌
-                        hand_tiles = [det['label'] for det in sorted_detections[:16]]
-                        drawn_tile = sorted_detections[16]['label']
-                        # 嘗試給出打牌建議
-                        try:
-                            full_hand = [det['label'] for det in sorted_detections]
-                            suggestion = suggest_discard(full_hand)
-                        except Exception as e:
-                            print(f"建議計算失敗: {e}")
+                    elif len(sorted_detections) == concealed + 1:
+                        # 多一張時，最右邊的是摸到的牌
+                        hand_tiles = [det['label'] for det in sorted_detections[:-1]]
+                        drawn_tile = sorted_detections[-1]['label']
+                        # 和牌判斷與打牌建議在背景計算，這裡只提交最新的手牌
+                        full_hand = [det['label'] for det in sorted_detections]
+                        worker.submit(full_hand, melds, frame_number)
                     elif len(detections) > 0:
                         # 其他情況，全部當作手牌處理
                         hand_tiles = [det['label'] for det in sorted_detections]
@@ -449,11 +659,20 @@ def main():
             if len(hand_tiles) > 0:
                 info_lines.append(f"Hand ({len(hand_tiles)} tiles): {', '.join(hand_tiles)}")
             
+            if melds:
+                info_lines.append(f"Melds: {' | '.join(' '.join(meld) for meld in melds)}")
+            
             if drawn_tile:
                 info_lines.append(f"Drawn tile: {drawn_tile}")
 
-            if suggestion:
-                info_lines.append(f"Suggest discard: {suggestion['tile']} | Shanten: {suggestion['shanten_after']}")
+            # 繼續顯示最近一次完成的建議，新的結果出現時才更新量測並寫入記錄
+            result = worker.latest()
+            info_lines.extend(suggestion_lines(result, full_hand))
+            if result is not None and result['seq'] != logged_seq:
+                logged_seq = result['seq']
+                engine_line = engine_stats_line(result['stats'], stats_log, result['frame'])
+            if engine_line:
+                info_lines.append(engine_line)
             
             # 在圖片上顯示資訊
             y_offset = 30
@@ -482,6 +701,29 @@ def main():
                 print(f"檢測功能: {'開啟' if enable_detection else '關閉'}")
 
     cv2.destroyAllWindows()
+    return True
+
+def main():
+    # 連續畫面的手牌幾乎相同，共用一個帶快取的計算器；計算都在背景的工作執行緒進行
+    calculator = ShantenCalculator(cache_size=SHANTEN_CACHE_SIZE, instrument=True)
+    worker = SuggestionWorker(calculator)
+    stats_log = open(ENGINE_STATS_LOG, "a", encoding="utf-8") if ENGINE_STATS_LOG else None
+    try:
+        finished = run_preview(worker, stats_log)
+    finally:
+        # 任何結束方式（包含影片無法開啟的提早返回與例外）都要停止背景執行緒並關閉記錄檔
+        worker.close()
+        if stats_log is not None:
+            stats_log.close()
+    if not finished:
+        return
+    
+    print(f"\n背景建議: 完成 {worker.completed} 次，丟棄過時的請求 {worker.dropped} 次")
+    info = calculator.cache_info()
+    print(f"進聽數快取: 命中率 {info['hit_rate']:.1%} ({info['hits']}/{info['hits'] + info['misses']})，"
+          f"{info['size']}/{info['max_size']} 筆，淘汰 {info['evictions']} 筆，約 {info['memory_bytes'] / 1024 / 1024:.1f} MB")
+    if stats_log is not None:
+        print(f"引擎量測記錄: {ENGINE_STATS_LOG}")
     print("\n程式結束")
 
 if __name__ == '__main__':
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+進聽數查詢伺服器
+長時間執行的單一行程，以本機 TCP（或 Unix domain socket）提供進聽數、打牌建議、等待牌與進牌查詢。
+所有連線共用同一個已暖機的計算器（快取與拆解表只有一份）：各連線的請求先排進佇列，
+由引擎執行緒一次取出一批處理，同一批中完全相同的查詢只計算一次。
+
+協定：每個訊息是 4 位元組的長度（big-endian）加上 UTF-8 JSON。
+    請求: {"id": 1, "op": "shanten", "hand": ["1m", ...], "melds": [[...]], ...}
+    回應: {"id": 1, "result": ..., "latency_us": 85, "batch": 3}，失敗時為 {"id": 1, "error": "..."}
+    op: shanten（hand, melds）、suggest（hand, visible, melds, lookahead_ms, deadline_ms, full）、
+        waits（16張 hand）、improving（16張 hand, visible）、stats、ping
+
+用法: python shanten_server.py [--port 8765] [--unix /tmp/shanten.sock] [--cache-size 200000]
+                              [--max-batch 64] [--batch-window-ms 0]
+"""
+
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+from calculate_shanten import ShantenCalculator
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 長度前綴與單一訊息的上限（避免錯誤的長度讓伺服器配置大量記憶體）
+_HEADER = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 1 << 20
+# stats 回報的延遲統計只看最近這麼多個請求
+_LATENCY_WINDOW = 4096
+
+# ------------------------------------------------------------
+# 訊息格式
+# ------------------------------------------------------------
+def send_message(sock: socket.socket, message: dict) -> None:
+    """送出一個長度前綴的 JSON 訊息"""
+    payload = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("連線在訊息中途關閉")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def recv_message(sock: socket.socket):
+    """讀取一個長度前綴的 JSON 訊息；對方正常關閉連線時返回 None"""
+    header = sock.recv(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        header += _recv_exact(sock, _HEADER.size - len(header))
+    size, = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"訊息長度 {size} 超過上限 {MAX_MESSAGE_BYTES}")
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+# ------------------------------------------------------------
+# 查詢
+# ------------------------------------------------------------
+def _no_melds(request: dict) -> None:
+    if request.get('melds'):
+        raise ValueError(f"{request['op']} 只支援沒有副露的16張手牌，有副露時請用 suggest")
+
+def _visible(request: dict):
+    """檢查 visible 欄位：34個 0~4 的整數（在送進引擎之前擋下浮點數、布林值等）"""
+    visible = request.get('visible')
+    if visible is None:
+        return None
+    if not isinstance(visible, list) or len(visible) != 34:
+        raise ValueError("visible 必須是34個整數的陣列")
+    if not all(type(count) is int and 0 <= count <= 4 for count in visible):
+        raise ValueError("visible 的每一格必須是 0~4 的整數")
+    return visible
+
+def _op_shanten(calculator: ShantenCalculator, request: dict):
+    return calculator.calculate_shanten(request['hand'], request.get('melds'))
+
+def _op_suggest(calculator: ShantenCalculator, request: dict):
+    result = calculator.suggest_discard(request['hand'], _visible(request),
+                                        lookahead_ms=request.get('lookahead_ms'),
+                                        deadline_ms=request.get('deadline_ms'), melds=request.get('melds'))
+    # 預設只回傳精簡欄位，full 為 True 時回傳完整結果（含所有選項）
+    return result.to_dict() if request.get('full') else result.to_compact()
+
+def _op_waits(calculator: ShantenCalculator, request: dict):
+    _no_melds(request)
+    count, tiles = calculator._count_waiting_tiles(request['hand'])
+    return {'count': count, 'tiles': tiles}
+
+def _op_improving(calculator: ShantenCalculator, request: dict):
+    _no_melds(request)
+    shanten = calculator.calculate_shanten(request['hand'])
+    count, tiles = calculator._count_improving_tiles(request['hand'], shanten, _visible(request))
+    return {'shanten': shanten, 'count': count, 'tiles': tiles}
+
+# op -> 以計算器處理一個請求的函式
+OPERATIONS = {
+    'shanten': _op_shanten,
+    'suggest': _op_suggest,
+    'waits': _op_waits,
+    'improving': _op_improving,
+}
+
+def _request_key(request: dict) -> str:
+    """同一批中用來合併相同查詢的鍵（不含 id）"""
+    return json.dumps({k: v for k, v in request.items() if k != 'id'}, sort_keys=True)
+
+# ------------------------------------------------------------
+# 伺服器
+# ------------------------------------------------------------
+class _Connection(socketserver.BaseRequestHandler):
+    """一條連線：讀取請求交給引擎，回應由引擎執行緒寫回（可以連續送出多個請求不必等待）"""
+
+    def handle(self):
+        engine = self.server.engine
+        lock = threading.Lock()
+
+        def reply(message: dict) -> None:
+            with lock:
+                try:
+                    send_message(self.request, message)
+                except OSError:
+                    pass  # 用戶端已經離開
+
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (OSError, ValueError) as e:
+                reply({'id': None, 'error': f"無法讀取請求: {e}"})
+                return
+            if request is None:
+                return
+            engine.submit(request, reply)
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+class ShantenServer:
+    """共用一個計算器的查詢伺服器
+
+    連線執行緒只負責讀寫訊息，計算全部由一個引擎執行緒進行：
+    取出第一個請求後，連同佇列中已有的（以及 batch_window_ms 內到達的）請求一起處理（最多 max_batch 個），
+    同一批中相同的查詢只計算一次。每個回應附上從收到請求到送出回應的延遲（latency_us）與批次大小。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path=None,
+                 algorithm: str = "table", cache_size: int = 200000, max_batch: int = 64,
+                 batch_window_ms: float = 0.0):
+        """
+        Args:
+            host, port: TCP 位址（port 為 0 時由系統指定，見 address）
+            unix_path: 指定時改用 Unix domain socket
+            algorithm, cache_size: 共用計算器的設定，同 ShantenCalculator
+            max_batch: 一批最多處理的請求數
+            batch_window_ms: 收到第一個請求後，等待更多請求加入同一批的時間；
+                0 表示只合併已經在佇列中的請求（引擎忙碌時累積的請求），不增加延遲
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch 必須大於 0")
+        self.calculator = ShantenCalculator(algorithm, cache_size)
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+        self.requests = 0
+        self.batches = 0
+        self.coalesced = 0
+        if unix_path is not None:
+            if _UnixServer is None:
+                raise ValueError("這個平台不支援 Unix domain socket，請改用 TCP")
+            self._server = _UnixServer(unix_path, _Connection)
+        else:
+            self._server = _TCPServer((host, port), _Connection)
+        self._server.engine = self
+        self._engine = threading.Thread(target=self._engine_loop, name="shanten-engine", daemon=True)
+
+    @property
+    def address(self):
+        """實際監聽的位址（TCP 為 (host, port)，Unix socket 為路徑）"""
+        return self._server.server_address
+
+    def warm_up(self) -> None:
+        """先跑幾個查詢，讓拆解表與等待表在第一個用戶端連線前就建好"""
+        hand = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m", "1p", "2p", "3p", "4p", "5p", "6p", "7p", "east"]
+        self.calculator.suggest_discard(hand).to_dict()
+        self.calculator._count_waiting_tiles(hand[:16])
+
+    def serve_forever(self) -> None:
+        self._engine.start()
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """在背景執行緒中啟動（測試或嵌入其他程式時使用）"""
+        self._engine.start()
+        threading.Thread(target=self._server.serve_forever, name="shanten-server", daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._queue.put(None)
+
+    def submit(self, request: dict, reply) -> None:
+        """由連線執行緒呼叫：把請求排進佇列"""
+        self._queue.put((request, reply, time.perf_counter()))
+
+    def _engine_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list) -> None:
+        self.batches += 1
+        answers = {}
+        for request, reply, received in batch:
+            self.requests += 1
+            response = {'id': request.get('id') if isinstance(request, dict) else None}
+            try:
+                if not isinstance(request, dict):
+                    raise ValueError("請求必須是 JSON 物件")
+                op = request.get('op')
+                if op == 'ping':
+                    response['result'] = 'pong'
+                elif op == 'stats':
+                    response['result'] = self.stats()
+                elif op in OPERATIONS:
+                    key = _request_key(request)
+                    if key in answers:
+                        self.coalesced += 1
+                    else:
+                        answers[key] = OPERATIONS[op](self.calculator, request)
+                    response['result'] = answers[key]
+                else:
+                    raise ValueError(f"未知的 op: {op}，可用: {', '.join(['ping', 'stats', *OPERATIONS])}")
+            except KeyError as e:
+                response['error'] = f"缺少欄位: {e.args[0]}"
+            except ValueError as e:
+                response['error'] = str(e)
+            except Exception as e:
+                # 所有連線共用同一個引擎執行緒，任何請求的錯誤都只能回報給該請求，不能讓執行緒結束
+                response['error'] = f"無法處理請求（{type(e).__name__}）: {e}"
+            latency = time.perf_counter() - received
+            self._latencies.append(latency)
+            response['latency_us'] = round(latency * 1e6)
+            response['batch'] = len(batch)
+            reply(response)
+
+    def stats(self) -> dict:
+        """伺服器統計：請求數、批次數、合併的重複查詢數、最近的延遲分布與快取狀態"""
+        latencies = sorted(self._latencies)
+        count = len(latencies)
+        summary = {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'coalesced': self.coalesced,
+            'cache': self.calculator.cache_info(),
+        }
+        if count:
+            summary['latency_us'] = {
+                'p50': round(latencies[count // 2] * 1e6),
+                'p99': round(latencies[min(count - 1, int(count * 0.99))] * 1e6),
+                'max': round(latencies[-1] * 1e6),
+            }
+        return summary
+
+# ------------------------------------------------------------
+# 用戶端
+# ------------------------------------------------------------
+class ShantenClient:
+    """查詢伺服器的用戶端（同一個物件可以在多個執行緒中使用，請求會依序送出）
+
+    Examples:
+        >>> with ShantenClient() as client:  # doctest: +SKIP
+        ...     client.calculate_shanten(["1m", "2m", "3m", ...])
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path=None, timeout: float = 5.0):
+        if unix_path is not None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(unix_path)
+        else:
+            self._sock = socket.create_connection((host, port), timeout=timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # 最近一次回應的延遲（微秒）與批次大小
+        self.last_latency_us = None
+        self.last_batch = None
+
+    def request(self, op: str, **fields):
+        """送出一個請求並等待回應，返回 'result'；伺服器回報錯誤時拋出 ValueError"""
+        with self._lock:
+            self._next_id += 1
+            send_message(self._sock, {'id': self._next_id, 'op': op, **fields})
+            response = recv_message(self._sock)
+        if response is None:
+            raise ConnectionError("伺服器已關閉連線")
+        self.last_latency_us = response.get('latency_us')
+        self.last_batch = response.get('batch')
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def calculate_shanten(self, hand: list, melds=None) -> int:
+        return self.request('shanten', hand=hand, melds=melds)
+
+    def suggest_discard(self, hand_17: list, visible=None, lookahead_ms=None, deadline_ms=None,
+                        melds=None, full: bool = False) -> dict:
+        return self.request('suggest', hand=hand_17, visible=visible, lookahead_ms=lookahead_ms,
+                            deadline_ms=deadline_ms, melds=melds, full=full)
+
+    def waiting_tiles(self, hand_16: list) -> tuple:
+        """聽牌時的等待牌，返回 (種類數, 牌列表)"""
+        result = self.request('waits', hand=hand_16)
+        return result['count'], result['tiles']
+
+    def improving_tiles(self, hand_16: list, visible=None) -> tuple:
+        """進牌，返回 (剩餘張數, 牌列表)"""
+        result = self.request('improving', hand=hand_16, visible=visible)
+        return result['count'], result['tiles']
+
+    def stats(self) -> dict:
+        return self.request('stats')
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="進聽數查詢伺服器")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="TCP 監聽位址（預設只接受本機連線）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP 埠號")
+    parser.add_argument("--unix", help="改用這個路徑的 Unix domain socket")
+    parser.add_argument("--algorithm", choices=ShantenCalculator.ALGORITHMS, default="table", help="進聽數算法")
+    parser.add_argument("--cache-size", type=int, default=200000, help="共用的進聽數快取上限")
+    parser.add_argument("--max-batch", type=int, default=64, help="一批最多處理的請求數")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="收集同一批請求的等待時間（毫秒），0 表示只合併已在佇列中的請求")
+    args = parser.parse_args()
+
+    server = ShantenServer(args.host, args.port, args.unix, args.algorithm, args.cache_size,
+                           args.max_batch, args.batch_window_ms)
+    start = time.perf_counter()
+    server.warm_up()
+    print(f"暖機完成（{(time.perf_counter() - start) * 1000:.0f} 毫秒），監聽 {server.address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = server.stats()
+        print(f"\n共處理 {stats['requests']} 個請求、{stats['batches']} 批（平均每批 {stats['mean_batch']}），"
+              f"合併重複查詢 {stats['coalesced']} 個", file=sys.stderr)
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+批次打牌建議
+從檔案（或標準輸入）逐行讀取17張手牌，以多個行程計算打牌建議，依輸入順序輸出 JSON Lines
+
+每行一手牌，可以是 JSON 陣列（["1m", "2m", ...]）或以空白/逗號分隔的牌（1m 2m ... east）。
+解析在工作行程內進行，格式錯誤的行只會在該行輸出 {"error": ...}，不會中斷整個批次。
+
+用法: python suggest_discard_batch.py hands.txt [--workers 4] [--chunksize 64] [--output result.jsonl]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from calculate_shanten import ShantenCalculator, stream_chunks
+
+def parse_line(line: str) -> list:
+    """解析一行手牌"""
+    line = line.strip()
+    if line.startswith('['):
+        return json.loads(line)
+    return line.replace(',', ' ').split()
+
+def read_lines(stream):
+    """逐行產生手牌文字，略過空行與 # 開頭的註解（不會一次讀入整個檔案）"""
+    for line in stream:
+        if line.strip() and not line.lstrip().startswith('#'):
+            yield line
+
+def _suggest_lines(lines: list, calculator: ShantenCalculator) -> list:
+    """在工作行程內解析並計算一批文字行；任何一行失敗時以 'error' 欄位回報，不中斷整批"""
+    results = []
+    for line in lines:
+        try:
+            hand = parse_line(line)
+        except Exception as e:
+            results.append({'error': f"無法解析手牌: {e}"})
+            continue
+        try:
+            results.append(calculator.suggest_discard(hand).to_compact())
+        except Exception as e:
+            results.append({'error': str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"})
+    return results
+
+def suggest_lines(lines, workers: int = None, chunksize: int = 64, algorithm: str = "table", cache_size: int = 0):
+    """以多個行程計算每一行手牌的打牌建議，依輸入順序逐筆產生結果（參數同 suggest_discard_many）"""
+    return stream_chunks(_suggest_lines, lines, workers=workers, chunksize=chunksize,
+                          algorithm=algorithm, cache_size=cache_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="以多個行程批次計算17張手牌的打牌建議")
+    parser.add_argument("input", nargs="?", default="-", help="手牌檔案，省略或 - 表示標準輸入")
+    parser.add_argument("--output", "-o", default="-", help="輸出檔案，省略或 - 表示標準輸出")
+    parser.add_argument("--workers", type=int, default=None, help="工作行程數（預設為 CPU 核心數）")
+    parser.add_argument("--chunksize", type=int, default=64, help="每批送給工作行程的手牌數")
+    parser.add_argument("--algorithm", choices=ShantenCalculator.ALGORITHMS, default="table", help="進聽數算法")
+    parser.add_argument("--cache-size", type=int, default=0, help="每個工作行程的進聽數快取上限")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    start = time.perf_counter()
+    count = 0
+    errors = 0
+    try:
+        results = suggest_lines(read_lines(source), workers=args.workers, chunksize=args.chunksize,
+                                algorithm=args.algorithm, cache_size=args.cache_size)
+        for result in results:
+            target.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+            errors += 'error' in result
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"完成 {count} 手（錯誤 {errors} 手），耗時 {elapsed:.2f} 秒，每秒 {rate:.0f} 手", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
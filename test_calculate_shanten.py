@@ -1,4 +1,13 @@
-from calculate_shanten import ShantenCalculator, calculate_max_melds, find_tatsu, count_tatsu, find_max_tatsu, calculate_shanten
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import calculate_shanten as calculate_shanten_module
+import fuzz_shanten
+from calculate_shanten import build_tables, load_tables, verify_tables
+from calculate_shanten import ShantenCalculator, HandState, TILE_LABELS, calculate_max_melds, find_tatsu, count_tatsu, find_max_tatsu, calculate_shanten, calculate_shanten_batch, is_complete_hand, is_valid_meld, suggest_discard
 
 def assert_equal(actual, expected, message=""):
     """簡單的斷言函數"""
@@ -383,6 +392,396 @@ def test_calculate_shanten_four_triplets_two_pairs():
     shanten_func = calculate_shanten(hand)
     assert_equal(shanten_func, 0, "便捷函式應該返回相同結果")
 
+def test_calculate_shanten_non_greedy_decomposition():
+    """測試需要非貪婪拆法才能看出的聽牌"""
+    print("\n=== 測試需要非貪婪拆法才能看出的聽牌 ===")
+    # 手牌：1m,2m,2m,2m,3m,3m,3m,4m,4m,5m,6m,6m,7m,7m,8m,6s
+    # 分析：
+    # - 萬子可拆成 123, 234, 234, 567, 678 五個面子
+    # - 剩下 6s 單騎，聽 6s
+    # 先取刻子的貪婪拆法會拆出 222, 333，只剩下較差的組合
+    hand = ["1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m", "4m", "5m", "6m", "6m", "7m", "7m", "8m",
+            "6s"]
+    
+    calculator = ShantenCalculator()
+    shanten = calculator.calculate_shanten(hand)
+    assert_equal(shanten, 0, "這手牌應該是聽牌（0進聽），單騎 6s")
+    
+    wait_count, wait_tiles = calculator._count_waiting_tiles(hand)
+    assert_equal(wait_tiles, ["6s"], "等待牌應該只有 6s")
+
+def test_calculate_shanten_algorithms():
+    """測試三種進聽數算法的切換"""
+    print("\n=== 測試進聽數算法切換 ===")
+    hand = ["1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m", "4m", "5m", "6m", "6m", "7m", "7m", "8m",
+            "6s"]
+    
+    table = ShantenCalculator()
+    search = ShantenCalculator("search")
+    greedy = ShantenCalculator("greedy")
+    
+    assert_equal(table.algorithm, "table", "預設應該使用拆解表")
+    assert_equal(search.calculate_shanten(hand), 0, "分支定界搜尋應該和拆解表一樣找到聽牌")
+    assert_equal(greedy.calculate_shanten(hand), 1, "舊版貪婪算法會高估為一進聽")
+    assert_equal(search.calculate_max_melds(hand), 5, "精確算法應該找到5個面子")
+    
+    try:
+        ShantenCalculator("unknown")
+        assert_equal(False, True, "未知的算法應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "未知的算法應該拋出 ValueError")
+
+def test_hand_state_incremental():
+    """測試增量更新的手牌狀態"""
+    print("\n=== 測試增量更新的手牌狀態 ===")
+    hand = ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m",
+            "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"]
+    
+    state = HandState(hand)
+    assert_equal(state.shanten, 1, "初始手牌應該是一進聽")
+    assert_equal(len(state), 16, "初始手牌應該有16張")
+    
+    # 摸進 6m 後可以打掉 7m 聽牌
+    assert_equal(state.add("6m"), 0, "摸進 6m 後的17張牌進聽數應該為0")
+    assert_equal(state.remove("7m"), calculate_shanten(state.tiles()), "增量結果應該和完整重算相同")
+    assert_equal(state.shanten, 0, "打掉 7m 後應該聽牌")
+    
+    # 摸到和牌
+    state.add("6p")
+    assert_equal(state.shanten, -1, "摸進 6p 後應該和牌（進聽數 -1）")
+    
+    try:
+        state.remove("east")
+        assert_equal(False, True, "移除不存在的牌應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "移除不存在的牌應該拋出 ValueError")
+
+def test_shanten_cache():
+    """測試進聽數快取的命中與淘汰"""
+    print("\n=== 測試進聽數快取 ===")
+    hand = ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m",
+            "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"]
+    other = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m",
+             "9m", "1p", "2p", "3p", "4p", "5p", "6p", "east"]
+    
+    calculator = ShantenCalculator(cache_size=1)
+    assert_equal(calculator.calculate_shanten(hand), 1, "快取未命中時結果應該正確")
+    assert_equal(calculator.calculate_shanten(hand), 1, "快取命中時結果應該相同")
+    info = calculator.cache_info()
+    assert_equal((info['hits'], info['misses']), (1, 1), "第二次查詢應該命中快取")
+    
+    calculator.calculate_shanten(other)
+    info = calculator.cache_info()
+    assert_equal((info['size'], info['evictions']), (1, 1), "超過上限時應該淘汰最舊的一筆")
+    
+    calculator.clear_cache()
+    assert_equal(calculator.cache_info()['size'], 0, "清空後快取應該沒有資料")
+    assert_equal(ShantenCalculator().cache_info()['max_size'], 0, "預設不啟用快取")
+    
+    try:
+        ShantenCalculator(cache_size=-1)
+        assert_equal(False, True, "負數快取大小應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "負數快取大小應該拋出 ValueError")
+
+def test_calculate_shanten_batch():
+    """測試 NumPy 批次計算進聽數"""
+    print("\n=== 測試批次計算進聽數 ===")
+    hands = [
+        ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m", "1p", "2p", "3p", "4p", "5p", "6p", "7p"],
+        ["1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m", "4m", "5m", "6m", "6m", "7m", "7m", "8m", "6s"],
+        ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m", "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"],
+        ["1m", "9m", "1p", "9p", "1s", "9s", "east", "south", "west", "north", "middle", "fa", "white", "2m", "5p", "8s"],
+    ]
+    counts = np.zeros((len(hands), 34), dtype=np.uint8)
+    for row, hand in enumerate(hands):
+        for tile in hand:
+            counts[row, TILE_LABELS.index(tile)] += 1
+    
+    expected = [calculate_shanten(hand) for hand in hands]
+    assert_equal(calculate_shanten_batch(counts).tolist(), expected, "批次結果應該和逐手計算相同")
+    
+    # 17張牌已和牌時進聽數為 -1
+    complete = counts[:1].copy()
+    complete[0, TILE_LABELS.index("7p")] += 1
+    assert_equal(calculate_shanten_batch(complete).tolist(), [-1], "17張和牌的進聽數應該為 -1")
+    
+    try:
+        calculate_shanten_batch(np.zeros((2, 27), dtype=np.uint8))
+        assert_equal(False, True, "形狀錯誤應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "形狀錯誤應該拋出 ValueError")
+
+def test_improving_tiles_remaining_copies():
+    """測試進牌張數以剩餘張數計算"""
+    print("\n=== 測試進牌剩餘張數 ===")
+    calculator = ShantenCalculator()
+    hand = ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m",
+            "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"]
+    
+    count, tiles = calculator._count_improving_tiles(hand, 1)
+    assert_equal(tiles, ["1p", "2m", "2p", "3m", "3p", "4p", "5m", "5p", "6m", "6p", "7m"], "進牌種類應該正確")
+    assert_equal(count, 32, "進牌張數應該是每種4張扣掉手牌中的張數")
+    
+    # 6m 四張都已經被看到，不能再算進牌
+    visible = [0] * 34
+    visible[TILE_LABELS.index("6m")] = 4
+    count, tiles = calculator._count_improving_tiles(hand, 1, visible)
+    assert_equal("6m" in tiles, False, "全部被看到的牌不應該是進牌")
+    assert_equal(count, 28, "扣掉已看到的牌後進牌張數應該減少")
+    
+    try:
+        calculator._count_improving_tiles(hand, 1, [0] * 33)
+        assert_equal(False, True, "已看到牌數格數錯誤應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "已看到牌數格數錯誤應該拋出 ValueError")
+
+def test_waiting_tiles_table():
+    """測試以等待表計算聽牌的等待牌"""
+    print("\n=== 測試等待表 ===")
+    calculator = ShantenCalculator()
+    
+    # 九蓮寶燈形：一到九萬都能和牌
+    hand = ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "6m",
+            "7m", "8m", "9m", "9m", "9m", "east", "east", "east"]
+    wait_count, wait_tiles = calculator._count_waiting_tiles(hand)
+    assert_equal(wait_tiles, [f"{i}m" for i in range(1, 10)], "九蓮寶燈形應該聽一到九萬")
+    
+    # 2s 手中已有4張，不能算等待牌
+    hand = ["6p", "7p", "8p", "1s", "1s", "2s", "2s", "2s",
+            "2s", "3s", "3s", "4s", "4s", "5s", "5s", "5s"]
+    wait_count, wait_tiles = calculator._count_waiting_tiles(hand)
+    assert_equal(wait_tiles, ["1s", "4s", "5s"], "手中已有4張的牌不應該是等待牌")
+    
+    # 未聽牌時沒有等待牌
+    hand = ["1m", "9m", "1p", "9p", "1s", "9s", "east", "south",
+            "west", "north", "middle", "fa", "white", "2m", "5p", "8s"]
+    assert_equal(calculator._count_waiting_tiles(hand), (0, []), "未聽牌時應該沒有等待牌")
+    assert_equal(calculator.waiting_tiles(hand), [], "公開的 waiting_tiles 未聽牌時應該回傳空列表")
+    try:
+        calculator.waiting_tiles(hand[:15])
+        assert_equal(False, True, "waiting_tiles 應該拒絕非16張的手牌")
+    except ValueError:
+        assert_equal(True, True, "waiting_tiles 拒絕非16張的手牌")
+
+def test_is_complete_hand():
+    """測試查表判斷和牌"""
+    print("\n=== 測試和牌判斷 ===")
+    complete = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m",
+                "1p", "2p", "3p", "east", "east", "east", "white", "white"]
+    assert_equal(is_complete_hand(complete), True, "五個面子加一對將應該和牌")
+    
+    # 將在順子中間：2m 2m 2m 3m 3m 3m 4m 4m 4m 可拆成三個順子或三個刻子
+    complete = ["1m", "1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m",
+                "4m", "4m", "5p", "6p", "7p", "south", "south", "south"]
+    assert_equal(is_complete_hand(complete), True, "需要把對子放在順子之間的和牌也要能判斷")
+    
+    not_complete = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m",
+                    "1p", "2p", "3p", "east", "east", "white", "white", "fa"]
+    assert_equal(is_complete_hand(not_complete), False, "兩對將加單張不應該和牌")
+    
+    try:
+        is_complete_hand(complete[:16])
+        assert_equal(False, True, "張數錯誤應該拋出 ValueError")
+    except ValueError:
+        assert_equal(True, True, "張數錯誤應該拋出 ValueError")
+
+def test_exposed_melds():
+    """測試有副露時的進聽數、和牌判斷與打牌建議"""
+    print("\n=== 測試副露 ===")
+    # 副露兩組後手牌剩10張：1m2m3m 7s8s9s 為面子，5p5p 與東東對倒聽牌
+    hand = ["1m", "2m", "3m", "5p", "5p", "7s", "8s", "9s", "east", "east"]
+    melds = [["4m", "5m", "6m"], ["white", "white", "white"]]
+    for algorithm in ("table", "search"):
+        calculator = ShantenCalculator(algorithm)
+        assert_equal(calculator.calculate_shanten(hand, melds), 0, f"{algorithm}: 副露兩組的對倒應該聽牌")
+    
+    # 槓也只算一組副露
+    assert_equal(calculate_shanten(["1m", "2m", "3m", "4p", "5p", "6p", "7s", "8s", "9s",
+                                    "east", "east", "5m", "6m"], [["north"] * 4]), 0,
+                 "槓後13張手牌的兩面聽應該聽牌")
+    
+    # 副露五組時只剩一張單騎，摸到同一張即和牌
+    melds = [["1p", "2p", "3p"]] * 2 + [["east"] * 3, ["south"] * 3, ["west"] * 3]
+    assert_equal(calculate_shanten(["9s"], melds), 0, "副露五組的單騎應該聽牌")
+    assert_equal(is_complete_hand(["9s", "9s"], melds), True, "副露五組加一對將應該和牌")
+    assert_equal(is_complete_hand(["9s", "8s"], melds), False, "副露五組加兩張單張不應該和牌")
+    
+    # 副露的牌算已看到：3m5m 的嵌張等 4m，但 4m 已經副露3張，只剩1張能進
+    hand_14 = ["3m", "5m", "9m", "1p", "2p", "3p", "4p", "5p", "6p", "7s", "8s", "9s", "south", "west"]
+    melds = [["4m", "4m", "4m"]]
+    result = suggest_discard(hand_14, melds=melds)
+    hand_13 = list(hand_14)
+    hand_13.remove(result['tile'])
+    assert_equal(result['shanten_after'], calculate_shanten(hand_13, melds), "建議的進聽數應該與打掉後的手牌一致")
+    best = result['best_options'][0]
+    copies = sum(4 - hand_13.count(tile) - (3 if tile == "4m" else 0) - (tile == result['tile'])
+                 for tile in best['improving_tiles'])
+    assert_equal("4m" in best['improving_tiles'], True, "4m 應該是進牌")
+    assert_equal(best['improving_count'], copies, "進牌張數應該扣掉副露的牌")
+    
+    for hand, melds, message in ((["1m"] * 13, [["1m", "2m", "4m"]], "不成面子的副露應該拋出 ValueError"),
+                                 (["1m"] * 13, None, "張數與副露組數不符應該拋出 ValueError"),
+                                 (["1m"] * 14, [["8m", "9m", "1p"]], "跨花色的吃應該拋出 ValueError")):
+        try:
+            calculate_shanten(hand, melds)
+            assert_equal(False, True, message)
+        except ValueError:
+            assert_equal(True, True, message)
+    
+    # 影像辨識分組副露前先檢查是否為吃、碰或槓
+    assert_equal([is_valid_meld(meld) for meld in (["3p", "4p", "5p"], ["5p", "3p", "4p"], ["east"] * 3, ["9s"] * 4)],
+                 [True] * 4, "吃、碰、槓都是有效的副露")
+    assert_equal([is_valid_meld(meld) for meld in (["8m", "9m", "1p"], ["east", "south", "west"], ["1m", "1m"],
+                                                   ["1m", "2m", "4m"], ["1m", "xx", "1m"])],
+                 [False] * 5, "跨花色、字牌順子、張數不對或無法解析都不是有效的副露")
+
+def test_fuzz_against_oracle():
+    """以窮舉參考實作比對少量隨機手牌（完整的模糊測試見 fuzz_shanten.py）"""
+    print("\n=== 測試與窮舉參考實作一致 ===")
+    hand = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m", "1p", "2p", "3p", "east", "east", "east", "white"]
+    assert_equal(fuzz_shanten.oracle_shanten(fuzz_shanten.to_counts(hand)), 0, "參考實作：單騎應該聽牌")
+    assert_equal(fuzz_shanten.oracle_waits(fuzz_shanten.to_counts(hand)), {"white"}, "參考實作：單騎等 white")
+    
+    failures = fuzz_shanten.run_fuzz(40, workers=1, seed=2024)
+    for failure in failures:
+        print(f"   [{failure['check']}] {failure['hand']} 副露 {failure['melds']}: {failure['message']}")
+    assert_equal(len(failures), 0, "40手隨機手牌的各項結果都應該與參考實作一致")
+    
+    if os.path.exists(fuzz_shanten.DEFAULT_REGRESSION_PATH):
+        assert_equal(fuzz_shanten.replay(fuzz_shanten.DEFAULT_REGRESSION_PATH), [], "回歸案例應該全部通過")
+
+def test_instrumentation():
+    """測試量測的呼叫次數、階段耗時與清除"""
+    print("\n=== 測試引擎量測 ===")
+    assert_equal(ShantenCalculator().stats_snapshot(),
+                 {'enabled': False, 'calls': {}, 'phases': {}}, "未開啟量測時應該沒有資料")
+    
+    calculator = ShantenCalculator(instrument=True)
+    hand_17 = ["1m", "1m", "2m", "3m", "5m", "6m", "7m", "9m", "1p", "2p", "4p", "5p", "7p", "8s", "9s", "east", "white"]
+    calculator.calculate_shanten(hand_17[:16])
+    calculator.is_complete_hand(hand_17)
+    result = calculator.suggest_discard(hand_17)
+    stats = calculator.stats_snapshot()
+    assert_equal(stats['calls'].get('count_improving_tiles'), None, "尚未讀取進牌時不應該計算")
+    # 直接呼叫1次，加上 suggest_discard 對每種牌各試打一次（經由 HandState 增量計算）
+    assert_equal(stats['calls']['calculate_shanten'], 1 + len(set(hand_17)), "試打的進聽數計算也要計入")
+    result.reason
+    stats = calculator.stats_snapshot()
+    assert_equal(stats['calls']['calculate_shanten'] > 1 + len(set(hand_17)), True, "計算進牌時的進聽數計算也要計入")
+    assert_equal(stats['calls']['can_form_complete_hand'], 1, "is_complete_hand 呼叫1次")
+    assert_equal(stats['calls']['suggest_discard'], 1, "suggest_discard 呼叫1次")
+    assert_equal(stats['calls']['count_improving_tiles'], stats['phases']['enrichment']['calls'],
+                 "每個最佳選項計算一次進牌")
+    assert_equal(set(stats['phases']), {'shanten', 'enrichment', 'reason'}, "沒有兩巡評估時的階段")
+    assert_equal(stats['phases']['shanten']['total_ms'] >= 0, True, "耗時不應該是負數")
+    
+    calculator.reset_stats()
+    assert_equal(calculator.stats_snapshot(), {'enabled': True, 'calls': {}, 'phases': {}}, "清除後應該沒有資料")
+    calculator.enable_instrumentation(False)
+    calculator.calculate_shanten(hand_17[:16])
+    assert_equal(calculator.stats_snapshot()['enabled'], False, "關閉後不再記錄")
+
+def test_hand_key():
+    """測試位元打包的手牌鍵：加減一張牌、分組取出與張數檢查"""
+    print("\n=== 測試手牌鍵 ===")
+    module = calculate_shanten_module
+    hand = ["1m", "1m", "9m", "5p", "5p", "5p", "5p", "7s", "east", "white"]
+    key = module._hand_key(hand)
+    counts = ShantenCalculator()._hand_to_counts(hand)
+    assert_equal(key, module._counts_key(counts), "由牌字符串與由計數陣列打包的鍵應該相同")
+    assert_equal(module._key_to_counts(key), counts, "鍵應該可以還原成計數陣列")
+    assert_equal(module._key_tiles(key), len(hand), "鍵中的總張數")
+    assert_equal(key + module._TILE_BITS[TILE_LABELS.index("2m")], module._hand_key(hand + ["2m"]), "摸牌等於加上該牌的位元")
+    assert_equal(key - module._TILE_BITS[TILE_LABELS.index("9m")], module._hand_key(hand[:2] + hand[3:]), "打牌等於減去該牌的位元")
+    man, pin, sou, honor = module._group_keys(key)
+    assert_equal((man, pin, sou, honor), tuple(module._counts_key(counts[base:base + width])
+                                               for base, width in ((0, 9), (9, 9), (18, 9), (27, 7))),
+                 "組鍵應該等於各組計數打包的鍵")
+    
+    state = HandState(hand)
+    state.add("3m")
+    state.remove("5p")
+    assert_equal(state.key, module._counts_key(state.counts), "HandState 增量更新的鍵應該與計數一致")
+    
+    for bad_hand in (["1m"] * 5, ["2p"] * 8 + ["3p"], ["east"] * 9):
+        try:
+            module._hand_key(bad_hand)
+            assert_equal(False, True, f"{bad_hand[0]} 超過4張應該拋出 ValueError")
+        except ValueError:
+            assert_equal(True, True, f"{bad_hand[0]} 超過4張應該拋出 ValueError")
+
+def test_disk_tables():
+    """測試磁碟查表的建立、檢查與載入"""
+    print("\n=== 測試磁碟查表 ===")
+    hands = [
+        ["1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m", "4m", "5m", "6m", "6m", "7m", "7m", "8m", "6s"],
+        ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m", "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"],
+        ["1m", "9m", "1p", "9p", "1s", "9s", "east", "south", "west", "north", "middle", "fa", "white", "2m", "5p", "8s"],
+    ]
+    expected = [calculate_shanten(hand) for hand in hands]
+    previous = calculate_shanten_module._DISK_TABLES
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tables.bin")
+        build_tables(path)
+        assert_equal(verify_tables(path), None, "剛建立的查表檔案應該通過檢查")
+        
+        try:
+            assert_equal(load_tables(path), True, "應該可以載入查表檔案")
+            # 清空記憶體中的表，確保結果是從磁碟表讀出的
+            for table in (calculate_shanten_module._SUIT_TABLE, calculate_shanten_module._HONOR_TABLE,
+                          calculate_shanten_module._SUIT_WAIT_TABLE, calculate_shanten_module._HONOR_WAIT_TABLE):
+                table.clear()
+            assert_equal([calculate_shanten(hand) for hand in hands], expected, "使用磁碟查表的結果應該相同")
+            wait_count, wait_tiles = ShantenCalculator()._count_waiting_tiles(hands[0])
+            assert_equal(wait_tiles, ["6s"], "使用磁碟查表的等待牌應該相同")
+        finally:
+            calculate_shanten_module._DISK_TABLES = previous
+        
+        # 修改版本號後應該被視為過期
+        with open(path, "r+b") as f:
+            f.seek(4)
+            f.write(b"\xff")
+        assert_equal(verify_tables(path) is not None, True, "版本不符的檔案應該無法通過檢查")
+        
+        # 過期或內容損毀的檔案預設改回動態建表（不寫入檔案），指定 rebuild 時重新建立
+        try:
+            assert_equal(load_tables(path), False, "版本不符的檔案預設不應該載入")
+            assert_equal(calculate_shanten_module._DISK_TABLES, None, "無法載入時改回動態建表")
+            assert_equal(verify_tables(path) is not None, True, "預設不應該重新建立檔案")
+            assert_equal(load_tables(path, rebuild=True), True, "版本不符的檔案應該重新建立後載入")
+            assert_equal(verify_tables(path), None, "重新建立的查表檔案應該通過檢查")
+            with open(path, "r+b") as f:
+                f.seek(os.path.getsize(path) - 1)
+                last = f.read(1)
+                f.seek(-1, os.SEEK_CUR)
+                f.write(bytes([last[0] ^ 1]))
+            assert_equal(verify_tables(path), "CRC32 檢查碼不符", "內容損毀的檔案應該無法通過 CRC32 檢查")
+            assert_equal(load_tables(path, rebuild=True), True, "內容損毀的檔案應該重新建立後載入")
+            assert_equal(verify_tables(path), None, "重新建立的查表檔案應該通過檢查")
+            assert_equal([calculate_shanten(hand) for hand in hands], expected, "重新建立後的結果應該相同")
+        finally:
+            calculate_shanten_module._DISK_TABLES = previous
+
+def test_shared_engine_threads():
+    """測試便捷函式共用的計算器可以從多個執行緒同時呼叫"""
+    print("\n=== 測試多執行緒呼叫便捷函式 ===")
+    hands = [
+        ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m", "1p", "2p", "3p", "4p", "5p", "6p", "7p"],
+        ["1m", "2m", "2m", "2m", "3m", "3m", "3m", "4m", "4m", "5m", "6m", "6m", "7m", "7m", "8m", "6s"],
+        ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m", "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p"],
+        ["1m", "9m", "1p", "9p", "1s", "9s", "east", "south", "west", "north", "middle", "fa", "white", "2m", "5p", "8s"],
+    ] * 50
+    
+    def evaluate(hand):
+        return calculate_shanten(hand), find_max_tatsu(hand), calculate_max_melds(hand)
+    
+    expected = [evaluate(hand) for hand in hands]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(evaluate, hands))
+    assert_equal(results, expected, "多執行緒的結果應該和單執行緒相同")
+
 def main():
     """執行所有測試"""
     print("=" * 60)
@@ -411,6 +810,20 @@ def main():
         test_calculate_shanten_no_pairs,
         test_calculate_shanten_user_hand,
         test_calculate_shanten_four_triplets_two_pairs,
+        test_calculate_shanten_non_greedy_decomposition,
+        test_calculate_shanten_algorithms,
+        test_hand_state_incremental,
+        test_shanten_cache,
+        test_calculate_shanten_batch,
+        test_improving_tiles_remaining_copies,
+        test_waiting_tiles_table,
+        test_is_complete_hand,
+        test_exposed_melds,
+        test_fuzz_against_oracle,
+        test_instrumentation,
+        test_hand_key,
+        test_disk_tables,
+        test_shared_engine_threads,
     ]
     
     passed = 0
@@ -3,7 +3,15 @@
 測試打牌建議功能
 """
 
-from calculate_shanten import suggest_discard, calculate_shanten
+import json
+import threading
+import time
+
+import calculate_shanten as calculate_shanten_module
+from calculate_shanten import suggest_discard, suggest_discard_many, simulate_discards, calculate_shanten
+from shanten_server import ShantenServer, ShantenClient
+from interactive_test import read_hand_lines, run_batch
+from suggest_discard_batch import read_lines, suggest_lines
 
 def test_suggest_discard_basic():
     """基本測試：測試打牌建議功能"""
@@ -89,7 +97,7 @@ def test_suggest_discard_one_away():
             if len(best_opt['improving_tiles']) <= 10:
                 print(f"  進牌列表: {', '.join(best_opt['improving_tiles'])}")
             else:
-                print(f"  進牌列表: {', '.join(best_opt['improving_tiles'][:10])}... (共{len(best_opt['improving_tiles'])}張)")
+                print(f"  進牌列表: {', '.join(best_opt['improving_tiles'][:10])}... (共{len(best_opt['improving_tiles'])}種)")
     
     # 驗證：應該建議進聽數最小的牌
     min_shanten = min(opt['shanten'] for opt in result['all_options'])
@@ -186,6 +194,306 @@ def test_improving_tiles_comparison():
             improving_count = result['best_options'][0].get('improving_count', 0)
             print(f"\n✓ 測試通過：已計算進牌張數（{improving_count} 張）")
 
+def test_suggest_discard_many():
+    """測試多行程批次打牌建議：結果應依輸入順序，且與逐手計算相同"""
+    print("\n=== 測試批次打牌建議 ===")
+    
+    hands = [
+        ["1m", "1m", "2m", "3m", "4m", "5m", "6m", "7m",
+         "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p", "8m"],
+        ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "7m",
+         "1p", "1p", "2p", "2p", "3p", "3p", "4p", "5p", "east"],
+        ["1m", "2m"],  # 張數錯誤，應回報 error 而不中斷整批
+        ["1m", "9m", "1p", "9p", "1s", "9s", "east", "south", "west",
+         "north", "middle", "fa", "white", "2m", "5p", "8s", "8s"],
+    ]
+    
+    results = list(suggest_discard_many(hands, workers=2, chunksize=1))
+    print(f"批次結果數量: {len(results)}")
+    
+    assert len(results) == len(hands)
+    assert 'error' in results[2]
+    for hand, result in zip(hands, results):
+        if len(hand) != 17:
+            continue
+        expected = suggest_discard(hand)
+        print(f"  {result['tile']:6s} 進聽數 {result['shanten_after']}（逐手計算: {expected['tile']}）")
+        assert result['tile'] == expected['tile']
+        assert result['shanten_after'] == expected['shanten_after']
+        assert result['reason'] == expected['reason']
+    
+    # 單一行程時不建立行程池，結果應相同
+    assert list(suggest_discard_many(hands, workers=1)) == results
+    
+    # 不是字串的牌（TypeError 等非 ValueError 的錯誤）也只影響該手牌
+    mixed = list(suggest_discard_many([hands[0], [1] * 17, hands[1]], workers=2, chunksize=2))
+    assert 'error' in mixed[1] and mixed[0] == results[0] and mixed[2] == results[1]
+    
+    # 批次命令：格式錯誤的 JSON 行只在該行輸出錯誤，前後的手牌照常計算
+    text = [json.dumps(hands[0]) + "\n", "# 註解\n", "[1m, 2m\n", "\n", " ".join(hands[1]) + "\n"]
+    for workers in (1, 2):
+        lines_out = list(suggest_lines(read_lines(text), workers=workers, chunksize=1))
+        assert len(lines_out) == 3
+        assert lines_out[0] == results[0] and lines_out[2] == results[1]
+        assert 'error' in lines_out[1]
+    print(f"格式錯誤的行: {lines_out[1]['error']}")
+    print("✓ 測試通過：批次結果依輸入順序且與逐手計算相同")
+
+def test_suggest_discard_lookahead():
+    """測試兩巡評估：同分選項依 lookahead_score 排序，時間不足時維持原本的建議"""
+    print("\n=== 測試兩巡評估 ===")
+    
+    hand_17 = ["1m", "1m", "2m", "3m", "5m", "6m", "7m", "9m", "1p",
+               "2p", "4p", "5p", "7p", "8s", "9s", "east", "white"]
+    plain = suggest_discard(hand_17)
+    assert 'lookahead_complete' not in plain
+    
+    result = suggest_discard(hand_17, lookahead_ms=2000)
+    scores = [opt['lookahead_score'] for opt in result['best_options']]
+    print(f"建議打掉: {result['tile']}，兩巡分數: {[(opt['tile'], round(opt['lookahead_score'], 2)) for opt in result['best_options']]}")
+    
+    assert result['lookahead_complete']
+    assert all(score is not None for score in scores)
+    assert scores == sorted(scores, reverse=True)
+    assert result['tile'] == result['best_options'][0]['tile']
+    assert {opt['tile'] for opt in result['best_options']} == {opt['tile'] for opt in plain['best_options']}
+    
+    # 所有選項都有 lookahead_score 欄位，不是最佳選項的為 None；不啟用時都沒有這個欄位
+    best_tiles = {opt['tile'] for opt in result['best_options']}
+    for opt in result.to_dict()['all_options']:
+        assert 'lookahead_score' in opt
+        assert (opt['lookahead_score'] is None) == (opt['tile'] not in best_tiles)
+    assert all('lookahead_score' not in opt for opt in plain.to_dict()['all_options'])
+    
+    # 時間用完時不評估，建議與不啟用時相同
+    rushed = suggest_discard(hand_17, lookahead_ms=0)
+    assert not rushed['lookahead_complete']
+    assert rushed['tile'] == plain['tile']
+    print("✓ 測試通過：兩巡評估在時間內完成，並正確排序同分選項")
+
+def test_simulate_discards():
+    """測試蒙地卡羅模擬：結果可重現，不受工作行程數影響"""
+    print("\n=== 測試蒙地卡羅模擬 ===")
+    
+    hand_17 = ["1m", "2m", "3m", "4m", "5m", "6m", "7m", "8m", "9m",
+               "1p", "1p", "2p", "3p", "4p", "5p", "6p", "9m"]
+    result = simulate_discards(hand_17, n_sims=100, turns=4, seed=7)
+    print(f"建議打掉: {result['tile']}，候選: {[(c['tile'], c['sims'], c['win_rate']) for c in result['candidates']]}")
+    
+    shanten_after = suggest_discard(hand_17)['shanten_after']
+    rates = [c['win_rate'] for c in result['candidates']]
+    assert result['tile'] == result['candidates'][0]['tile']
+    assert rates == sorted(rates, reverse=True)
+    for candidate in result['candidates']:
+        assert candidate['shanten'] == shanten_after
+        assert 0.0 <= candidate['win_rate'] <= candidate['tenpai_rate'] <= 1.0
+        low, high = candidate['interval']
+        assert low <= candidate['win_rate'] <= high
+    
+    assert simulate_discards(hand_17, n_sims=100, turns=4, seed=7, workers=2) == result
+    
+    # 預設參數要能在互動使用時於1秒內回答；行程池保留下來，第二次呼叫不必重新啟動行程
+    start = time.perf_counter()
+    simulate_discards(hand_17)
+    elapsed = time.perf_counter() - start
+    print(f"預設參數耗時: {elapsed * 1000:.0f}ms")
+    assert elapsed < 1.0, f"預設參數的模擬應該在1秒內完成，實際 {elapsed:.2f} 秒"
+    simulate_discards(hand_17, n_sims=50, workers=2)
+    pool = calculate_shanten_module._SIM_POOLS[2]
+    simulate_discards(hand_17, n_sims=50, workers=2)
+    assert calculate_shanten_module._SIM_POOLS[2] is pool, "同樣的工作行程數應該重複使用行程池"
+    
+    # 有副露時手牌較少，候選牌與 suggest_discard 一致，副露的牌不會再被摸到
+    melds = [["1m", "2m", "3m"], ["4m", "5m", "6m"]]
+    small = hand_17[6:]
+    with_melds = simulate_discards(small, n_sims=100, turns=4, seed=7, melds=melds)
+    print(f"副露時建議打掉: {with_melds['tile']}")
+    suggestion = suggest_discard(small, melds=melds)
+    for candidate in with_melds['candidates']:
+        assert candidate['shanten'] == suggestion.shanten_after
+    assert with_melds['tile'] in [opt.tile for opt in suggestion.all_options]
+    assert simulate_discards(small, n_sims=100, turns=4, seed=7, melds=melds, workers=2) == with_melds
+    try:
+        simulate_discards(small, n_sims=10)
+        assert False, "副露後的手牌沒有傳入副露時應該拋出 ValueError"
+    except ValueError:
+        pass
+    
+    try:
+        simulate_discards(hand_17, goal="points")
+        assert False, "未知的模擬目標應該拋出 ValueError"
+    except ValueError:
+        pass
+    print("✓ 測試通過：模擬結果可重現，候選牌依成功率排序")
+
+def test_suggest_discard_deadline():
+    """測試時間上限：進聽數一定完整，時間不足時標示未完成的欄位"""
+    print("\n=== 測試時間上限 ===")
+    
+    hand_17 = ["1m", "1m", "2m", "3m", "5m", "6m", "7m", "9m", "1p",
+               "2p", "4p", "5p", "7p", "8s", "9s", "east", "white"]
+    plain = suggest_discard(hand_17)
+    
+    relaxed = suggest_discard(hand_17, deadline_ms=10000).to_dict()
+    assert relaxed.pop('complete') == {'shanten': True, 'details': True}
+    assert relaxed == plain
+    
+    # 來不及計算進牌時，所有選項的進聽數仍然正確，建議仍是進聽數最小的牌
+    rushed = suggest_discard(hand_17, deadline_ms=0)
+    print(f"建議打掉: {rushed['tile']}，{rushed['reason']}")
+    assert rushed['complete'] == {'shanten': True, 'details': False}
+    assert rushed['all_options'] == plain['all_options']
+    assert rushed['shanten_after'] == plain['shanten_after']
+    assert all(opt['improving_count'] is None for opt in rushed['best_options'])
+    assert {opt['tile'] for opt in plain['best_options']} <= {opt['tile'] for opt in rushed['best_options']}
+    print("✓ 測試通過：時間上限內返回目前最好的答案")
+
+def test_suggest_discard_result_object():
+    """測試結果物件：可以像 dict 一樣讀取，等待牌與進牌在需要時才計算"""
+    print("\n=== 測試結果物件 ===")
+    
+    hand_17 = ["3m", "3m", "3m", "4m", "4s", "4s", "4s", "6p", "6p",
+               "6p", "6s", "6s", "7p", "7p", "7p", "east", "east"]
+    result = suggest_discard(hand_17)
+    assert result.shanten_after == result['shanten_after'] == 0
+    assert not result._context.details, "只讀取進聽數時不應該計算等待牌"
+    
+    # 只有 4m 能打成聽牌，不需要比較等待牌就能決定建議
+    assert result.tile == result['tile'] == "4m"
+    assert not result._context.details, "只有一種牌可打時不應該計算等待牌"
+    print(f"建議打掉: {result.tile}，等待: {result.best_options[0].wait_tiles}")
+    assert result.best_options[0]['wait_count'] == len(result.best_options[0]['wait_tiles']) > 0
+    
+    assert 'lookahead_complete' not in result and result.get('complete') is None
+    assert result.all_options[0].get('improving_count', 0) == 0
+    try:
+        result['missing']
+        assert False, "不存在的欄位應該拋出 KeyError"
+    except KeyError:
+        pass
+    
+    # 轉成 dict 後可以直接輸出 JSON，並與結果物件相等
+    plain = result.to_dict()
+    assert isinstance(plain['best_options'][0], dict)
+    assert result == plain and dict(result)['tile'] == "4m"
+    compact = result.to_compact()
+    assert compact['tile'] == "4m" and compact['best_tiles'] == ["4m"] and compact['reason'] == result.reason
+    print(f"JSON: {json.dumps(plain, ensure_ascii=False)[:60]}...")
+    print("✓ 測試通過：結果物件相容 dict 讀取，並延後計算等待牌")
+
+def test_shanten_server():
+    """測試查詢伺服器：多個連線同時查詢，結果與直接呼叫引擎相同"""
+    print("\n=== 測試查詢伺服器 ===")
+    
+    hands = [
+        ["3m", "3m", "3m", "4m", "4s", "4s", "4s", "6p", "6p",
+         "6p", "6s", "6s", "7p", "7p", "7p", "east", "east"],
+        ["1m", "2m", "3m", "5m", "7m", "9m", "2p", "3p", "4p",
+         "6s", "7s", "8s", "east", "east", "south", "white", "fa"],
+        ["1m", "1m", "1m", "2m", "3m", "4m", "5m", "6m", "7m",
+         "8m", "9m", "9m", "9m", "2p", "2p", "5s", "north"],
+    ]
+    server = ShantenServer(port=0)
+    server.start()
+    try:
+        host, port = server.address
+        mismatches = []
+        
+        def query():
+            with ShantenClient(host, port) as client:
+                for hand in hands * 5:
+                    if client.calculate_shanten(hand[:16]) != calculate_shanten(hand[:16]):
+                        mismatches.append(hand)
+                    if client.suggest_discard(hand)['tile'] != suggest_discard(hand).tile:
+                        mismatches.append(hand)
+        
+        threads = [threading.Thread(target=query) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not mismatches, f"伺服器結果與引擎不同: {mismatches[0]}"
+        
+        with ShantenClient(host, port) as client:
+            tenpai = hands[0][:3] + hands[0][4:]
+            count, tiles = client.waiting_tiles(tenpai)
+            print(f"聽牌等待: {tiles}")
+            assert count == len(tiles) > 0
+            assert client.calculate_shanten(hands[0][:13], [["east", "east", "east"]]) == calculate_shanten(
+                hands[0][:13], [["east", "east", "east"]])
+            assert client.last_batch >= 1 and client.last_latency_us >= 0
+            
+            # 錯誤的請求回報為 ValueError，連線仍可繼續使用
+            try:
+                client.calculate_shanten(["5m"] * 5 + hands[1][:11])
+                assert False, "同一種牌超過4張應該回報錯誤"
+            except ValueError as e:
+                print(f"錯誤回報: {e}")
+            try:
+                client.request('unknown')
+                assert False, "不支援的 op 應該回報錯誤"
+            except ValueError:
+                pass
+            for visible in ([float('inf')] + [0] * 33, [1.5] + [0] * 33, [True] + [0] * 33, [5] + [0] * 33):
+                try:
+                    client.suggest_discard(hands[0], visible=visible)
+                    assert False, f"visible 不合法應該回報錯誤: {visible[0]}"
+                except ValueError:
+                    pass
+            try:
+                client.request('shanten', hand=[1] * 16)
+                assert False, "牌不是字串應該回報錯誤"
+            except ValueError as e:
+                print(f"錯誤回報: {e}")
+            # 上面的錯誤不能讓引擎執行緒停止
+            assert client.calculate_shanten(hands[0][:16]) == calculate_shanten(hands[0][:16])
+            stats = client.stats()
+        print(f"請求 {stats['requests']} 個，{stats['batches']} 批，平均每批 {stats['mean_batch']} 個")
+        assert stats['requests'] >= 4 * len(hands) * 5 * 2
+    finally:
+        server.shutdown()
+    print("✓ 測試通過：伺服器的結果與直接呼叫引擎相同")
+
+def test_batch_mode():
+    """測試互動工具的批次模式：依輸入順序或完成順序輸出，內容與逐手計算相同"""
+    print("\n=== 測試批次模式 ===")
+    
+    text = """# 錄下來的手牌
+1m 1m 2m 3m 4m 5m 6m 7m 1p 1p 2p 2p 3p 3p 4p 5p 8m
+1m,1m,1m,2m,3m,4m,5m,7m,1p,1p,2p,2p,3p,3p,4p,5p
+
+1m9m1p9p1s9s eastsouthwestnorthmiddlefawhite2m5p8s8s
+1m 2m 3x east
+"""
+    lines = list(read_hand_lines(text.splitlines()))
+    assert [number for number, _ in lines] == [2, 3, 5, 6], "應略過空行與註解"
+    
+    ops = ["shanten", "suggest", "waits", "tatsu"]
+    records = [json.loads(line) for line in run_batch(lines * 10, ops, workers=2, chunksize=3)]
+    assert [record['line'] for record in records] == [number for number, _ in lines] * 10
+    
+    first, second, _, broken = records[:4]
+    assert first['suggest']['tile'] == suggest_discard(first['hand']).tile
+    assert 'shanten' in first['errors'] and 'waits' in first['errors']
+    assert second['shanten'] == calculate_shanten(second['hand'])
+    assert second['waits']['count'] == len(second['waits']['tiles'])
+    assert broken['warnings'] and broken['hand'] == ["1m", "2m", "east"]
+    assert broken['tatsu']['count'] == 1
+    print(f"第一手建議: {first['suggest']['tile']}，無法解析: {broken['warnings']}")
+    
+    # 依完成順序輸出時順序可能不同，依行號排序後內容相同；單一行程時結果也相同
+    completed = [json.loads(line) for line in run_batch(lines * 10, ops, workers=2, chunksize=3, order="completion")]
+    assert sorted(completed, key=lambda r: r['line']) == sorted(records, key=lambda r: r['line'])
+    assert [json.loads(line) for line in run_batch(lines, ops, workers=1)] == records[:4]
+    
+    # 格式錯誤的輸入（不是字串、不是 (行號, 文字)）只產生該行的錯誤紀錄，不中斷整個串流
+    malformed = [lines[0], (7, None), "bad", lines[1]]
+    records = [json.loads(line) for line in run_batch(malformed, ops, workers=2, chunksize=2)]
+    assert [record['line'] for record in records] == [2, 7, None, 3]
+    assert 'error' in records[1] and 'error' in records[2]
+    assert records[3]['shanten'] == second['shanten']
+    print("✓ 測試通過：批次模式的結果與逐手計算相同")
+
 def main():
     """執行所有測試"""
     print("=" * 60)
@@ -198,6 +506,13 @@ def main():
         test_suggest_discard_one_away()
         test_improving_tiles()
         test_improving_tiles_comparison()
+        test_suggest_discard_many()
+        test_suggest_discard_lookahead()
+        test_simulate_discards()
+        test_suggest_discard_deadline()
+        test_suggest_discard_result_object()
+        test_shanten_server()
+        test_batch_mode()
         
         print("\n" + "=" * 60)
         print("測試完成")